@@ -9,6 +9,7 @@ from routes import reports
 from routes.notifications import router as notifications_router
 from routes import derivations
 from routes import ai
+from services import notification_digest, route_interpolation
 import base64
 import mimetypes
 import requests
@@ -44,6 +45,16 @@ app.include_router(reports.router, prefix="/api")
 app.include_router(derivations.router, tags=["derive"])
 app.include_router(ai.router, prefix="/ai", tags=["ai"])
 
+@app.on_event("shutdown")
+async def flush_notification_digests():
+    # Case-update digests are buffered in memory; send them before the process exits
+    await notification_digest.flush_all()
+
+
+@app.on_event("shutdown")
+async def close_route_client():
+    await route_interpolation.close_client()
+
 # Routes
 @app.get("/ping")
 def ping():
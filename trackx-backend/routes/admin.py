@@ -3,6 +3,7 @@ from pydantic import BaseModel
 from typing import List
 from firebase.firebase_config import db
 from services.case_service import assign_case_users
+from services.blocking_io import run_blocking, fetch_all
 
 admin_router = APIRouter()
 
@@ -23,7 +24,7 @@ async def get_users(role: str = Query(None), search: str = Query(None), page: in
             query = query.where("role", "==", role)
 
         results = []
-        docs = query.stream()
+        docs = await fetch_all(query)
 
         for doc in docs:
             data = doc.to_dict()
@@ -52,7 +53,7 @@ async def update_user_role(user_id: str, new_role: dict = Body(...)):
             raise HTTPException(status_code=400, detail="Invalid role")
 
         user_ref = db.collection("users").document(user_id)
-        user_ref.update({"role": new_role["new_role"]})
+        await run_blocking(user_ref.update, {"role": new_role["new_role"]})
         return {"success": True}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update role: {str(e)}")
@@ -66,14 +67,14 @@ async def delete_user(user_id: str):
     try:
         # Delete from Firebase Auth
         try:
-            auth.delete_user(user_id)
+            await run_blocking(auth.delete_user, user_id)
         except auth.UserNotFoundError:
             print(f"User {user_id} not found in Firebase Auth. Skipping...")
 
         # Delete from Firestore
         user_ref = db.collection("users").document(user_id)
-        if user_ref.get().exists:
-            user_ref.delete()
+        if (await run_blocking(user_ref.get)).exists:
+            await run_blocking(user_ref.delete)
         else:
             print(f"User {user_id} not found in Firestore. Skipping...")
 
@@ -91,7 +92,7 @@ async def update_approval(user_id: str, payload: dict):
             raise HTTPException(status_code=400, detail="Missing 'is_approved' field")
 
         user_ref = db.collection("users").document(user_id)
-        user_ref.update({"isApproved": is_approved})
+        await run_blocking(user_ref.update, {"isApproved": is_approved})
         return {"message": "Approval status updated successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -115,7 +116,7 @@ async def lookup_users(payload: UserLookupRequest):
         for user_id in payload.user_ids:
             if not user_id:
                 continue
-            doc = db.collection("users").document(user_id).get()
+            doc = await run_blocking(db.collection("users").document(user_id).get)
             if not doc.exists:
                 continue
             data = doc.to_dict() or {}
@@ -4,6 +4,7 @@ from services.auth_service import verify_firebase_token
 from fastapi.responses import JSONResponse
 from models.user_model import UserRegisterRequest
 from services.auth_service import register_user
+from services.blocking_io import run_blocking
 
 
 router = APIRouter()
@@ -12,7 +13,7 @@ bearer_scheme = HTTPBearer()
 @router.post("/verify")
 async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
     try:
-        decoded = verify_firebase_token(credentials.credentials)
+        decoded = await run_blocking(verify_firebase_token, credentials.credentials)
         return JSONResponse(content={"message": f"Welcome {decoded.get('email', 'user')}"})
     except Exception as e:
         return JSONResponse(status_code=401, content={"error": "Invalid or expired token"})
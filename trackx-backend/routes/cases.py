@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Query, HTTPException, Body, Form, UploadFile, File, Request, FastAPI
 from services.case_service import (
     search_cases,
+    search_cases_paginated,
     update_case,
     get_region_case_counts,
     get_case_counts_by_month,
@@ -20,12 +21,30 @@ from services.case_service import (
     fetch_all_points_paginated,
     fetch_all_case_points_with_case_ids,
     fetch_last_points_per_case,
+    ingest_track_upload,
+    create_case_in_background,
+    CaseNotFoundError,
 )
-from fastapi.responses import JSONResponse
+from services.jobs_service import get_job
+from services.case_numbers import CaseNumberTakenError, get_case_by_number
+from services.track_upload import detect_format, TrackFileError
+from services.track_storage import TrackNotReadyError
+from services.route_interpolation import (
+    DEFAULT_INTERPOLATION_ENGINE,
+    INTERPOLATION_ENGINES,
+    INTERPOLATION_VERSION,
+    interpolate_route,
+    interpolation_source_version,
+    sanitize_points,
+)
+from services.track_simplify import SIMPLIFY_TOLERANCE_METERS, limit_points, simplify_track
+from services.czml_cache import artifact_key, compress_czml, etag_for, etag_matches, load_artifact, store_artifact
+from fastapi.responses import JSONResponse, Response
 from fastapi.encoders import jsonable_encoder
 from models.case_model import CaseCreateRequest, GpsPoint
 import json
 import csv
+import gzip
 import io
 from typing import Optional
 from firebase.firebase_config import db
@@ -34,6 +53,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from firebase_admin import firestore
 from google.cloud.firestore_v1 import SERVER_TIMESTAMP
 from models.comment_model import CaseCommentCreateRequest
+from services.blocking_io import run_blocking, fetch_all
 
 db = firestore.client()
 
@@ -42,20 +62,20 @@ router = APIRouter()
 @router.post("/cases/{case_id}/ai-intro")
 async def ai_intro(case_id: str):
     doc_ref = db.collection("cases").document(case_id)
-    doc = doc_ref.get()
+    doc = await run_blocking(doc_ref.get)
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Case not found")
 
     case = doc.to_dict() or {}
     intro = await generate_case_intro(case.get("caseTitle", ""), case.get("region", ""), case.get("dateOfIncident", ""))
     # update Firestore (use frontend-friendly keys)
-    doc_ref.update({"reportIntro": intro, "updatedAt": SERVER_TIMESTAMP})
+    await run_blocking(doc_ref.update, {"reportIntro": intro, "updatedAt": SERVER_TIMESTAMP})
     return JSONResponse({"reportIntro": intro})
 
 @router.post("/cases/{case_id}/ai-conclusion")
 async def ai_conclusion(case_id: str):
     doc_ref = db.collection("cases").document(case_id)
-    doc = doc_ref.get()
+    doc = await run_blocking(doc_ref.get)
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Case not found")
 
@@ -78,7 +98,7 @@ async def ai_conclusion(case_id: str):
     )
 
     # update Firestore (frontend-friendly)
-    doc_ref.update({
+    await run_blocking(doc_ref.update, {
         "reportConclusion": conclusion,
         "updatedAt": SERVER_TIMESTAMP
     })
@@ -113,14 +133,21 @@ async def search_cases_route(
     districtCode: str = "",
     districtName: str = "",
     includeDeleted: bool = Query(False, alias="includeDeleted"),
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    cursor: Optional[str] = None,
 ):
+    """
+    Search cases. Without `limit` every match is returned in one response; with `limit`
+    the results are paged newest-first, trimmed to list-view fields, and the response
+    carries a `nextCursor` to pass back for the following page.
+    """
     print(
         f"Received query parameters: user_id={user_id}, case_name={case_name}, region={region}, "
         f"date={date}, status={status}, urgency={urgency}, province={province or provinceName or provinceCode}, "
         f"district={district or districtName or districtCode}, includeDeleted={includeDeleted}"
     )
 
-    results = await search_cases(
+    filters = dict(
         case_name=case_name,
         region=region,
         date=date,
@@ -135,18 +162,36 @@ async def search_cases_route(
         districtCode=districtCode,
         districtName=districtName,
     )
+    if limit:
+        try:
+            results, next_cursor = await search_cases_paginated(limit=limit, cursor=cursor, **filters)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        return {"cases": results, "nextCursor": next_cursor}
+
+    results = await search_cases(**filters)
     return {"cases": results}
 
 @router.post("/cases/create")
-async def create_case_route(case_request: CaseCreateRequest):
+async def create_case_route(case_request: CaseCreateRequest, background: bool = False):
     """
     Accepts a new case submission with case info + CSV data in JSON.
+
+    With `background=true` only the case document is written before responding; the
+    points, notifications and derivations are handled by a job whose progress can be
+    polled at /cases/jobs/{jobId}.
     """
     try:
+        if background:
+            new_case_id, job_id = await create_case_in_background(case_request)
+            return JSONResponse(status_code=202, content={"caseId": new_case_id, "jobId": job_id})
+
         # Call the service to create the case
         new_case_id = await create_case(case_request)
         return JSONResponse(content={"caseId": new_case_id})
 
+    except CaseNumberTakenError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         print(f"Error in create_case_route: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -185,7 +230,7 @@ async def get_trashed_cases():
     """Retrieve all trashed cases."""
     try:
         trashed_ref = db.collection("cases").where("is_deleted", "==", True)
-        results = [doc.to_dict() | {"doc_id": doc.id} for doc in trashed_ref.stream()]
+        results = [doc.to_dict() | {"doc_id": doc.id} for doc in await fetch_all(trashed_ref)]
         return {"cases": results}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -243,7 +288,10 @@ async def get_all_points_with_case_ids():
 
 @router.get("/cases/all-points-paginated")
 async def get_all_points_paginated(limit: int = 200, cursor: Optional[str] = None):
-    points, next_cursor = await fetch_all_points_paginated(limit=limit, cursor=cursor)
+    try:
+        points, next_cursor = await fetch_all_points_paginated(limit=limit, cursor=cursor)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
     return {"points": points, "nextCursor": next_cursor}
 
 
@@ -270,6 +318,29 @@ async def create_case_comment(case_id: str, payload: CaseCommentCreateRequest):
         raise HTTPException(status_code=500, detail=f"Failed to add comment: {exc}")
 
 
+@router.post("/cases/{case_id}/track/upload")
+async def upload_case_track(case_id: str, file: UploadFile = File(...)):
+    """
+    Append a CSV or GPX track file to a case's allPoints. The file is parsed and written
+    in batches, so large device dumps are never held in memory as a whole.
+    """
+    try:
+        file_format = detect_format(file.filename, file.content_type)
+        stats = await ingest_track_upload(case_id, file.file, file_format)
+        return {"caseId": case_id, **stats}
+    except TrackFileError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except CaseNotFoundError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    except TrackNotReadyError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    except Exception as exc:
+        print(f"Error in upload_case_track: {exc}")
+        raise HTTPException(status_code=500, detail=f"Failed to ingest track: {exc}")
+    finally:
+        await file.close()
+
+
 @router.get("/cases/{case_id}/comments")
 async def get_case_comments(case_id: str, limit: int = 100):
     try:
@@ -281,49 +352,127 @@ async def get_case_comments(case_id: str, limit: int = 100):
         raise HTTPException(status_code=500, detail=f"Failed to fetch comments: {exc}")
 
 
-#new attempt: 
+async def _czml_response(blob: bytes, key: Optional[str], request: Request) -> Response:
+    # key=None: a degraded document that must not be revalidated or reused by the client
+    if key:
+        headers = {"ETag": etag_for(key), "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    else:
+        headers = {"Cache-Control": "no-store", "Vary": "Accept-Encoding"}
+    if "gzip" in (request.headers.get("accept-encoding") or "").lower():
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=blob, media_type="application/json", headers=headers)
+    return Response(content=await run_blocking(gzip.decompress, blob), media_type="application/json", headers=headers)
+
+
+CZML_MODES = ("raw", "interpolated", "simplified")
+
+
 @router.get("/cases/czml/{case_number}")
-async def get_case_czml(case_number: str):
+async def get_case_czml(
+    case_number: str,
+    request: Request,
+    mode: str = Query("interpolated", description="raw, interpolated or simplified"),
+    maxPoints: Optional[int] = Query(None, ge=2, description="Upper bound on track points in the document"),
+    interpolation: str = Query(DEFAULT_INTERPOLATION_ENGINE, description="ors (road routing) or greatcircle (offline); interpolated mode only"),
+):
+    """
+    CZML playback document for a case.
+
+    - `raw`: the recorded points as they are (cheapest).
+    - `interpolated`: the track routed along roads (or great circles), the full pipeline.
+    - `simplified`: the recorded points reduced with Douglas-Peucker, for light viewers.
+
+    `maxPoints` caps the points of any mode. Every mode/parameter combination is stored
+    as its own gzip artifact keyed by the case's trackVersion, so repeat loads are one
+    read, and `If-None-Match` with the returned ETag answers 304 without any artifact read.
+    """
     from services.case_service import (
         generate_czml,
         fetch_all_points_by_case_number,
-        interpolate_points_with_ors,
         fetch_interpolated_points,
         store_interpolated_points,
+        ensure_track_version,
     )
 
+    if mode not in CZML_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(CZML_MODES)}")
+    if mode == "interpolated" and interpolation not in INTERPOLATION_ENGINES:
+        raise HTTPException(status_code=400, detail=f"interpolation must be one of {', '.join(INTERPOLATION_ENGINES)}")
+
     try:
-        print(f"🔍 Fetching allPoints for case: {case_number}")
         # Get the case document by caseNumber
-        matching_query = db.collection("cases").where("caseNumber", "==", case_number).stream()
-        case_docs = list(matching_query)
-        if not case_docs:
+        case_doc = await get_case_by_number(case_number)
+        if case_doc is None:
             raise HTTPException(status_code=404, detail="Case not found.")
 
-        case_doc = case_docs[0]
         case_doc_id = case_doc.id
 
+        case_data = case_doc.to_dict() or {}
+        track_version = await ensure_track_version(case_doc_id, case_data)
+        if not track_version:
+            raise HTTPException(status_code=404, detail="No allPoints found.")
+
+        params = {"mode": mode, "maxPoints": maxPoints}
+        artifact_name = f"czml-{mode}"
+        if mode == "interpolated":
+            params.update({"interpolation": interpolation, "interpolationVersion": INTERPOLATION_VERSION})
+            artifact_name = f"czml-{mode}-{interpolation}"
+        elif mode == "simplified":
+            params["toleranceMeters"] = SIMPLIFY_TOLERANCE_METERS
+        key = artifact_key(track_version, params)
+        if etag_matches(request.headers.get("if-none-match"), key):
+            return Response(status_code=304, headers={"ETag": etag_for(key), "Cache-Control": "no-cache"})
+
+        blob = await load_artifact(case_doc.reference, artifact_name, key)
+        if blob is not None:
+            return await _czml_response(blob, key, request)
+
         # Get the actual allPoints
-        raw_points = await fetch_all_points_by_case_number(case_number)
+        raw_points = await fetch_all_points_by_case_number(case_number, case_doc)
         if not raw_points:
             raise HTTPException(status_code=404, detail="No allPoints found.")
 
-        print("Checking for saved interpolated points...")
-        cached_points = await fetch_interpolated_points(case_doc_id)
-
-        if cached_points:
-            print(f"Using {len(cached_points)} cached interpolated points.")
-            interpolated_points = cached_points
+        complete = True
+        # Parsing, simplifying and CZML generation are CPU-bound over the whole track, so they
+        # run on the pool like the blocking I/O and never stall other requests or SSE streams
+        if mode == "raw":
+            track_points = await run_blocking(sanitize_points, raw_points)
+        elif mode == "simplified":
+            track_points = await run_blocking(lambda: simplify_track(sanitize_points(raw_points)))
         else:
-            print(f"Interpolating {len(raw_points)} points...")
-            interpolated_points = interpolate_points_with_ors(raw_points)
-            await store_interpolated_points(case_doc_id, interpolated_points)
-
-        print(f"Generating CZML from {len(interpolated_points)} points...")
-        czml_data = generate_czml(case_number, interpolated_points)
-
-        return JSONResponse(content=czml_data)
-
+            # Only ORS results are worth saving; great-circle densification is cheaper than a read.
+            # A saved set is reused only if it was interpolated from the current raw track.
+            source_version = interpolation_source_version(track_version)
+            track_points = []
+            if interpolation == "ors" and case_data.get("interpolatedSourceVersion") == source_version:
+                track_points = await fetch_interpolated_points(case_doc_id, source_version)
+
+            if not track_points:
+                print(f"Interpolating {len(raw_points)} points ({interpolation})...")
+                result = await interpolate_route(raw_points, interpolation)
+                track_points, complete = result["points"], result["complete"]
+                if interpolation == "ors" and complete:
+                    await store_interpolated_points(case_doc_id, track_points, source_version)
+
+        track_points = await run_blocking(limit_points, track_points, maxPoints)
+        czml_data = await run_blocking(generate_czml, case_number, track_points)
+
+        try:
+            # ORS partly unavailable (complete=False): the fallback is served but not stored
+            blob = await store_artifact(db, case_doc.reference, artifact_name, key, czml_data, params, complete=complete)
+        except Exception as e:
+            print(f"Could not store CZML artifact for case {case_number}: {e}")
+            blob = await run_blocking(compress_czml, czml_data)
+        return await _czml_response(blob, key if complete else None, request)
+
+    except HTTPException:
+        raise
+    except TrackNotReadyError as e:
+        # Nothing is built or cached from a track that is still being written
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        # generate_czml: fewer than two usable points
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         import traceback
         print("Exception in get_case_czml:")
@@ -331,70 +480,21 @@ async def get_case_czml(case_number: str):
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 
-
-
-
-# @router.get("/cases/czml/{case_number}")
-# async def get_case_czml(case_number: str):
-#     from services.case_service import generate_czml, fetch_all_points_by_case_number, interpolate_points_with_ors
-
-#     try:
-#         print(f"🔍 Fetching allPoints for case: {case_number}")
-#         raw_points = await fetch_all_points_by_case_number(case_number)
-#         if not raw_points:
-#             raise HTTPException(status_code=404, detail="No allPoints found.")
-
-#         print(f"Retrieved {len(raw_points)} points. Now interpolating...")
-#         interpolated_points = interpolate_points_with_ors(raw_points)
-
-#         print(f" Interpolated to {len(interpolated_points)} points. Now generating CZML...")
-#         czml_data = generate_czml(case_number, interpolated_points)
-
-#         return JSONResponse(content=czml_data)
-
-    except Exception as e:
-        print(f"Error generating CZML: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to generate CZML.")
-    
 @router.get("/cases/all")
 async def get_all_cases():
     try:
-        cases_ref = db.collection("cases").stream()
-        cases = [{"id": doc.id, **doc.to_dict()} for doc in cases_ref]
+        cases = [{"id": doc.id, **doc.to_dict()} for doc in await fetch_all(db.collection("cases"))]
         return cases
     except Exception as e:
         return {"error": str(e)}
 
-#     except Exception as e:
-#         import traceback
-#         print("Exception in get_case_czml:")
-#         traceback.print_exc()
-#         return JSONResponse(status_code=500, content={"error": str(e)})
-######---------------- end
-
-# @router.get("/cases/simulation-progress/{case_id}")
-# def simulation_progress(case_id: str):
-#     progress = SIMULATION_PROGRESS.get(case_id)
-#     if not progress:
-#         return {"done": 0, "total": 0, "status": "not_started"}
-
-#     status = "done" if progress["done"] >= progress["total"] else "in_progress"
-#     return {**progress, "status": status}
-@router.get("/cases/czml/{case_number}")
-async def get_case_czml(case_number: str):
-    from services.case_service import generate_czml, fetch_all_points_by_case_number
-
-    try:
-        points = await fetch_all_points_by_case_number(case_number)
-        if not points:
-            raise HTTPException(status_code=404, detail="No allPoints found.")
-
-        czml_data = generate_czml(case_number, points)
-        return JSONResponse(content=czml_data)
-
-    except Exception as e:
-        print(f"Error generating CZML: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to generate CZML.")
+@router.get("/cases/jobs/{job_id}")
+async def get_case_job(job_id: str):
+    """Poll a background case job: status, stage and done/total progress."""
+    job = await get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JSONResponse(content=jsonable_encoder(job))
 
 @router.get("/cases/{case_id}/all-points")
 async def get_case_all_points(case_id: str):
@@ -1,8 +1,23 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from typing import Optional
-from services.notifications_service import add_notification, fetch_notifications, update_notification, delete_all_notifications
+import json
+import os
+from services.notifications_service import (
+    add_notification,
+    fetch_notifications_page,
+    update_notification,
+    delete_all_notifications,
+    fetch_unread_counts,
+    mark_all_notifications_read,
+)
+from services.notification_stream import hub, next_event
 from models.notification_model import UpdateNotificationRequest
 
+# Seconds between keep-alive comments on an idle notification stream
+NOTIFICATION_STREAM_HEARTBEAT = float(os.getenv("NOTIFICATION_STREAM_HEARTBEAT", "15"))
+
 
 router = APIRouter()
 
@@ -29,8 +44,9 @@ async def create_notification(user_id: str, title: str, message: str, notificati
 @router.get("/{user_id}")
 async def get_notifications(
     user_id: str,
-    page: int = 1,
-    limit: int = 10,
+    page: int = Query(1, ge=1),
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = None,
     notification_type: Optional[str] = Query(None, alias="type"),
 ):
     """
@@ -38,29 +54,86 @@ async def get_notifications(
 
     Args:
         user_id (str): The ID of the user whose notifications are being fetched.
-        page (int): The page number (default is 1).
+        page (int): The page number (default is 1); ignored when a cursor is given.
         limit (int): The number of notifications per page (default is 10).
+        cursor (str): The `nextCursor` of the previous page.
+        notification_type (str): Only return notifications of this type.
 
     Returns:
         dict: A dictionary containing a list of notifications and pagination metadata.
     """
     try:
-        notifications = await fetch_notifications(user_id, notification_type=notification_type)
-        start = (page - 1) * limit
-        end = start + limit
-        paginated_notifications = notifications[start:end]
+        notifications, next_cursor, total = await fetch_notifications_page(
+            user_id,
+            limit=limit,
+            cursor=cursor,
+            page=page,
+            notification_type=notification_type,
+        )
 
         return {
-            "notifications": paginated_notifications,
-            "total": len(notifications),
+            "notifications": notifications,
+            "total": total,
             "page": page,
             "limit": limit,
+            "nextCursor": next_cursor,
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"Error in get_notifications route for user {user_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch notifications: {str(e)}")
 
 
+@router.get("/{user_id}/unread-count")
+async def get_unread_count(user_id: str):
+    """
+    API endpoint returning a user's unread notification total and per-type totals,
+    read from the counters kept on the user document.
+    """
+    try:
+        return await fetch_unread_counts(user_id)
+    except Exception as e:
+        print(f"Error in get_unread_count route for user {user_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to fetch unread count: {str(e)}")
+
+
+@router.get("/{user_id}/stream")
+async def stream_notifications(user_id: str, request: Request):
+    """
+    Server-Sent Events stream of a user's notifications as they are written.
+
+    Events are `notification` (new), `notification-updated` (e.g. marked read) and
+    `notification-removed`, each carrying the notification JSON. All of a user's open
+    streams share one Firestore listener; a comment line is sent every
+    NOTIFICATION_STREAM_HEARTBEAT seconds to keep idle connections open.
+    """
+    try:
+        subscriber = await hub.subscribe(user_id)
+    except Exception as e:
+        print(f"Error in stream_notifications route for user {user_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to open notification stream: {str(e)}")
+
+    async def _events():
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                event = await next_event(subscriber, NOTIFICATION_STREAM_HEARTBEAT)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                payload = json.dumps(jsonable_encoder(event["data"]))
+                yield f"event: {event['event']}\ndata: {payload}\n\n"
+        finally:
+            hub.unsubscribe(user_id, subscriber)
+
+    return StreamingResponse(
+        _events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.patch("/{user_id}/{notification_id}")
 async def update_notification_status(user_id: str, notification_id: str, request: UpdateNotificationRequest):
     """
@@ -90,10 +163,19 @@ async def update_notification_status(user_id: str, notification_id: str, request
         raise HTTPException(status_code=500, detail=f"Failed to update notification: {str(e)}")
 
 
+@router.post("/{user_id}/mark-all-read")
+async def mark_all_read(user_id: str, notification_type: Optional[str] = Query(None, alias="type")):
+    """Mark all of a user's notifications (optionally of one type) as read."""
+    result = await mark_all_notifications_read(user_id, notification_type=notification_type)
+    if not result.get("success"):
+        raise HTTPException(status_code=500, detail=result.get("message", "Failed to mark notifications read."))
+    return result
+
+
 @router.delete("/{user_id}")
-async def clear_notifications(user_id: str):
-    """Delete all notifications for a user."""
-    result = await delete_all_notifications(user_id)
+async def clear_notifications(user_id: str, notification_type: Optional[str] = Query(None, alias="type")):
+    """Delete all notifications for a user (optionally only one type)."""
+    result = await delete_all_notifications(user_id, notification_type=notification_type)
     if not result.get("success"):
         raise HTTPException(status_code=500, detail=result.get("message", "Failed to delete notifications."))
     return result
@@ -0,0 +1,66 @@
+"""
+Build the `caseNumbers/{caseNumber}` index (services/case_numbers.py) for cases
+created before it existed. Each case is claimed in its own transaction, so running
+the script again is harmless. A case number used by more than one case is reported
+and left unindexed, so the duplicates can be renumbered by hand.
+
+Usage (from trackx-backend/):
+    python scripts/backfill_case_numbers.py [--page-size 200]
+"""
+import argparse
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from firebase_admin import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from firebase.firebase_config import db
+from services.case_numbers import CaseNumberTakenError, claim_in_transaction
+
+DOCUMENT_ID = FieldPath.document_id()
+
+
+def _claim(case_number: str, case_id: str) -> None:
+    @firestore.transactional
+    def _run(transaction):
+        claim_in_transaction(transaction, case_number, case_id)
+
+    _run(db.transaction())
+
+
+def run(page_size: int = 200) -> dict:
+    stats = {"indexed": 0, "skipped": 0, "conflicts": 0}
+    last_doc_id = None
+    while True:
+        query = db.collection("cases").select(["caseNumber"]).order_by(DOCUMENT_ID).limit(max(1, page_size))
+        if last_doc_id:
+            query = query.start_after({DOCUMENT_ID: last_doc_id})
+        docs = list(query.stream())
+        if not docs:
+            break
+        for doc in docs:
+            case_number = (doc.to_dict() or {}).get("caseNumber")
+            if not case_number:
+                stats["skipped"] += 1
+                continue
+            try:
+                _claim(case_number, doc.id)
+                stats["indexed"] += 1
+            except CaseNumberTakenError:
+                stats["conflicts"] += 1
+                print(f"Case {doc.id}: case number '{case_number}' is shared with another case")
+        last_doc_id = docs[-1].id
+
+    print(f"Done: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill the caseNumber -> case id index.")
+    parser.add_argument("--page-size", type=int, default=200)
+    args = parser.parse_args()
+    run(page_size=args.page_size)
@@ -0,0 +1,115 @@
+"""
+One-time backfill that rewrites every case document onto the canonical schema
+(see case_service._canonical_case_fields):
+
+  - canonical `userIds` / `userId` / `isShared`, legacy `userIDs` / `userID` removed
+  - `provinceCode`, `provinceName` and a normalized `regionKey`
+  - an explicit `is_deleted` flag
+  - `createdAt` (from the document create time) where it was never set
+  - `schemaVersion` stamp
+
+Cases are processed in document-id order, one Firestore batch per page. Progress is
+checkpointed in `migrations/caseSchema`, so an interrupted run resumes where it stopped.
+
+Usage (from trackx-backend/):
+    python scripts/backfill_case_schema.py [--page-size 200] [--dry-run] [--restart]
+"""
+import argparse
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from firebase_admin import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from firebase.firebase_config import db
+from services.case_service import CASE_SCHEMA_VERSION, _canonical_case_fields
+
+CHECKPOINT_REF = db.collection("migrations").document("caseSchema")
+DOCUMENT_ID = FieldPath.document_id()
+LEGACY_FIELDS = ("userIDs", "userID")
+
+
+def _pending_updates(data: dict) -> dict:
+    """Return the field writes needed to make a case canonical (empty when already canonical)."""
+    canonical = _canonical_case_fields(data)
+    updates = {k: v for k, v in canonical.items() if data.get(k) != v or k not in data}
+    for legacy in LEGACY_FIELDS:
+        if legacy in data:
+            updates[legacy] = firestore.DELETE_FIELD
+    return updates
+
+
+def _load_checkpoint(restart: bool) -> dict:
+    if restart:
+        return {}
+    snap = CHECKPOINT_REF.get()
+    state = snap.to_dict() if snap.exists else {}
+    if state.get("schemaVersion") != CASE_SCHEMA_VERSION:
+        return {}
+    return state
+
+
+def run(page_size: int = 200, dry_run: bool = False, restart: bool = False) -> dict:
+    # One update per case, so a page never exceeds the 500-write batch limit
+    page_size = max(1, min(int(page_size), 450))
+    state = _load_checkpoint(restart)
+    last_doc_id = state.get("lastDocId")
+    processed = int(state.get("processed", 0))
+    updated = int(state.get("updated", 0))
+
+    if last_doc_id:
+        print(f"Resuming after case {last_doc_id} ({processed} processed, {updated} updated)")
+
+    while True:
+        query = db.collection("cases").order_by(DOCUMENT_ID).limit(page_size)
+        if last_doc_id:
+            query = query.start_after({DOCUMENT_ID: last_doc_id})
+        docs = list(query.stream())
+        if not docs:
+            break
+
+        batch = db.batch()
+        page_updates = 0
+        for doc in docs:
+            data = doc.to_dict() or {}
+            updates = _pending_updates(data)
+            if not data.get("createdAt") and doc.create_time:
+                # Paginated search orders by createdAt; documents without it would never be listed
+                updates["createdAt"] = doc.create_time
+            if updates:
+                batch.update(doc.reference, updates)
+                page_updates += 1
+
+        last_doc_id = docs[-1].id
+        processed += len(docs)
+        updated += page_updates
+
+        if not dry_run:
+            if page_updates:
+                batch.commit()
+            CHECKPOINT_REF.set({
+                "schemaVersion": CASE_SCHEMA_VERSION,
+                "lastDocId": last_doc_id,
+                "processed": processed,
+                "updated": updated,
+                "updatedAt": firestore.SERVER_TIMESTAMP,
+            })
+        print(f"Processed {processed} cases ({updated} {'would be ' if dry_run else ''}updated), last={last_doc_id}")
+
+    if not dry_run:
+        CHECKPOINT_REF.set({"completed": True}, merge=True)
+    print(f"Done: {processed} cases scanned, {updated} {'need' if dry_run else 'received'} updates.")
+    return {"processed": processed, "updated": updated}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill canonical case fields.")
+    parser.add_argument("--page-size", type=int, default=200)
+    parser.add_argument("--dry-run", action="store_true", help="Report pending updates without writing.")
+    parser.add_argument("--restart", action="store_true", help="Ignore the saved checkpoint and start over.")
+    args = parser.parse_args()
+    run(page_size=args.page_size, dry_run=args.dry_run, restart=args.restart)
@@ -0,0 +1,52 @@
+"""
+Seed the unread-notification counters (`unreadCount`, `unreadByType`) on every user
+document from the user's unread notifications, and mark them with
+`unreadCountersVersion`. Users without that marker are recounted lazily the first time
+their counts are read, so the script is optional. It seeds everyone up front instead.
+Each user is recounted in its own transaction, so running the script again is harmless.
+
+Usage (from trackx-backend/):
+    python scripts/backfill_unread_counters.py [--page-size 200]
+"""
+import argparse
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from firebase.firebase_config import db
+from services.notifications_service import recount_unread_notifications
+
+DOCUMENT_ID = FieldPath.document_id()
+
+
+def run(page_size: int = 200) -> int:
+    processed = 0
+    last_doc_id = None
+    while True:
+        query = db.collection("users").select([DOCUMENT_ID]).order_by(DOCUMENT_ID).limit(max(1, page_size))
+        if last_doc_id:
+            query = query.start_after({DOCUMENT_ID: last_doc_id})
+        docs = list(query.stream())
+        if not docs:
+            break
+        for doc in docs:
+            counters = recount_unread_notifications(doc.id)
+            processed += 1
+            if counters.get("unreadCount"):
+                print(f"User {doc.id}: {counters['unreadCount']} unread")
+        last_doc_id = docs[-1].id
+
+    print(f"Done: recounted {processed} users.")
+    return processed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill unread-notification counters.")
+    parser.add_argument("--page-size", type=int, default=200)
+    args = parser.parse_args()
+    run(page_size=args.page_size)
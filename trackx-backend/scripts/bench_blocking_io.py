@@ -0,0 +1,94 @@
+"""
+Benchmark: light-request throughput on one event loop while a heavy endpoint runs.
+
+Two tiny FastAPI apps stand in for a single uvicorn worker. Each has a /heavy route
+(a long blocking call, like an all-points scan) and a /light route (a short
+blocking call, like a single document read). `time.sleep` plays the role of the
+synchronous Firestore RPC. In the "inline" app the calls run on the event loop as the
+services used to; in the "pooled" app they go through services.blocking_io.run_blocking.
+
+Usage (from trackx-backend/):
+    python scripts/bench_blocking_io.py [--heavy-seconds 2.0] [--light-ms 20] [--requests 200]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+import httpx
+from fastapi import FastAPI
+
+from services.blocking_io import run_blocking
+
+
+def build_app(pooled: bool, heavy_seconds: float, light_seconds: float) -> FastAPI:
+    app = FastAPI()
+
+    async def _call(seconds: float):
+        if pooled:
+            await run_blocking(time.sleep, seconds)
+        else:
+            time.sleep(seconds)
+
+    @app.get("/heavy")
+    async def heavy():
+        await _call(heavy_seconds)
+        return {"ok": True}
+
+    @app.get("/light")
+    async def light():
+        await _call(light_seconds)
+        return {"ok": True}
+
+    return app
+
+
+async def measure(pooled: bool, heavy_seconds: float, light_seconds: float, total_requests: int) -> dict:
+    app = build_app(pooled, heavy_seconds, light_seconds)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        heavy_task = asyncio.create_task(client.get("/heavy"))
+        await asyncio.sleep(0)  # let the heavy request start first
+
+        # Completion time of each light request, measured from when the burst was issued
+        latencies = []
+        started = time.perf_counter()
+
+        async def one_light():
+            await client.get("/light")
+            latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(one_light() for _ in range(total_requests)))
+        elapsed = time.perf_counter() - started
+        await heavy_task
+
+    latencies.sort()
+    return {
+        "mode": "pooled" if pooled else "inline",
+        "requests": total_requests,
+        "seconds": round(elapsed, 3),
+        "requestsPerSecond": round(total_requests / elapsed, 1),
+        "p50Ms": round(latencies[len(latencies) // 2] * 1000, 1),
+        "p99Ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Event-loop blocking benchmark.")
+    parser.add_argument("--heavy-seconds", type=float, default=2.0)
+    parser.add_argument("--light-ms", type=float, default=20.0)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    for pooled in (False, True):
+        result = asyncio.run(measure(pooled, args.heavy_seconds, args.light_ms / 1000.0, args.requests))
+        print(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark: CZML generation throughput on large synthetic tracks.
+
+Builds a track of N points one second apart with the timestamp shapes found in stored
+cases (ISO strings with "Z", with an offset, naive, and datetimes). The points are
+shuffled so the sort is exercised. Times services.czml_service.generate_czml, plus the
+gzip step the artifact cache adds (services.czml_cache.compress_czml).
+
+Usage (from trackx-backend/):
+    python scripts/bench_czml.py [--points 100000] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from services.czml_cache import compress_czml
+from services.czml_service import generate_czml
+
+
+def build_points(count: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    points = []
+    lat, lng = -33.9249, 18.4241
+    for i in range(count):
+        lat += rng.uniform(-0.0005, 0.0005)
+        lng += rng.uniform(-0.0005, 0.0005)
+        dt = start + timedelta(seconds=i)
+        shape = i % 4
+        if shape == 0:
+            ts = dt.isoformat().replace("+00:00", "Z")
+        elif shape == 1:
+            ts = dt.isoformat()
+        elif shape == 2:
+            ts = dt
+        else:
+            ts = [dt.isoformat().replace("+00:00", "Z")]
+        points.append({"lat": lat, "lng": lng, "timestamp": ts})
+    rng.shuffle(points)
+    return points
+
+
+def _best_of(repeat: int, fn) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CZML generation benchmark.")
+    parser.add_argument("--points", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    points = build_points(args.points)
+    czml = generate_czml("bench", points)
+    generate_s = _best_of(args.repeat, lambda: generate_czml("bench", points))
+    compress_s = _best_of(args.repeat, lambda: compress_czml(czml))
+    print({
+        "points": args.points,
+        "generateSeconds": round(generate_s, 3),
+        "pointsPerSecond": round(args.points / generate_s),
+        "gzipSeconds": round(compress_s, 3),
+        "gzipBytes": len(compress_czml(czml)),
+    })
+
+
+if __name__ == "__main__":
+    main()
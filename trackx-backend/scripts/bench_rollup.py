@@ -0,0 +1,84 @@
+"""
+Benchmark: scalar vs NumPy rollup engines on large synthetic tracks.
+
+Builds a track of N points that alternates between dwelling around a spot and
+driving, with occasional GPS jumps. Timestamps are ISO strings with "Z" and aware
+datetimes, and the points are shuffled so the sort is exercised. Times
+services.derivations_service.compute_rollup_scalar and compute_rollup_vectorized,
+and checks that both return the same rollup (computedAt aside).
+
+Usage (from trackx-backend/):
+    python scripts/bench_rollup.py [--points 100000] [--repeat 3]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from services.derivations_service import compute_rollup_scalar, compute_rollup_vectorized
+
+
+def build_points(count: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    dt = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    points = []
+    lat, lng = -33.9249, 18.4241
+    dwelling = True
+    for i in range(count):
+        if i % 50 == 0:
+            dwelling = not dwelling
+        spread = 0.0002 if dwelling else 0.003
+        lat += rng.uniform(-spread, spread)
+        lng += rng.uniform(-spread, spread)
+        if rng.random() < 0.002:
+            lat += rng.choice([-0.2, 0.2])
+        dt += timedelta(seconds=rng.choice([10, 30, 60]))
+        ts = dt.isoformat().replace("+00:00", "Z") if i % 2 else dt
+        points.append({"lat": lat, "lng": lng, "timestamp": ts})
+    rng.shuffle(points)
+    return points
+
+
+def _best_of(repeat: int, fn) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _comparable(rollup: dict) -> dict:
+    return {k: v for k, v in rollup.items() if k != "computedAt"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rollup engine benchmark.")
+    parser.add_argument("--points", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    points = build_points(args.points)
+    scalar = compute_rollup_scalar(points)
+    vectorized = compute_rollup_vectorized(points)
+    scalar_s = _best_of(args.repeat, lambda: compute_rollup_scalar(points))
+    vectorized_s = _best_of(args.repeat, lambda: compute_rollup_vectorized(points))
+    print({
+        "points": args.points,
+        "stops": scalar.get("stopCount"),
+        "anomalies": len(scalar.get("anomalies", [])),
+        "scalarSeconds": round(scalar_s, 3),
+        "vectorizedSeconds": round(vectorized_s, 3),
+        "speedup": round(scalar_s / vectorized_s, 2),
+        "identical": _comparable(scalar) == _comparable(vectorized),
+    })
+
+
+if __name__ == "__main__":
+    main()
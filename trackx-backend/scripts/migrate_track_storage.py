@@ -0,0 +1,115 @@
+"""
+Migrate case tracks from one-document-per-sample `allPoints` into chunked
+`trackChunks` documents (see services/track_storage.py).
+
+A case is migrated by writing its chunks, then storing the `trackStorage` manifest
+on the case. Readers switch layouts as soon as the manifest exists. Cases that
+already have a manifest are skipped, so the tool can be re-run safely. The
+`allPoints` documents are kept unless --delete-source is given. Keep them until
+the chunked reads have been checked. Samples with a null, missing or non-numeric
+coordinate cannot be chunked; they are skipped and reported per case.
+
+Usage (from trackx-backend/):
+    python scripts/migrate_track_storage.py [--case-id ID] [--page-size 50] [--dry-run] [--delete-source]
+"""
+import argparse
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from firebase.firebase_config import db
+from services import track_storage
+
+DOCUMENT_ID = FieldPath.document_id()
+
+
+def _delete_all_points(case_ref, batch_size: int = 400) -> int:
+    deleted = 0
+    while True:
+        docs = list(case_ref.collection("allPoints").select([DOCUMENT_ID]).limit(batch_size).stream())
+        if not docs:
+            return deleted
+        batch = db.batch()
+        for doc in docs:
+            batch.delete(doc.reference)
+        batch.commit()
+        deleted += len(docs)
+
+
+def migrate_case(case_doc, dry_run: bool = False, delete_source: bool = False) -> int:
+    """Chunk one case's allPoints. Returns the number of samples moved (0 when skipped)."""
+    case_data = case_doc.to_dict() or {}
+    if track_storage.is_chunked(case_data):
+        return 0
+
+    points = track_storage.load_track_points(case_doc.reference, case_data)
+    if not points:
+        return 0
+
+    if dry_run:
+        _, skipped = track_storage.valid_samples(points)
+        if skipped:
+            print(f"Case {case_doc.id}: {skipped} samples without usable coordinates would be skipped")
+        return len(points) - skipped
+
+    manifest = track_storage.write_chunked_track(db, case_doc.reference, points)
+    case_doc.reference.update({"trackStorage": manifest})
+    if manifest.get("skippedPoints"):
+        print(f"Case {case_doc.id}: skipped {manifest['skippedPoints']} samples without usable coordinates")
+    if delete_source:
+        _delete_all_points(case_doc.reference)
+    return manifest["pointCount"]
+
+
+def run(case_id: str = None, page_size: int = 50, dry_run: bool = False, delete_source: bool = False) -> dict:
+    cases_ref = db.collection("cases")
+    migrated = 0
+    samples = 0
+
+    if case_id:
+        case_doc = cases_ref.document(case_id).get()
+        if not case_doc.exists:
+            print(f"Case {case_id} not found")
+            return {"migrated": 0, "samples": 0}
+        pages = [[case_doc]]
+    else:
+        pages = _iter_case_pages(cases_ref, page_size)
+
+    for docs in pages:
+        for doc in docs:
+            moved = migrate_case(doc, dry_run=dry_run, delete_source=delete_source)
+            if moved:
+                migrated += 1
+                samples += moved
+                print(f"{'Would migrate' if dry_run else 'Migrated'} case {doc.id}: {moved} samples")
+
+    print(f"Done: {migrated} cases, {samples} samples {'to migrate' if dry_run else 'migrated'}.")
+    return {"migrated": migrated, "samples": samples}
+
+
+def _iter_case_pages(cases_ref, page_size: int):
+    last_doc_id = None
+    while True:
+        query = cases_ref.select(["trackStorage", track_storage.TRACK_STATUS_FIELD]).order_by(DOCUMENT_ID).limit(max(1, page_size))
+        if last_doc_id:
+            query = query.start_after({DOCUMENT_ID: last_doc_id})
+        docs = list(query.stream())
+        if not docs:
+            return
+        yield docs
+        last_doc_id = docs[-1].id
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move case tracks into chunked storage.")
+    parser.add_argument("--case-id", help="Migrate a single case.")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be migrated without writing.")
+    parser.add_argument("--delete-source", action="store_true", help="Delete allPoints documents after chunking.")
+    args = parser.parse_args()
+    run(case_id=args.case_id, page_size=args.page_size, dry_run=args.dry_run, delete_source=args.delete_source)
@@ -0,0 +1,69 @@
+"""
+Notification retention job: trims every user's notifications older than a configurable
+age, optionally moving them to a `notificationsArchive` subcollection first, so the
+notification collections that the bell icon queries stay small.
+
+Intended to run on a schedule (cron / a scheduled job on the host), e.g. nightly.
+Removal is chunked per user and unread counters are recounted afterwards.
+
+Usage (from trackx-backend/):
+    python scripts/prune_notifications.py [--days 90] [--archive] [--user-id UID] [--page-size 200]
+
+NOTIFICATION_RETENTION_DAYS sets the default age.
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from firebase.firebase_config import db
+from services.notifications_service import prune_notifications
+
+DOCUMENT_ID = FieldPath.document_id()
+NOTIFICATION_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", "90"))
+
+
+def _iter_user_ids(page_size: int):
+    last_doc_id = None
+    while True:
+        query = db.collection("users").select([DOCUMENT_ID]).order_by(DOCUMENT_ID).limit(max(1, page_size))
+        if last_doc_id:
+            query = query.start_after({DOCUMENT_ID: last_doc_id})
+        docs = list(query.stream())
+        if not docs:
+            return
+        for doc in docs:
+            yield doc.id
+        last_doc_id = docs[-1].id
+
+
+def run(days: int = NOTIFICATION_RETENTION_DAYS, archive: bool = False, user_id: str = None, page_size: int = 200) -> int:
+    # Notification timestamps are naive UTC ISO strings (see add_notifications_bulk)
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    user_ids = [user_id] if user_id else _iter_user_ids(page_size)
+
+    total = 0
+    for uid in user_ids:
+        removed = prune_notifications(uid, cutoff, archive=archive)
+        if removed:
+            total += removed
+            print(f"User {uid}: {'archived' if archive else 'deleted'} {removed} notifications")
+
+    print(f"Done: {total} notifications older than {days} days {'archived' if archive else 'deleted'}.")
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trim or archive old notifications.")
+    parser.add_argument("--days", type=int, default=NOTIFICATION_RETENTION_DAYS)
+    parser.add_argument("--archive", action="store_true", help="Move old notifications to notificationsArchive instead of deleting them.")
+    parser.add_argument("--user-id", help="Only prune this user's notifications.")
+    parser.add_argument("--page-size", type=int, default=200)
+    args = parser.parse_args()
+    run(days=args.days, archive=args.archive, user_id=args.user_id, page_size=args.page_size)
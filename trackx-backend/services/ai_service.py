@@ -2,6 +2,7 @@
 import json, os, re, httpx
 from typing import List, Dict, Any, Optional
 from firebase.firebase_config import db
+from services.blocking_io import run_blocking
 
 # -------- Helpers (new/updated) --------
 
@@ -268,7 +269,7 @@ async def generate_briefing_markdown(
     case_ids: List[str],
     backend: Optional[str] = None,
 ) -> str:
-    payload = build_briefing_payload(user_id, user_role, case_ids)
+    payload = await run_blocking(build_briefing_payload, user_id, user_role, case_ids)
     if not payload["cases"]:
         return "No accessible cases were provided."
 
@@ -4,6 +4,7 @@ from firebase.firebase_config import db
 from datetime import datetime
 from fastapi import HTTPException
 from models.user_model import UserRegisterRequest
+from services.blocking_io import run_blocking
 def verify_firebase_token(id_token: str):
     try:
         decoded_token = auth.verify_id_token(id_token)
@@ -13,7 +14,7 @@ def verify_firebase_token(id_token: str):
 
 
 async def register_user(user: UserRegisterRequest, id_token: str):
-    decoded_token = verify_firebase_token(id_token)
+    decoded_token = await run_blocking(verify_firebase_token, id_token)
     uid = decoded_token["uid"]
 
     user_doc = {
@@ -30,7 +31,7 @@ async def register_user(user: UserRegisterRequest, id_token: str):
     }
 
     try:
-        db.collection("users").document(uid).set(user_doc)
+        await run_blocking(db.collection("users").document(uid).set, user_doc)
         return uid
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save user data: {str(e)}")
\ No newline at end of file
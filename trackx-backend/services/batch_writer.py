@@ -0,0 +1,85 @@
+"""
+Chunked, parallel Firestore writes for bulk ingestion.
+
+A single WriteBatch is limited to 500 operations and commits serially, so large point
+uploads either fail outright or take one round trip after another. `write_documents`
+splits the writes into batches of at most WRITE_BATCH_SIZE operations. It commits up
+to WRITE_BATCH_CONCURRENCY of them at once on the blocking-I/O pool. A batch that
+fails with a transient error (contention, throttling, timeouts) is retried with
+exponential backoff. Each set() targets a fixed document id, so retrying a batch is
+idempotent.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from google.api_core import exceptions as gexc
+
+from services.blocking_io import run_blocking
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_WRITES = 500
+WRITE_BATCH_SIZE = min(int(os.getenv("WRITE_BATCH_SIZE", "500")), MAX_BATCH_WRITES)
+WRITE_BATCH_CONCURRENCY = int(os.getenv("WRITE_BATCH_CONCURRENCY", "8"))
+WRITE_BATCH_RETRIES = int(os.getenv("WRITE_BATCH_RETRIES", "5"))
+
+RETRYABLE_ERRORS = (
+    gexc.Aborted,
+    gexc.ServiceUnavailable,
+    gexc.ResourceExhausted,
+    gexc.DeadlineExceeded,
+)
+
+
+async def _commit_with_retry(db, chunk: List[Tuple[Any, Dict[str, Any]]], stats: Dict[str, Any]) -> None:
+    for attempt in range(WRITE_BATCH_RETRIES + 1):
+        batch = db.batch()
+        for doc_ref, data in chunk:
+            batch.set(doc_ref, data)
+        try:
+            await run_blocking(batch.commit)
+            return
+        except RETRYABLE_ERRORS as e:
+            if attempt == WRITE_BATCH_RETRIES:
+                raise
+            stats["retries"] += 1
+            delay = min(8.0, 0.25 * (2 ** attempt)) * (0.5 + random.random())
+            logger.warning(f"Batch commit of {len(chunk)} writes failed ({e.__class__.__name__}); retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+
+async def write_documents(
+    db,
+    writes: Iterable[Tuple[Any, Dict[str, Any]]],
+    batch_size: int = WRITE_BATCH_SIZE,
+    concurrency: int = WRITE_BATCH_CONCURRENCY,
+    on_progress: Optional[Callable[[int], Awaitable[None]]] = None,
+) -> Dict[str, Any]:
+    """
+    Set every (document reference, data) pair, batch_size writes per commit with at most
+    `concurrency` commits in flight. `on_progress`, if given, is awaited with the size of
+    each committed batch. Returns write statistics including writes/sec.
+    """
+    writes = list(writes)
+    batch_size = max(1, min(int(batch_size), MAX_BATCH_WRITES))
+    chunks = [writes[i:i + batch_size] for i in range(0, len(writes), batch_size)]
+    stats = {"writes": len(writes), "batches": len(chunks), "retries": 0}
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def _run(chunk):
+        async with semaphore:
+            await _commit_with_retry(db, chunk, stats)
+        if on_progress is not None:
+            await on_progress(len(chunk))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(_run(chunk) for chunk in chunks))
+    elapsed = time.perf_counter() - started
+
+    stats["seconds"] = round(elapsed, 3)
+    stats["writesPerSecond"] = round(len(writes) / elapsed, 1) if elapsed > 0 else float(len(writes))
+    return stats
@@ -0,0 +1,28 @@
+"""
+Bounded worker pool for blocking I/O called from async code.
+
+The Firestore admin client and the OpenAI SDK are synchronous. Calling them directly
+inside an `async def` holds the event loop for the whole RPC, so one slow scan stalls
+every other request on the worker. `run_blocking` hands the call to a capped thread
+pool instead; BLOCKING_IO_WORKERS bounds how many calls run at once.
+"""
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List
+
+BLOCKING_IO_WORKERS = int(os.getenv("BLOCKING_IO_WORKERS", "32"))
+
+_executor = ThreadPoolExecutor(max_workers=BLOCKING_IO_WORKERS, thread_name_prefix="blocking-io")
+
+
+async def run_blocking(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a synchronous callable on the shared pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+async def fetch_all(query) -> List[Any]:
+    """Stream a Firestore query (or collection) on the pool and return the snapshots."""
+    return await run_blocking(lambda: list(query.stream()))
@@ -0,0 +1,178 @@
+"""
+caseNumber -> case document id index.
+
+`caseNumbers/{encoded caseNumber}` holds `{caseId, caseNumber}` for every case. The
+index is written in the same transaction as the case document on create, and on a
+case-number change in update_case. Because the write fails when the number already
+belongs to another case, the index also enforces uniqueness.
+
+Lookups go through an in-process TTL cache. The callers then read the case document
+by id, and `get_case_by_number` checks that document's caseNumber. A mapping made
+stale by a rename in another worker is therefore dropped and re-resolved instead of
+being trusted. Cases created before the index fall back to the old `caseNumber ==`
+query once, which also writes their mapping. scripts/backfill_case_numbers.py indexes
+all of them at once.
+"""
+import logging
+import os
+import threading
+from typing import Optional
+from urllib.parse import quote
+
+from cachetools import TTLCache
+from firebase_admin import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from firebase.firebase_config import db
+from services.blocking_io import fetch_all, run_blocking
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_ID = FieldPath.document_id()
+CASE_NUMBER_COLLECTION = "caseNumbers"
+CASE_NUMBER_CACHE_TTL_SECONDS = float(os.getenv("CASE_NUMBER_CACHE_TTL_SECONDS", "300"))
+CASE_NUMBER_CACHE_SIZE = int(os.getenv("CASE_NUMBER_CACHE_SIZE", "10000"))
+
+_cache: TTLCache = TTLCache(maxsize=CASE_NUMBER_CACHE_SIZE, ttl=CASE_NUMBER_CACHE_TTL_SECONDS)
+_cache_lock = threading.Lock()
+
+
+class CaseNumberTakenError(ValueError):
+    """The case number is already assigned to another case."""
+
+    def __init__(self, case_number: str):
+        super().__init__(f"Case number '{case_number}' is already in use")
+        self.case_number = case_number
+
+
+def case_number_doc_id(case_number: str) -> str:
+    # Document ids cannot contain "/", be "." or "..", or look like "__reserved__"
+    return quote(str(case_number), safe="").replace(".", "%2E").replace("_", "%5F")
+
+
+def _mapping_ref(case_number: str):
+    return db.collection(CASE_NUMBER_COLLECTION).document(case_number_doc_id(case_number))
+
+
+def _cache_get(case_number: str) -> Optional[str]:
+    with _cache_lock:
+        return _cache.get(case_number)
+
+
+def _cache_set(case_number: str, case_id: str) -> None:
+    with _cache_lock:
+        _cache[case_number] = case_id
+
+
+def invalidate(case_number: Optional[str]) -> None:
+    if case_number:
+        with _cache_lock:
+            _cache.pop(case_number, None)
+
+
+def claim_in_transaction(
+    transaction, case_number: Optional[str], case_id: str, previous_number: Optional[str] = None
+) -> None:
+    """
+    Assign `case_number` to `case_id` as part of `transaction`, releasing
+    `previous_number` when the case is renumbered. Raises CaseNumberTakenError when
+    another case holds the number; a case not yet in the index counts as holding it.
+    Firestore requires every transaction read before the first write, so this must run
+    before the caller's own writes.
+    """
+    if not case_number:
+        return
+    mapping_ref = _mapping_ref(case_number)
+    snap = mapping_ref.get(transaction=transaction)
+    if snap.exists:
+        owner = (snap.to_dict() or {}).get("caseId")
+        if owner and owner != case_id:
+            raise CaseNumberTakenError(case_number)
+    else:
+        legacy = db.collection("cases").where("caseNumber", "==", case_number).select([DOCUMENT_ID]).limit(2)
+        if any(doc.id != case_id for doc in transaction.get(legacy)):
+            raise CaseNumberTakenError(case_number)
+
+    previous_ref = None
+    if previous_number and previous_number != case_number:
+        previous_ref = _mapping_ref(previous_number)
+        previous = previous_ref.get(transaction=transaction)
+        if not (previous.exists and (previous.to_dict() or {}).get("caseId") == case_id):
+            previous_ref = None
+
+    if previous_ref is not None:
+        transaction.delete(previous_ref)
+    transaction.set(mapping_ref, {
+        "caseId": case_id,
+        "caseNumber": case_number,
+        "updatedAt": firestore.SERVER_TIMESTAMP,
+    })
+
+
+def release_in_transaction(transaction, case_number: Optional[str], case_id: str) -> None:
+    """Remove the mapping of `case_number` if it still points at `case_id`."""
+    if not case_number:
+        return
+    mapping_ref = _mapping_ref(case_number)
+    snap = mapping_ref.get(transaction=transaction)
+    if snap.exists and (snap.to_dict() or {}).get("caseId") == case_id:
+        transaction.delete(mapping_ref)
+
+
+def _lookup(case_number: str) -> Optional[str]:
+    snap = _mapping_ref(case_number).get()
+    if snap.exists:
+        return (snap.to_dict() or {}).get("caseId")
+    return None
+
+
+async def resolve_case_id(case_number: str, use_cache: bool = True) -> Optional[str]:
+    """Document id of the case with this caseNumber, or None. Misses are not cached."""
+    if use_cache:
+        case_id = _cache_get(case_number)
+        if case_id:
+            return case_id
+
+    case_id = await run_blocking(_lookup, case_number)
+    if not case_id:
+        # Case created before the index existed: find it once and index it
+        docs = await fetch_all(db.collection("cases").where("caseNumber", "==", case_number).select([DOCUMENT_ID]).limit(1))
+        if not docs:
+            return None
+        case_id = docs[0].id
+        try:
+            await run_blocking(_mapping_ref(case_number).create, {
+                "caseId": case_id,
+                "caseNumber": case_number,
+                "updatedAt": firestore.SERVER_TIMESTAMP,
+            })
+        except Exception as e:
+            # Another request indexed it first
+            logger.debug(f"caseNumber mapping for {case_number} not written: {e}")
+
+    _cache_set(case_number, case_id)
+    return case_id
+
+
+async def get_case_by_number(case_number: str):
+    """The case document snapshot for a caseNumber, or None."""
+    for attempt in range(3):
+        case_id = await resolve_case_id(case_number, use_cache=attempt == 0)
+        if not case_id:
+            return None
+        snap = await run_blocking(db.collection("cases").document(case_id).get)
+        if snap.exists and (snap.to_dict() or {}).get("caseNumber") == case_number:
+            return snap
+        # Stale mapping (renamed or deleted case): retry past the cache, then past the index
+        invalidate(case_number)
+        if attempt > 0:
+            await run_blocking(_delete_stale_mapping, case_number, case_id)
+    return None
+
+
+def _delete_stale_mapping(case_number: str, case_id: str) -> None:
+    @firestore.transactional
+    def _delete(transaction):
+        release_in_transaction(transaction, case_number, case_id)
+
+    _delete(db.transaction())
@@ -1,21 +1,34 @@
 from firebase.firebase_config import db
 from google.cloud.firestore_v1 import DocumentReference
+from google.cloud.firestore_v1.field_path import FieldPath
 from google.api_core.datetime_helpers import DatetimeWithNanoseconds
 from models.case_model import CaseCreateRequest
 import uuid
+import asyncio
+import hashlib
 from google.cloud import firestore
 import logging
 from collections import defaultdict
 from datetime import datetime
 import pytz
 import json
+import base64
 import requests
 import time
 from datetime import timedelta
 from datetime import timezone
 from datetime import datetime
-from typing import List, Dict, Any, Optional, Tuple
-from services.notifications_service import add_notification  # Import the notifications service
+from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable
+from services.notifications_service import add_notifications_bulk  # Import the notifications service
+from services import notification_digest
+from services.blocking_io import run_blocking, fetch_all
+from services import track_storage, track_upload, czml_cache, case_numbers
+from services.case_numbers import CaseNumberTakenError
+from services.czml_service import generate_czml
+from services.route_interpolation import ORS_API_KEY, interpolate_points_with_ors
+from services.batch_writer import write_documents
+from services.jobs_service import JobProgress, enqueue_job
+from services.derivations_service import compute_and_store_rollup
 import os
 from dotenv import load_dotenv
 from openai import OpenAI
@@ -29,7 +42,6 @@ load_dotenv()  # loads OPENAI_API_KEY from .env (safe in dev)
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 db = firestore.client()
 
-# SIMULATION_PROGRESS = {}
 logger = logging.getLogger(__name__)
 
 def sanitize_firestore_data(data):
@@ -129,28 +141,86 @@ def _case_accessible_to_user(case_data: Dict[str, Any], user_id: str) -> bool:
     return case_data.get("userId") == user_id
 
 
-def _get_case_documents_for_user(user_id: str, include_deleted: bool = False) -> Dict[str, Any]:
-    """
-    Returns all case documents for a user, excluding soft-deleted ones unless include_deleted=True.
-    Works even if 'is_deleted' doesn't exist on some documents.
-    """
-    cases_ref = db.collection("cases")
-    docs_map: Dict[str, Any] = {}
+# Bumped whenever the canonical case layout written by _canonical_case_fields changes.
+# scripts/backfill_case_schema.py upgrades older documents to this version.
+CASE_SCHEMA_VERSION = 2
 
-    all_docs = list(cases_ref.stream())
+DOCUMENT_ID = FieldPath.document_id()
 
-    for doc in all_docs:
-        data = doc.to_dict() or {}
 
-        if not include_deleted and data.get("is_deleted", False):
-            continue
+class CaseNotFoundError(LookupError):
+    """The case document does not exist."""
 
-        if user_id and not _case_accessible_to_user(data, user_id):
-            continue
 
-        docs_map[doc.id] = doc
+PROVINCE_CODES_BY_SLUG = {
+    "western-cape": "WC",
+    "eastern-cape": "EC",
+    "northern-cape": "NC",
+    "free-state": "FS",
+    "kwazulu-natal": "KZN",
+    "north-west": "NW",
+    "gauteng": "GP",
+    "mpumalanga": "MP",
+    "limpopo": "LP",
+}
+
+
+def _slugify(name: str) -> str:
+    try:
+        s = "".join(ch.lower() if ch.isalnum() else "-" for ch in name)
+        while "--" in s:
+            s = s.replace("--", "-")
+        return s.strip("-")
+    except Exception:
+        return name
+
+
+def _province_code_for(name: Optional[str]) -> Optional[str]:
+    """Map a province name, slug or code onto its canonical province code."""
+    if not name:
+        return None
+    cleaned = name.strip()
+    if cleaned.upper() in PROVINCE_CODES_BY_SLUG.values():
+        return cleaned.upper()
+    return PROVINCE_CODES_BY_SLUG.get(_slugify(cleaned))
+
 
-    return docs_map
+def _canonical_case_fields(case_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Return the canonical, query-friendly fields for a case document:
+    membership (`userIds`/`userId`/`isShared`), `provinceCode`, `provinceName`,
+    a normalized `regionKey`, an explicit `is_deleted` flag and `schemaVersion`.
+    """
+    normalized = _normalize_case_user_fields(dict(case_data))
+    province_name = (normalized.get("provinceName") or normalized.get("region") or "").strip()
+    fields = {
+        "userIds": normalized["userIds"],
+        "userId": normalized["userId"],
+        "isShared": normalized["isShared"],
+        "provinceCode": normalized.get("provinceCode") or _province_code_for(province_name),
+        "provinceName": province_name or None,
+        "regionKey": _slugify(province_name) if province_name else None,
+        "is_deleted": bool(normalized.get("is_deleted", False)),
+        "schemaVersion": CASE_SCHEMA_VERSION,
+    }
+    return fields
+
+
+def _get_case_documents_for_user(user_id: str, include_deleted: bool = False) -> Dict[str, Any]:
+    """
+    Returns all case documents for a user, excluding soft-deleted ones unless include_deleted=True.
+
+    Relies on the canonical schema (see _canonical_case_fields): membership is a single
+    `userIds` array_contains filter and deletion an `is_deleted` equality filter, so only
+    the user's own documents are read.
+    """
+    query = db.collection("cases")
+    if user_id:
+        query = query.where("userIds", "array_contains", user_id)
+    if not include_deleted:
+        query = query.where("is_deleted", "==", False)
+
+    return {doc.id: doc for doc in query.stream()}
 from firebase_admin import firestore
 from firebase_admin.firestore import SERVER_TIMESTAMP
 from openai import OpenAI
@@ -166,13 +236,20 @@ async def fetch_annotation_descriptions(case_id: str) -> list:
     """
     doc_ref = db.collection("cases").document(case_id)
     candidate_subcollections = [
-        "locations", "annotations", "locationAnnotations", "points", "allPoints", "notes"
+        "locations", "annotations", "locationAnnotations", "points", "notes"
     ]
     descriptions = []
+    try:
+        for point in await track_storage.fetch_track_points(doc_ref):
+            v = point.get("description")
+            if v and isinstance(v, str) and v.strip():
+                descriptions.append(v.strip())
+    except Exception as e:
+        logger.debug(f"Could not read track points for case {case_id}: {e}")
     for col in candidate_subcollections:
         try:
             coll_ref = doc_ref.collection(col)
-            docs = list(coll_ref.stream())
+            docs = await fetch_all(coll_ref)
             for d in docs:
                 data = d.to_dict() or {}
                 # common keys where human text might live
@@ -184,7 +261,7 @@ async def fetch_annotation_descriptions(case_id: str) -> list:
             logger.debug(f"Could not read subcollection {col} for case {case_id}: {e}")
     # also check top-level fields on the case doc
     try:
-        case_doc = doc_ref.get()
+        case_doc = await run_blocking(doc_ref.get)
         if case_doc.exists:
             case_data = case_doc.to_dict() or {}
             for k in ("reportNotes", "annotations", "locationDescriptions"):
@@ -229,7 +306,8 @@ async def generate_case_intro(case_title: str, region: str, date: str) -> str:
         f"Context: {facts_str}"
     )
 
-    resp = client.chat.completions.create(
+    resp = await run_blocking(
+        client.chat.completions.create,
         model="gpt-4o-mini",
         messages=[
             {"role": "system", "content": "You are a forensic analyst writing concise, formal introductions."},
@@ -272,7 +350,8 @@ async def generate_case_conclusion(case_title: str, region: str, intro_text: str
         "Output: one paragraph only."
     )
 
-    resp = client.chat.completions.create(
+    resp = await run_blocking(
+        client.chat.completions.create,
         model="gpt-4o-mini",
         messages=[
             {"role": "system", "content": "You are a forensic analyst writing clear, objective conclusions."},
@@ -297,7 +376,8 @@ async def suggest_text_improvement(text: str, context_type: str = "general") ->
         f"Text:\n{text}"
     )
 
-    resp = client.chat.completions.create(
+    resp = await run_blocking(
+        client.chat.completions.create,
         model="gpt-4o-mini",
         messages=[
             {"role": "system", "content": "You are a helpful and precise editor."},
@@ -312,7 +392,7 @@ async def suggest_text_improvement(text: str, context_type: str = "general") ->
 # --- Combined helper that creates both and stores to Firestore with aligned keys ---
 async def add_intro_conclusion(case_id: str):
     doc_ref = db.collection("cases").document(case_id)
-    doc = doc_ref.get()
+    doc = await run_blocking(doc_ref.get)
     if not doc.exists:
         return False, "Case not found"
 
@@ -340,7 +420,7 @@ async def add_intro_conclusion(case_id: str):
     )
 
     # store using the keys the frontend expects
-    doc_ref.update({
+    await run_blocking(doc_ref.update, {
         "reportIntro": intro,
         "reportConclusion": conclusion,
         "updatedAt": SERVER_TIMESTAMP
@@ -348,6 +428,100 @@ async def add_intro_conclusion(case_id: str):
 
     return True, {"reportIntro": intro, "reportConclusion": conclusion}
 
+# Fields returned by the paginated case list; everything else stays on the server.
+CASE_LIST_FIELDS = [
+    "caseNumber",
+    "caseTitle",
+    "dateOfIncident",
+    "region",
+    "provinceCode",
+    "provinceName",
+    "districtCode",
+    "districtName",
+    "between",
+    "status",
+    "urgency",
+    "userId",
+    "userIds",
+    "isShared",
+    "is_deleted",
+    "createdAt",
+    "updatedAt",
+]
+
+
+def _build_case_search_query(
+    case_name: str = "",
+    region: str = "",
+    date: str = "",
+    user_id: str = "",
+    status: str = "",
+    urgency: str = "",
+    include_deleted: bool = False,
+    province: str = "",
+    provinceCode: str = "",
+    provinceName: str = "",
+    district: str = "",
+    districtCode: str = "",
+    districtName: str = "",
+):
+    """
+    Build the single indexed query behind case search. Cases carry canonical fields
+    (see _canonical_case_fields), so every filter is a server-side predicate and the
+    result needs no Python re-filter pass.
+    """
+    # Normalize province/district inputs early so the query can use canonical fields
+    eff_province_code = (provinceCode or province or "").strip()
+    eff_province_name = (provinceName or region or "").strip()
+    eff_district_code = (districtCode or district or "").strip()
+    eff_district_name = (districtName or "").strip()
+
+    query = db.collection("cases")
+    if user_id:
+        query = query.where("userIds", "array_contains", user_id)
+    if not include_deleted:
+        query = query.where("is_deleted", "==", False)
+    if case_name:
+        query = query.where("caseTitle", "==", case_name)
+    if eff_province_code:
+        query = query.where("provinceCode", "==", _province_code_for(eff_province_code) or eff_province_code)
+    elif eff_province_name:
+        query = query.where("regionKey", "==", _slugify(eff_province_name))
+    if eff_district_code:
+        query = query.where("districtCode", "==", eff_district_code)
+    elif eff_district_name:
+        query = query.where("districtName", "==", eff_district_name)
+    if date:
+        query = query.where("dateOfIncident", "==", date)
+    if status:
+        query = query.where("status", "==", status)
+    if urgency:
+        query = query.where("urgency", "==", urgency)
+    return query
+
+
+def _encode_case_cursor(doc) -> str:
+    created_at = (doc.to_dict() or {}).get("createdAt")
+    payload = {
+        "createdAt": created_at.isoformat() if hasattr(created_at, "isoformat") else created_at,
+        "id": doc.id,
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii")
+
+
+def _decode_case_cursor(cursor: str) -> Dict[str, Any]:
+    """Query position of a cursor from _encode_case_cursor. Raises ValueError when it is invalid."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        created_at = payload.get("createdAt")
+        if isinstance(created_at, str):
+            created_at = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+        return {"createdAt": created_at, DOCUMENT_ID: str(payload["id"])}
+    except Exception as e:
+        logger.warning(f"Rejecting invalid case cursor: {e}")
+        raise ValueError("Invalid cursor") from e
+
+
 async def search_cases(
     case_name: str = "",
     region: str = "",
@@ -371,237 +545,546 @@ async def search_cases(
             f"district={district or districtName or districtCode}, include_deleted={include_deleted}"
         )
 
-        # Normalize province/district inputs early so both user and non-user paths can use them
-        eff_province_code = (provinceCode or province or "").strip()
-        eff_province_name = (provinceName or region or "").strip()
-        eff_district_code = (districtCode or district or "").strip()
-        eff_district_name = (districtName or "").strip()
+        query = _build_case_search_query(
+            case_name=case_name,
+            region=region,
+            date=date,
+            user_id=user_id,
+            status=status,
+            urgency=urgency,
+            include_deleted=include_deleted,
+            province=province,
+            provinceCode=provinceCode,
+            provinceName=provinceName,
+            district=district,
+            districtCode=districtCode,
+            districtName=districtName,
+        )
 
-        def _slugify(name: str) -> str:
-            try:
-                s = "".join(ch.lower() if ch.isalnum() else "-" for ch in name)
-                while "--" in s:
-                    s = s.replace("--", "-")
-                return s.strip("-")
-            except Exception:
-                return name
+        results = []
+        for doc in await fetch_all(query):
+            normalized = _normalize_case_user_fields(doc.to_dict() or {})
+            sanitized = sanitize_firestore_data(normalized)
+            sanitized["doc_id"] = doc.id
+            results.append(sanitized)
 
-        province_slug = _slugify(eff_province_name) if eff_province_name else ""
-        province_lower = eff_province_name.lower() if eff_province_name else ""
+        return results
 
-        if user_id:
-            docs_map = _get_case_documents_for_user(user_id, include_deleted=include_deleted)
-            documents = list(docs_map.values())
-        else:
-            cases_ref = db.collection("cases")
-
-            def apply_common(q):
-                if case_name:
-                    q = q.where("caseTitle", "==", case_name)
-                if eff_district_code:
-                    q = q.where("districtCode", "==", eff_district_code)
-                elif eff_district_name:
-                    q = q.where("districtName", "==", eff_district_name)
-                if date:
-                    q = q.where("dateOfIncident", "==", date)
-                if status:
-                    q = q.where("status", "==", status)
-                if urgency:
-                    q = q.where("urgency", "==", urgency)
-                return q
-
-            province_slug = _slugify(eff_province_name) if eff_province_name else ""
-            province_lower = (eff_province_name or "").strip().lower()
-
-            query_refs = []
-            if eff_province_code or eff_province_name:
-                if eff_province_code:
-                    query_refs.append(apply_common(cases_ref.where("provinceCode", "==", eff_province_code)))
-                if eff_province_name:
-                    query_refs.append(apply_common(cases_ref.where("provinceName", "==", eff_province_name)))
-                    query_refs.append(apply_common(cases_ref.where("region", "==", eff_province_name)))
-                    if province_slug and province_slug != eff_province_name:
-                        query_refs.append(apply_common(cases_ref.where("region", "==", province_slug)))
-                    if province_lower and province_lower != eff_province_name and province_lower != province_slug:
-                        query_refs.append(apply_common(cases_ref.where("region", "==", province_lower)))
-            else:
-                base = apply_common(cases_ref)
-                if region:
-                    base = base.where("region", "==", region)
-                    reg_slug = _slugify(region)
-                    if reg_slug and reg_slug != region:
-                        query_refs.append(apply_common(cases_ref.where("region", "==", reg_slug)))
-                    reg_lower = region.strip().lower()
-                    if reg_lower and reg_lower not in (region, reg_slug):
-                        query_refs.append(apply_common(cases_ref.where("region", "==", reg_lower)))
-                query_refs.append(base)
-
-            docs_map_local = {}
-            for qr in query_refs:
-                for d in qr.stream():
-                    docs_map_local[d.id] = d
-            documents = list(docs_map_local.values())
+    except Exception as e:
+        print(f"Unhandled exception in search_cases: {e}")
+        raise
 
-        results = []
-        seen_ids = set()
-        for doc in documents:
-            if doc.id in seen_ids:
-                continue
-            data = doc.to_dict() or {}
 
-            if not include_deleted and data.get("is_deleted", False):
-                continue
+async def search_cases_paginated(limit: int = 25, cursor: Optional[str] = None, **filters):
+    """Page through case search results, newest first.
 
-            normalized = _normalize_case_user_fields(dict(data))
-            if not _case_accessible_to_user(normalized, user_id):
-                continue
-            if case_name and normalized.get("caseTitle") != case_name:
-                continue
-            if eff_province_code:
-                reg_val = (normalized.get("region") or "").strip()
-                reg_norm = reg_val.lower()
-                if not (
-                    normalized.get("provinceCode") == eff_province_code
-                    or (
-                        eff_province_name
-                        and (
-                            normalized.get("provinceName") == eff_province_name
-                            or reg_val == eff_province_name
-                            or (province_slug and reg_val == province_slug)
-                            or (province_lower and reg_norm == province_lower)
-                        )
-                    )
-                ):
-                    continue
-            elif eff_province_name:
-                reg_val = (normalized.get("region") or "").strip()
-                reg_norm = reg_val.lower()
-                if not (
-                    normalized.get("provinceName") == eff_province_name
-                    or reg_val == eff_province_name
-                    or (province_slug and reg_val == province_slug)
-                    or (province_lower and reg_norm == province_lower)
-                ):
-                    continue
-            if eff_district_code and (normalized.get("districtCode") != eff_district_code):
-                continue
-            if (not eff_district_code) and eff_district_name and (normalized.get("districtName") != eff_district_name):
-                continue
-            if region and not (eff_province_code or eff_province_name):
-                if normalized.get("region") != region:
-                    continue
-            if date and normalized.get("dateOfIncident") != date:
-                continue
-            if status and normalized.get("status") != status:
-                continue
-            if urgency and normalized.get("urgency") != urgency:
-                continue
+    Accepts the same filters as search_cases. Only CASE_LIST_FIELDS are read.
+    Returns (cases, next_cursor)
+    - cases: list of sanitized list-view case dicts with `doc_id`
+    - next_cursor: opaque string to pass back for the next page, or None when done
+    Raises ValueError for a malformed cursor.
+    """
+    position = _decode_case_cursor(cursor) if cursor else None
+    try:
+        page_size = max(1, min(int(limit), 100))
+        query = (
+            _build_case_search_query(**filters)
+            .select(CASE_LIST_FIELDS)
+            .order_by("createdAt", direction=firestore.Query.DESCENDING)
+            .order_by(DOCUMENT_ID, direction=firestore.Query.DESCENDING)
+            .limit(page_size)
+        )
+
+        if position:
+            query = query.start_after(position)
+
+        docs = await fetch_all(query)
+        results = []
+        for doc in docs:
+            normalized = _normalize_case_user_fields(doc.to_dict() or {})
             sanitized = sanitize_firestore_data(normalized)
             sanitized["doc_id"] = doc.id
             results.append(sanitized)
-            seen_ids.add(doc.id)
 
-        return results
+        next_cursor = _encode_case_cursor(docs[-1]) if len(docs) == page_size else None
+        return results, next_cursor
 
     except Exception as e:
-        print(f"Unhandled exception in search_cases: {e}")
+        print(f"Unhandled exception in search_cases_paginated: {e}")
         raise
 
-async def create_case(payload: CaseCreateRequest) -> str:
-    """Create a new case with optional GPS points and allPoints data."""
+TRACK_SUMMARY_FIELDS = ["lastPoint", "pointCount", "trackStart", "trackEnd", "bbox", "trackVersion"]
+# Held on the case while an upload appends chunks; a lock not refreshed for this long is stale
+UPLOAD_LOCK_FIELD = "trackUploadLock"
+TRACK_UPLOAD_LOCK_SECONDS = float(os.getenv("TRACK_UPLOAD_LOCK_SECONDS", "600"))
+
+
+def _point_time(ts) -> Optional[datetime]:
+    """Parse a point timestamp (datetime or ISO string) into an aware UTC datetime."""
     try:
-        case_id = str(uuid.uuid4())
-
-        payload_dict = payload.dict(by_alias=True)
-        payload_dict.update(payload.dict())
-        user_ids, primary_user = _extract_user_ids_from_payload_dict(payload_dict)
-        if primary_user and primary_user not in user_ids:
-            user_ids.insert(0, primary_user)
-
-        is_shared = len(user_ids) > 1
-
-        # Main case metadata
-        case_data = {
-            "caseNumber": payload.case_number,
-            "caseTitle": payload.case_title,
-            "dateOfIncident": payload.date_of_incident,
-            "region": payload.region,
-            "provinceCode": payload.province_code,
-            "provinceName": payload.province_name or payload.region,
-            "districtCode": payload.district_code,
-            "districtName": payload.district_name,
-            "between": payload.between,
-            "urgency": payload.urgency, 
-            "createdAt": firestore.SERVER_TIMESTAMP,
-            "status": "in progress",
-            "userId": primary_user or (user_ids[0] if user_ids else None),
-            "userIds": list(user_ids),
-            "isShared": is_shared,
+        if isinstance(ts, str):
+            ts = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+        if isinstance(ts, datetime):
+            return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+    except ValueError:
+        pass
+    return None
+
+
+def _merge_track_summary(summary: Optional[Dict[str, Any]], points: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Fold newly appended allPoints samples into a case's denormalized track summary:
+    `lastPoint` {lat, lng, timestamp, description}, `pointCount`, `trackStart`/`trackEnd`
+    and `bbox` {minLat, minLng, maxLat, maxLng}. Pass an empty summary for a new track.
+
+    `trackVersion` is a content hash chained over every appended batch: it changes
+    whenever points are added, so artifacts derived from the track (CZML, interpolations)
+    can be keyed on it without re-reading the points.
+    """
+    summary = summary or {}
+    digest = hashlib.sha256((summary.get("trackVersion") or "").encode())
+    last_point = summary.get("lastPoint")
+    last_time = _point_time(last_point.get("timestamp")) if last_point else None
+    start = _point_time(summary.get("trackStart"))
+    end = _point_time(summary.get("trackEnd"))
+    bbox = dict(summary.get("bbox") or {})
+    count = previous_count = int(summary.get("pointCount") or 0)
+
+    for point in points:
+        lat, lng = point.get("lat"), point.get("lng")
+        if lat is None or lng is None:
+            continue
+        count += 1
+        bbox = {
+            "minLat": min(lat, bbox.get("minLat", lat)),
+            "minLng": min(lng, bbox.get("minLng", lng)),
+            "maxLat": max(lat, bbox.get("maxLat", lat)),
+            "maxLng": max(lng, bbox.get("maxLng", lng)),
         }
+        point_time = _point_time(point.get("timestamp"))
+        # Rounded to the chunked-storage precision so both layouts hash identically
+        digest.update(
+            f"{round(lat, 7)},{round(lng, 7)},{point_time.isoformat() if point_time else point.get('timestamp')},"
+            f"{point.get('description') or ''};".encode()
+        )
+        if point_time is not None:
+            start = point_time if start is None else min(start, point_time)
+            end = point_time if end is None else max(end, point_time)
+        # Latest timestamp wins; untimed points only count when nothing better is known
+        if last_point is None or (point_time is not None and (last_time is None or point_time >= last_time)):
+            last_point = {
+                "lat": lat,
+                "lng": lng,
+                "timestamp": point.get("timestamp"),
+                "description": point.get("description"),
+            }
+            last_time = point_time
+
+    return {
+        "lastPoint": last_point,
+        "pointCount": count,
+        "trackStart": start,
+        "trackEnd": end,
+        "bbox": bbox or None,
+        "trackVersion": digest.hexdigest()[:32] if count > previous_count else summary.get("trackVersion"),
+    }
 
-        # Save case document
-        db.collection("cases").document(case_id).set(case_data)
-        logger.info(f"Created case document with ID: {case_id}")
-
-        # Handle `csv_data` → "points" subcollection
-        if payload.csv_data:
-            batch = db.batch()
-            points_ref = db.collection("cases").document(case_id).collection("points")
-
-            for point in payload.csv_data:
-                point_doc = points_ref.document()
-                batch.set(point_doc, {
-                    "lat": point.latitude,
-                    "lng": point.longitude,
-                    "timestamp": point.timestamp,
-                    "speed": getattr(point, "speed", None),
-                    "altitude": getattr(point, "altitude", None),
-                    "heading": getattr(point, "heading", None),
-                    "accuracy": getattr(point, "accuracy", None),
-                    "additional_data": getattr(point, "additional_data", None),
-                    "createdAt": firestore.SERVER_TIMESTAMP
-                })
 
-            batch.commit()
-            logger.info(f"Added {len(payload.csv_data)} points to case {case_id}")
-
-        # Handle `all_points` → "allPoints" subcollection
-        if hasattr(payload, "all_points") and payload.all_points:
-            batch = db.batch()
-            allpoints_ref = db.collection("cases").document(case_id).collection("allPoints")
-
-            for point in payload.all_points:
-                point_doc = allpoints_ref.document()
-                batch.set(point_doc, {
-                    "lat": point.latitude,
-                    "lng": point.longitude,
-                    "timestamp": point.timestamp,
-                    "description": getattr(point, "description", None),
-                    "createdAt": firestore.SERVER_TIMESTAMP
-                })
+async def record_appended_points(
+    case_id: str, points: List[Dict[str, Any]], extra_fields: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Update the track summary on a case after points were appended to its allPoints
+    subcollection. Runs in a transaction so concurrent appends don't lose counts.
+    `extra_fields` are written in the same update (e.g. a new trackStorage manifest).
+    """
+    case_ref = db.collection("cases").document(case_id)
+
+    @firestore.transactional
+    def _update(transaction):
+        snap = case_ref.get(field_paths=TRACK_SUMMARY_FIELDS, transaction=transaction)
+        summary = _merge_track_summary(snap.to_dict() if snap.exists else {}, points)
+        transaction.update(case_ref, {**summary, **(extra_fields or {})})
+        return summary
 
-            batch.commit()
-            logger.info(f"Added {len(payload.all_points)} allPoints to case {case_id}")
-        
-                # Trigger notification
-        notified = set()
-        for uid in user_ids:
-            if uid and uid not in notified:
-                await add_notification(
-                    user_id=uid,
-                    title="Case Created",
-                    message=f"A new case titled '{case_data['caseTitle']}' has been created.",
-                    notification_type="case-created"
-                )
-                notified.add(uid)
-                logger.info(f"Notification sent to user {uid} for case creation.")
+    return await run_blocking(_update, db.transaction())
 
+
+async def _create_case_document(
+    payload: CaseCreateRequest, background: bool = False
+) -> Tuple[str, Dict[str, Any], List[Dict[str, Any]], List[str]]:
+    """
+    Write the case document. Returns (case_id, case_data, track_points, user_ids).
+
+    With chunked track storage the chunks are written first, so the case is created
+    with its complete `trackStorage` manifest and track summary. Otherwise (allPoints
+    documents, or a background ingestion job) the points are written after the case:
+    it is created with `trackStatus` pending and an empty summary, and
+    _write_case_points stores the summary and trackVersion once every point is written.
+    Until then readers see an empty track, and nothing derived from a partial track can
+    be cached under the final trackVersion.
+    """
+    case_id = str(uuid.uuid4())
+
+    payload_dict = payload.dict(by_alias=True)
+    payload_dict.update(payload.dict())
+    user_ids, primary_user = _extract_user_ids_from_payload_dict(payload_dict)
+    if primary_user and primary_user not in user_ids:
+        user_ids.insert(0, primary_user)
+
+    is_shared = len(user_ids) > 1
+
+    # Main case metadata
+    case_data = {
+        "caseNumber": payload.case_number,
+        "caseTitle": payload.case_title,
+        "dateOfIncident": payload.date_of_incident,
+        "region": payload.region,
+        "provinceCode": payload.province_code,
+        "provinceName": payload.province_name or payload.region,
+        "districtCode": payload.district_code,
+        "districtName": payload.district_name,
+        "between": payload.between,
+        "urgency": payload.urgency, 
+        "createdAt": firestore.SERVER_TIMESTAMP,
+        "status": "in progress",
+        "userId": primary_user or (user_ids[0] if user_ids else None),
+        "userIds": list(user_ids),
+        "isShared": is_shared,
+        "is_deleted": False,
+    }
+    case_data.update(_canonical_case_fields(case_data))
+    track_points = [
+        {
+            "lat": point.latitude,
+            "lng": point.longitude,
+            "timestamp": point.timestamp,
+            "description": getattr(point, "description", None),
+        }
+        for point in (getattr(payload, "all_points", None) or [])
+    ]
+
+    # Save case document together with its caseNumber index entry
+    case_ref = db.collection("cases").document(case_id)
+
+    prewrite_chunks = bool(track_points) and track_storage.chunked_storage_enabled() and not background
+    if prewrite_chunks or not track_points:
+        case_data.update(_merge_track_summary({}, track_points))
+    else:
+        case_data.update(_merge_track_summary({}, []))
+        case_data[track_storage.TRACK_STATUS_FIELD] = track_storage.PENDING_STATUS
+        if track_storage.chunked_storage_enabled():
+            case_data["trackStorage"] = track_storage.pending_manifest()
+
+    @firestore.transactional
+    def _create(transaction):
+        case_numbers.claim_in_transaction(transaction, case_data.get("caseNumber"), case_id)
+        transaction.set(case_ref, case_data)
+
+    try:
+        if prewrite_chunks:
+            case_data["trackStorage"] = await run_blocking(track_storage.write_chunked_track, db, case_ref, track_points)
+        await run_blocking(_create, db.transaction())
+    except Exception:
+        if prewrite_chunks:
+            try:
+                await run_blocking(track_storage.delete_chunked_track, db, case_ref)
+            except Exception as cleanup_error:
+                logger.warning(f"Could not remove track chunks of uncreated case {case_id}: {cleanup_error}")
+        raise
+    logger.info(f"Created case document with ID: {case_id}")
+    return case_id, case_data, track_points, user_ids
+
+
+async def _write_case_points(
+    case_id: str,
+    payload: CaseCreateRequest,
+    track_points: List[Dict[str, Any]],
+    case_data: Dict[str, Any],
+    on_progress: Optional[Callable[[int], Awaitable[None]]] = None,
+) -> None:
+    """
+    Write the `points` and allPoints data of a new case, reporting written samples to
+    on_progress. A track written with the case (complete chunk manifest) is left alone.
+    A pending track is written here, then its summary is stored and `trackStatus`
+    cleared in one update. If that fails, `trackStatus` is set to failed.
+    """
+    case_ref = db.collection("cases").document(case_id)
+
+    # Handle `csv_data` → "points" subcollection
+    if payload.csv_data:
+        points_ref = case_ref.collection("points")
+
+        point_writes = []
+        for point in payload.csv_data:
+            point_writes.append((points_ref.document(), {
+                "lat": point.latitude,
+                "lng": point.longitude,
+                "timestamp": point.timestamp,
+                "speed": getattr(point, "speed", None),
+                "altitude": getattr(point, "altitude", None),
+                "heading": getattr(point, "heading", None),
+                "accuracy": getattr(point, "accuracy", None),
+                "additional_data": getattr(point, "additional_data", None),
+                "createdAt": firestore.SERVER_TIMESTAMP
+            }))
+
+        stats = await write_documents(db, point_writes, on_progress=on_progress)
+        logger.info(f"Added {len(payload.csv_data)} points to case {case_id} ({stats['writesPerSecond']} writes/s, {stats['batches']} batches, {stats['retries']} retries)")
+
+    if not track_points or not track_storage.is_pending(case_data):
+        if track_points and on_progress is not None:
+            await on_progress(len(track_points))
+        return
+
+    try:
+        if track_storage.is_chunked(case_data):
+            manifest = await run_blocking(
+                track_storage.write_chunked_track, db, case_ref, track_points, case_data["trackStorage"]
+            )
+            completed = {"trackStorage": manifest}
+            if on_progress is not None:
+                await on_progress(len(track_points))
+            logger.info(f"Stored {len(track_points)} allPoints for case {case_id} as {manifest['chunkCount']} chunks")
+        else:
+            # Handle `all_points` → "allPoints" subcollection
+            allpoints_ref = case_ref.collection("allPoints")
+
+            all_point_writes = []
+            for point in track_points:
+                all_point_writes.append((allpoints_ref.document(), {**point, "createdAt": firestore.SERVER_TIMESTAMP}))
+
+            stats = await write_documents(db, all_point_writes, on_progress=on_progress)
+            completed = {}
+            logger.info(f"Added {len(track_points)} allPoints to case {case_id} ({stats['writesPerSecond']} writes/s, {stats['batches']} batches, {stats['retries']} retries)")
+
+        # The summary and trackVersion only appear once the whole track is readable
+        summary = _merge_track_summary({}, track_points)
+        await run_blocking(case_ref.update, {
+            **completed, **summary, track_storage.TRACK_STATUS_FIELD: firestore.DELETE_FIELD,
+        })
+        case_data.update({**completed, **summary})
+        case_data.pop(track_storage.TRACK_STATUS_FIELD, None)
+    except Exception:
+        # Readers keep treating the track as empty rather than reading a partial one
+        failed = {track_storage.TRACK_STATUS_FIELD: track_storage.FAILED_STATUS}
+        if track_storage.is_chunked(case_data):
+            failed["trackStorage.status"] = track_storage.FAILED_STATUS
+        await run_blocking(case_ref.update, failed)
+        raise
+
+
+async def _notify_case_created(user_ids: List[str], case_title: str) -> None:
+    result = await add_notifications_bulk(
+        user_ids,
+        title="Case Created",
+        message=f"A new case titled '{case_title}' has been created.",
+        notification_type="case-created"
+    )
+    logger.info(f"Notification sent to {result.get('delivered', 0)} users for case creation.")
+
+
+async def create_case(payload: CaseCreateRequest) -> str:
+    """Create a new case with optional GPS points and allPoints data."""
+    try:
+        case_id, case_data, track_points, user_ids = await _create_case_document(payload)
+        await _write_case_points(case_id, payload, track_points, case_data)
+        await _notify_case_created(user_ids, case_data["caseTitle"])
         return case_id
 
+    except CaseNumberTakenError:
+        raise
+    except Exception as e:
+        logger.error(f"Error creating case: {str(e)}")
+        raise Exception(f"Failed to create case: {str(e)}")
+
+
+async def create_case_in_background(payload: CaseCreateRequest) -> Tuple[str, str]:
+    """
+    Write the case document, then queue a job that writes its points, sends the
+    notifications and computes the derivations rollup. Returns (case_id, job_id).
+    """
+    try:
+        case_id, case_data, track_points, user_ids = await _create_case_document(payload, background=True)
+    except CaseNumberTakenError:
+        raise
     except Exception as e:
         logger.error(f"Error creating case: {str(e)}")
         raise Exception(f"Failed to create case: {str(e)}")
 
+    async def _ingest(progress: JobProgress):
+        await progress.stage("writing-points")
+        await _write_case_points(case_id, payload, track_points, case_data, on_progress=progress.advance)
+        await progress.stage("notifying")
+        await _notify_case_created(user_ids, case_data["caseTitle"])
+        if track_points:
+            await progress.stage("deriving")
+            await run_blocking(compute_and_store_rollup, case_id)
+        return {"caseId": case_id}
+
+    total = len(payload.csv_data or []) + len(track_points)
+    job_id = await enqueue_job("case-ingest", _ingest, total=total, caseId=case_id)
+    logger.info(f"Queued ingestion job {job_id} for case {case_id} ({total} points)")
+    return case_id, job_id
+
+
+def _delete_upload_points(case_ref, upload_id: str, batch_size: int = 400) -> int:
+    """Delete the allPoints samples written by one upload. Returns how many were removed."""
+    query = case_ref.collection("allPoints").where("uploadId", "==", upload_id).select([DOCUMENT_ID]).limit(batch_size)
+    deleted = 0
+    while True:
+        docs = list(query.stream())
+        if not docs:
+            return deleted
+        batch = db.batch()
+        for doc in docs:
+            batch.delete(doc.reference)
+        batch.commit()
+        deleted += len(docs)
+
+
+async def _rollback_track_upload(case_ref, upload_id: str, chunked: bool, original_manifest) -> None:
+    """Remove what a failed upload wrote, then recompute the case's track summary from what remains."""
+    if chunked:
+        first_chunk = int((original_manifest or {}).get("chunkCount", 0))
+        await run_blocking(track_storage.delete_chunked_track, db, case_ref, first_chunk)
+        await run_blocking(case_ref.update, {"trackStorage": original_manifest or DELETE_FIELD})
+    else:
+        await run_blocking(_delete_upload_points, case_ref, upload_id)
+    await _backfill_track_summary(case_ref.id)
+
+
+def _lock_chunked_upload(case_ref, upload_id: str) -> Dict[str, Any]:
+    """
+    Take the case's upload lock in a transaction and return the case fields read under it.
+    Chunk numbers come from the manifest, so two uploads appending at once would write the
+    same chunk ids and one manifest would overwrite the other; a second upload is refused.
+    """
+    @firestore.transactional
+    def _lock(transaction):
+        snap = case_ref.get(
+            field_paths=["trackStorage", "pointCount", track_storage.TRACK_STATUS_FIELD, UPLOAD_LOCK_FIELD],
+            transaction=transaction,
+        )
+        if not snap.exists:
+            raise CaseNotFoundError("Case not found")
+        case_data = snap.to_dict() or {}
+        lock = case_data.get(UPLOAD_LOCK_FIELD) or {}
+        if lock and time.time() - float(lock.get("lockedAt") or 0) < TRACK_UPLOAD_LOCK_SECONDS:
+            raise track_storage.TrackNotReadyError("Another upload into this case's track is in progress")
+        transaction.update(case_ref, {UPLOAD_LOCK_FIELD: {"uploadId": upload_id, "lockedAt": time.time()}})
+        return case_data
+
+    return _lock(db.transaction())
+
+
+async def ingest_track_upload(case_id: str, fileobj, file_format: str) -> Dict[str, Any]:
+    """
+    Stream an uploaded CSV/GPX track into a case's allPoints, one validated batch at a
+    time. Uses the case's existing track layout; a case without a track yet follows
+    TRACK_STORAGE_FORMAT. Returns accepted/rejected row counts, the first rejected row
+    numbers and write throughput.
+
+    The upload is all or nothing: its samples carry an `uploadId`, and if a later batch
+    fails to parse or write, everything the upload already wrote is removed again.
+    Chunked uploads hold the case's upload lock (refreshed with every batch), so only one
+    appends chunks at a time; a concurrent one fails with TrackNotReadyError.
+    """
+    case_ref = db.collection("cases").document(case_id)
+    case_doc = await run_blocking(
+        case_ref.get, field_paths=["trackStorage", "pointCount", track_storage.TRACK_STATUS_FIELD]
+    )
+    if not case_doc.exists:
+        raise CaseNotFoundError("Case not found")
+
+    case_data = case_doc.to_dict() or {}
+    if track_storage.is_pending(case_data):
+        raise track_storage.TrackNotReadyError("The case's track is still being ingested")
+    chunked = track_storage.is_chunked(case_data) or (
+        track_storage.chunked_storage_enabled() and not case_data.get("pointCount")
+    )
+    upload_id = uuid.uuid4().hex
+    if chunked:
+        # Re-read under the lock: the manifest appended to must be the latest one
+        case_data = await run_blocking(_lock_chunked_upload, case_ref, upload_id)
+        try:
+            if track_storage.is_pending(case_data):
+                raise track_storage.TrackNotReadyError("The case's track is still being ingested")
+            return await _ingest_track_batches(case_ref, upload_id, fileobj, file_format, True, case_data)
+        finally:
+            try:
+                await run_blocking(case_ref.update, {UPLOAD_LOCK_FIELD: DELETE_FIELD})
+            except Exception as e:
+                logger.warning(f"Could not release the upload lock of case {case_id}: {e}")
+    return await _ingest_track_batches(case_ref, upload_id, fileobj, file_format, False, case_data)
+
+
+async def _ingest_track_batches(
+    case_ref, upload_id: str, fileobj, file_format: str, chunked: bool, case_data: Dict[str, Any]
+) -> Dict[str, Any]:
+    case_id = case_ref.id
+    manifest = case_data.get("trackStorage")
+    # Chunked uploads read whole chunks per batch so no partial chunks are written mid-file
+    batch_size = track_storage.TRACK_CHUNK_SIZE if chunked else track_upload.UPLOAD_BATCH_SIZE
+    batches = track_upload.iter_track_batches(fileobj, file_format, batch_size)
+
+    original_manifest = manifest
+    accepted = rejected = 0
+    rejected_rows: List[int] = []
+    wrote = False
+    started = time.perf_counter()
+    try:
+        while True:
+            # Parsing reads the spooled upload file, so it runs on the pool as well
+            batch = await run_blocking(next, batches, None)
+            if batch is None:
+                break
+            samples, batch_rejected_rows = batch
+            rejected += len(batch_rejected_rows)
+            rejected_rows.extend(batch_rejected_rows[:track_upload.UPLOAD_REJECTED_ROWS_LIMIT - len(rejected_rows)])
+            if not samples:
+                continue
+
+            wrote = True
+            extra_fields = None
+            if chunked:
+                manifest = await run_blocking(track_storage.write_chunked_track, db, case_ref, samples, manifest)
+                extra_fields = {
+                    "trackStorage": manifest,
+                    UPLOAD_LOCK_FIELD: {"uploadId": upload_id, "lockedAt": time.time()},
+                }
+            else:
+                allpoints_ref = case_ref.collection("allPoints")
+                await write_documents(db, [
+                    (allpoints_ref.document(), {**sample, "uploadId": upload_id, "createdAt": firestore.SERVER_TIMESTAMP})
+                    for sample in samples
+                ])
+            await record_appended_points(case_id, samples, extra_fields)
+            accepted += len(samples)
+    except Exception as e:
+        if wrote:
+            logger.warning(f"Upload {upload_id} into case {case_id} failed after {accepted} points, rolling back: {e}")
+            try:
+                await _rollback_track_upload(case_ref, upload_id, chunked, original_manifest)
+            except Exception as rollback_error:
+                logger.error(f"Rollback of upload {upload_id} into case {case_id} failed: {rollback_error}")
+        raise
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        "uploadId": upload_id,
+        "accepted": accepted,
+        "rejected": rejected,
+        "rejectedRows": rejected_rows,
+        "format": file_format,
+        "storage": track_storage.CHUNKED_FORMAT if chunked else "documents",
+        "seconds": round(elapsed, 3),
+        "pointsPerSecond": round(accepted / elapsed, 1) if elapsed > 0 else float(accepted),
+    }
+    logger.info(f"Ingested {accepted} uploaded points into case {case_id} ({rejected} rejected, {stats['pointsPerSecond']} points/s)")
+    return stats
+
+
 async def update_case(data: dict):
     """
     Update a case document in Firestore and trigger a detailed notification for the user.
@@ -617,7 +1100,7 @@ async def update_case(data: dict):
         doc_ref = db.collection("cases").document(doc_id)
 
         # Fetch the current case data
-        current_data = doc_ref.get().to_dict()
+        current_data = (await run_blocking(doc_ref.get)).to_dict()
         if not current_data:
             return False, "Case not found"
         current_data = _normalize_case_user_fields(current_data)
@@ -654,30 +1137,53 @@ async def update_case(data: dict):
             update_fields["userId"] = data.get("userId")
             update_fields["userID"] = firestore.DELETE_FIELD
 
+        # Keep the stored document canonical so it stays visible to the indexed queries
+        merged = dict(current_data)
+        merged.update({
+            k: v for k, v in update_fields.items() if v is not None and v is not firestore.DELETE_FIELD
+        })
+        if data.get("region"):
+            merged["provinceName"] = data.get("provinceName") or data.get("region")
+            merged["provinceCode"] = data.get("provinceCode")
+        canonical_fields = _canonical_case_fields(merged)
+        canonical_fields.update({"userIDs": firestore.DELETE_FIELD, "userID": firestore.DELETE_FIELD})
+        canonical_only_keys = set(canonical_fields) - set(update_fields)
+        for key in canonical_only_keys:
+            update_fields[key] = canonical_fields[key]
+
         # Remove fields that are not being updated
         update_fields = {k: v for k, v in update_fields.items() if v is not None}
 
         print("Attempting to update Firestore with:", update_fields)
 
-        # Update the case in Firestore
-        doc_ref.update(update_fields)
+        # Update the case in Firestore; a new caseNumber moves its index entry in the same transaction
+        old_number = current_data.get("caseNumber")
+        new_number = update_fields.get("caseNumber")
+        if new_number and new_number != old_number:
+            @firestore.transactional
+            def _renumber(transaction):
+                case_numbers.claim_in_transaction(transaction, new_number, doc_id, previous_number=old_number)
+                transaction.update(doc_ref, update_fields)
+
+            try:
+                await run_blocking(_renumber, db.transaction())
+            except CaseNumberTakenError as e:
+                return False, str(e)
+            case_numbers.invalidate(old_number)
+        else:
+            await run_blocking(doc_ref.update, update_fields)
         print("Update successful")
 
         # Compare old and new data to determine what changed
         changes = []
         for key, new_value in update_fields.items():
-            if key in ["updatedBy", "updatedAt"]:  
+            if key in ["updatedBy", "updatedAt"] or key in canonical_only_keys:
                 continue
             old_value = current_data.get(key)
             if old_value != new_value:
-                changes.append(f"{key} changed from '{old_value}' to '{new_value}'")
+                changes.append((key, old_value, new_value))
 
-        # Generate a notification message
         case_title = current_data.get("caseTitle", "Unknown Case")
-        if changes:
-            notification_message = f"The following updates were made to your case '{case_title}': " + ", ".join(changes)
-        else:
-            notification_message = f"Your case '{case_title}' has been updated."
 
         # Fetch the user ID associated with the case
         target_user_ids = update_fields.get("userIds") or current_data.get("userIds") or []
@@ -690,17 +1196,20 @@ async def update_case(data: dict):
             if primary_target:
                 target_user_ids = [primary_target]
 
-        notified = set()
-        for uid in target_user_ids:
-            if uid and uid not in notified:
-                await add_notification(
-                    user_id=uid,
-                    title="Case Updated",
-                    message=notification_message,
-                    notification_type="case-update"
-                )
-                notified.add(uid)
-                print(f"Notification sent to user {uid} for case update.")
+        if notification_digest.digest_enabled():
+            # Coalesce bursts of saves into one notification per collaborator
+            notification_digest.queue_case_update(doc_id, case_title, target_user_ids, changes)
+            return True, "Update successful"
+
+        # Generate a notification message
+        notification_message = notification_digest.format_case_update_message(case_title, changes)
+        result = await add_notifications_bulk(
+            target_user_ids,
+            title="Case Updated",
+            message=notification_message,
+            notification_type="case-update"
+        )
+        print(f"Notification sent to {result.get('delivered', 0)} users for case update.")
 
         return True, "Update successful"
 
@@ -712,7 +1221,7 @@ async def update_case(data: dict):
 async def delete_case(doc_id: str):
     try:
         doc_ref = db.collection("cases").document(doc_id)
-        doc = doc_ref.get()
+        doc = await run_blocking(doc_ref.get)
 
         if not doc.exists:
             return False, "Case not found"
@@ -722,21 +1231,17 @@ async def delete_case(doc_id: str):
         case_title = case_data.get("caseTitle", "Unknown Case")
 
         # Delete the case
-        doc_ref.delete()
+        await run_blocking(doc_ref.delete)
         print(f"Deleted case with doc_id: {doc_id}")
 
         # Trigger notification if user ID is found
-        notified = set()
-        for uid in user_ids:
-            if uid and uid not in notified:
-                await add_notification(
-                    user_id=uid,
-                    title="Case Deleted",
-                    message=f"Your case titled '{case_title}' has been deleted.",
-                    notification_type="case-delete"
-                )
-                notified.add(uid)
-                print(f"Notification sent to user {uid} for deleted case.")
+        result = await add_notifications_bulk(
+            user_ids,
+            title="Case Deleted",
+            message=f"Your case titled '{case_title}' has been deleted.",
+            notification_type="case-delete"
+        )
+        print(f"Notification sent to {result.get('delivered', 0)} users for deleted case.")
 
         return True, "Deleted successfully"
 
@@ -748,11 +1253,11 @@ async def soft_delete_case(case_id: str):
     """Marks a case as deleted (soft delete)."""
     try:
         doc_ref = db.collection("cases").document(case_id)
-        doc = doc_ref.get()
+        doc = await run_blocking(doc_ref.get)
         if not doc.exists:
             return {"success": False, "message": "Case not found"}
 
-        doc_ref.update({
+        await run_blocking(doc_ref.update, {
             "is_deleted": True,
             "deleted_at": firestore.SERVER_TIMESTAMP
         })
@@ -766,11 +1271,11 @@ async def restore_case(case_id: str):
     """Restores a soft-deleted case."""
     try:
         doc_ref = db.collection("cases").document(case_id)
-        doc = doc_ref.get()
+        doc = await run_blocking(doc_ref.get)
         if not doc.exists:
             return {"success": False, "message": "Case not found"}
 
-        doc_ref.update({
+        await run_blocking(doc_ref.update, {
             "is_deleted": False,
             "deleted_at": DELETE_FIELD
         })
@@ -788,13 +1293,14 @@ async def permanently_delete_case(case_id: str):
     """
     try:
         case_ref = db.collection("cases").document(case_id)
-        case_doc = case_ref.get()
+        case_doc = await run_blocking(case_ref.get)
         if not case_doc.exists:
             return {"success": False, "message": "Case not found"}
 
         subcollections = [
             "points",
             "allPoints",
+            "trackChunks",
             "interpolatedPoints",
             "locations",
             "annotations",
@@ -820,11 +1326,24 @@ async def permanently_delete_case(case_id: str):
         for name in subcollections:
             try:
                 coll_ref = case_ref.collection(name)
-                _delete_all(coll_ref)
+                await run_blocking(_delete_all, coll_ref)
             except Exception as e:
                 print(f"Skip/failed deleting subcollection '{name}' for case {case_id}: {e}")
 
-        case_ref.delete()
+        try:
+            await run_blocking(czml_cache.delete_artifacts, db, case_ref)
+        except Exception as e:
+            print(f"Skip/failed deleting artifacts for case {case_id}: {e}")
+
+        case_number = (case_doc.to_dict() or {}).get("caseNumber")
+
+        @firestore.transactional
+        def _delete_case(transaction):
+            case_numbers.release_in_transaction(transaction, case_number, case_id)
+            transaction.delete(case_ref)
+
+        await run_blocking(_delete_case, db.transaction())
+        case_numbers.invalidate(case_number)
         return {"success": True, "message": "Case permanently deleted (including subcollections)"}
     except Exception as e:
         print(f"Error in permanently_delete_case: {e}")
@@ -836,10 +1355,9 @@ async def fetch_recent_points(limit: int = 10) -> list:
         results = []
         try:
             cg = db.collection_group("allPoints")
-            docs = list(
+            docs = await fetch_all(
                 cg.order_by("timestamp", direction=firestore.Query.DESCENDING)
                   .limit(max(1, int(limit)))
-                  .stream()
             )
             for d in docs:
                 data = d.to_dict() or {}
@@ -858,7 +1376,7 @@ async def fetch_recent_points(limit: int = 10) -> list:
         if not results:
             try:
                 cg2 = db.collection_group("points")
-                docs2 = list(cg2.limit(max(1, int(limit))).stream())
+                docs2 = await fetch_all(cg2.limit(max(1, int(limit))))
                 for d in docs2:
                     data = d.to_dict() or {}
                     lat = data.get("lat")
@@ -884,26 +1402,33 @@ async def fetch_all_points_paginated(limit: int = 200, cursor: str | None = None
     Returns (points, next_cursor)
     - points: list of {lat, lng, timestamp, caseId}
     - next_cursor: opaque string to pass back for the next page, or None when done
+    Raises ValueError for a malformed cursor or one whose point no longer exists.
     """
+    last_path = None
+    if cursor:
+        try:
+            last_path = json.loads(cursor)["path"]
+            if not isinstance(last_path, str) or "/allPoints/" not in last_path:
+                raise ValueError(f"not an allPoints path: {last_path!r}")
+        except Exception as e:
+            logger.warning(f"Rejecting invalid points cursor: {e}")
+            raise ValueError("Invalid cursor") from e
+
     try:
         cg = db.collection_group("allPoints")
         q = (
             cg.order_by("timestamp", direction=firestore.Query.ASCENDING)
-              .order_by(firestore.FieldPath.document_id(), direction=firestore.Query.ASCENDING)
+              .order_by(DOCUMENT_ID, direction=firestore.Query.ASCENDING)
               .limit(max(1, int(limit)))
         )
 
-        if cursor:
-            try:
-                meta = json.loads(cursor)
-                last_path = meta.get("path")
-                if last_path:
-                    snap = db.document(last_path).get()
-                    q = q.start_after(document=snap)
-            except Exception as e:
-                print(f"Ignoring invalid cursor: {e}")
+        if last_path:
+            snap = await run_blocking(db.document(last_path).get)
+            if not snap.exists:
+                raise ValueError("Invalid cursor: the point it refers to no longer exists")
+            q = q.start_after(document=snap)
 
-        docs = list(q.stream())
+        docs = await fetch_all(q)
         out = []
         for d in docs:
             data = d.to_dict() or {}
@@ -928,13 +1453,15 @@ async def fetch_all_points_paginated(limit: int = 200, cursor: str | None = None
             next_cursor = json.dumps({"path": last_doc.reference.path})
 
         return out, next_cursor
+    except ValueError:
+        raise
     except Exception as e:
         print(f"Error in fetch_all_points_paginated: {e}")
         return [], None
 
 
 async def fetch_recent_cases(sort_by: str = "dateEntered", user_id: str = ""):
-    docs_map = _get_case_documents_for_user(user_id)
+    docs_map = await run_blocking(_get_case_documents_for_user, user_id)
     sort_field = "createdAt" if sort_by == "dateEntered" else "dateOfIncident"
 
     def _sort_key(doc_snapshot):
@@ -963,7 +1490,7 @@ async def fetch_recent_cases(sort_by: str = "dateEntered", user_id: str = ""):
 
 async def get_case_counts_by_month(user_id: str = ""):
     print(f"get_case_counts_by_month() called with user_id: {user_id}")
-    docs_map = _get_case_documents_for_user(user_id)
+    docs_map = await run_blocking(_get_case_documents_for_user, user_id)
     documents = list(docs_map.values())
     print(f" Found {len(documents)} case documents for monthly count")
 
@@ -983,7 +1510,7 @@ async def get_case_counts_by_month(user_id: str = ""):
 
 
 async def get_region_case_counts(user_id: str = ""):
-    docs_map = _get_case_documents_for_user(user_id)
+    docs_map = await run_blocking(_get_case_documents_for_user, user_id)
     docs = list(docs_map.values())
     print(f" Found {len(docs)} cases for region count (user_id={user_id})")
 
@@ -996,50 +1523,118 @@ async def get_region_case_counts(user_id: str = ""):
     return [{"region": r, "count": c} for r, c in region_counts.items()]
 
 
-async def fetch_all_case_points():
+# Number of parallel partitions used when reading a points subcollection across all cases
+POINT_QUERY_PARTITIONS = int(os.getenv("POINT_QUERY_PARTITIONS", "4"))
+
+
+def _parent_case_id(doc) -> Optional[str]:
     try:
-        all_points = []
-        cases_ref = db.collection("cases")
-        case_docs = list(cases_ref.stream())
+        return doc.reference.parent.parent.id
+    except Exception:
+        return None
 
-        for case_doc in case_docs:
-            case_id = case_doc.id
-            points_ref = cases_ref.document(case_id).collection("points")
-            points = list(points_ref.stream())
 
-            for point in points:
-                data = point.to_dict()
-                lat = data.get("lat")
-                lng = data.get("lng")
-                if lat is not None and lng is not None:
-                    all_points.append({"lat": lat, "lng": lng})
+async def _existing_case_ids() -> set:
+    """Ids of all case documents, read as a keys-only projection."""
+    docs = await fetch_all(db.collection("cases").select([DOCUMENT_ID]))
+    return {doc.id for doc in docs}
 
-        print(f" Fetched {len(all_points)} points:")
-        for p in all_points:
-            print(f"→ lat: {p['lat']}, lng: {p['lng']}")
 
+async def _stream_points_collection_group(name: str, fields: List[str]) -> list:
+    """
+    Read one points subcollection (`points`/`allPoints`) across every case with a single
+    collection-group query. The query is split into partitions that stream in parallel;
+    points left behind by case documents that no longer exist are dropped.
+    """
+    group = db.collection_group(name)
+    try:
+        partitions = await run_blocking(lambda: list(group.get_partitions(POINT_QUERY_PARTITIONS)))
+        queries = [partition.query().select(fields) for partition in partitions]
+    except Exception as e:
+        print(f"Partitioning '{name}' failed, streaming unpartitioned: {e}")
+        queries = []
+    if not queries:
+        queries = [group.select(fields)]
+
+    case_ids, *chunks = await asyncio.gather(_existing_case_ids(), *(fetch_all(q) for q in queries))
+    return [doc for chunk in chunks for doc in chunk if _parent_case_id(doc) in case_ids]
+
+
+async def fetch_all_case_points():
+    try:
+        all_points = []
+        for point in await _stream_points_collection_group("points", ["lat", "lng"]):
+            data = point.to_dict() or {}
+            lat = data.get("lat")
+            lng = data.get("lng")
+            if lat is not None and lng is not None:
+                all_points.append({"lat": lat, "lng": lng})
+
+        print(f" Fetched {len(all_points)} points")
         return all_points
     except Exception as e:
         print("Error fetching case points:", e)
         return []
 
-    
-async def fetch_interpolated_points(case_id: str) -> list:
+
+async def fetch_interpolated_points(case_id: str, source_version: Optional[str] = None) -> list:
+    """
+    The interpolated set of a case, in order. With `source_version`, only that set is read.
+    Flagged points kept from earlier sets are left out.
+    """
     try:
         points_ref = db.collection("cases").document(case_id).collection("interpolatedPoints")
-        docs = list(points_ref.stream())
+        query = points_ref if not source_version else points_ref.where("sourceVersion", "==", source_version)
+        # Document ids end in zero-padded sequence numbers (see store_interpolated_points)
+        docs = await fetch_all(query.order_by(DOCUMENT_ID))
         return [doc.to_dict() for doc in docs]
     except Exception as e:
         print(f"Failed to fetch interpolated points: {e}")
         return []
 
-async def store_interpolated_points(case_id: str, points: list):
+async def store_interpolated_points(case_id: str, points: list, source_version: Optional[str] = None):
+    """
+    Replace the case's interpolated set. `source_version` (see
+    route_interpolation.interpolation_source_version) is stored on every point and is
+    recorded on the case document as `interpolatedSourceVersion` once every point is
+    written. Until then readers see a mismatch and recompute rather than reading a
+    half-written set.
+
+    Investigators flag points of this collection in the frontend (isFlagged, title, note).
+    Flagged points of earlier sets are kept as they are, under their own ids. The new set
+    is written under ids prefixed with its version, so it never overwrites them, and
+    fetch_interpolated_points reads it by version, so they are not mixed into it.
+    """
     try:
-        batch = db.batch()
-        points_ref = db.collection("cases").document(case_id).collection("interpolatedPoints")
+        case_ref = db.collection("cases").document(case_id)
+        points_ref = case_ref.collection("interpolatedPoints")
 
-        for pt in points:
-            doc = points_ref.document()
+        await run_blocking(case_ref.update, {"interpolatedSourceVersion": firestore.DELETE_FIELD})
+
+        def _clear_unflagged(batch_size: int = 400) -> set:
+            flagged, stale = set(), []
+            for d in points_ref.select(["isFlagged"]).stream():
+                if (d.to_dict() or {}).get("isFlagged"):
+                    flagged.add(d.id)
+                else:
+                    stale.append(d.reference)
+            for start in range(0, len(stale), batch_size):
+                batch = db.batch()
+                for ref in stale[start:start + batch_size]:
+                    batch.delete(ref)
+                batch.commit()
+            return flagged
+
+        flagged = await run_blocking(_clear_unflagged)
+        prefix = f"{source_version[:12]}-" if source_version else ""
+
+        writes = []
+        for i, pt in enumerate(points):
+            doc_id = f"{prefix}{i:07d}"
+            if doc_id in flagged:
+                # Same set rewritten after an interrupted store: keep the flagged point as it is
+                continue
+            doc = points_ref.document(doc_id)
 
             # Safely parse timestamp
             ts = pt.get("timestamp")
@@ -1059,203 +1654,51 @@ async def store_interpolated_points(case_id: str, points: list):
                 parsed_ts = ts
 
             # Store Firestore-native timestamp (or None)
-            batch.set(doc, {
+            writes.append((doc, {
                 "lat": pt["lat"],
                 "lng": pt["lng"],
                 "timestamp": parsed_ts,
-            })
+                "sourceVersion": source_version,
+            }))
 
-        batch.commit()
-        print(f"Stored {len(points)} interpolated points for case {case_id}")
+        await write_documents(db, writes)
+        if source_version:
+            await run_blocking(case_ref.update, {"interpolatedSourceVersion": source_version})
+        print(f"Stored {len(points)} interpolated points for case {case_id} ({len(flagged)} flagged kept)")
     except Exception as e:
         print(f"Failed to store interpolated points: {e}")
 
 
-async def fetch_all_points_by_case_number(case_number: str):
+async def fetch_all_points_by_case_number(case_number: str, case_doc=None):
+    """allPoints of the case with this caseNumber; pass `case_doc` when it was already read."""
     try:
-        db_ref = db.collection("cases")
-        
-        # Find the case with this case_number
-        matching_case_query = db_ref.where("caseNumber", "==", case_number)
-        case_docs = matching_case_query.stream()
-        case_doc_list = list(case_docs)  
-
-        if not case_doc_list:
+        if case_doc is None:
+            case_doc = await case_numbers.get_case_by_number(case_number)
+
+        if case_doc is None:
             print(f"No case found with caseNumber: {case_number}")
             return []
 
-        case_doc = case_doc_list[0]
         case_ref = case_doc.reference
 
-        all_points_ref = case_ref.collection("allPoints").order_by("timestamp")
-        all_points_docs = all_points_ref.stream()
-        all_points = [doc.to_dict() for doc in all_points_docs]  
-
-        return all_points
+        return await track_storage.fetch_track_points(case_ref, case_doc.to_dict() or {}, ordered=True)
 
     except Exception as e:
         print(f"Error fetching allPoints for caseNumber {case_number}: {e}")
         return []
     
-def generate_czml(case_id: str, points: list) -> list:
-    """
-    Generates a CZML document for Cesium animation from a list of GPS points,
-    using a simple polyline path instead of a 3D model.
-    """
-    if not points:
-        raise ValueError("No points provided for CZML generation")
-
-    print(f"🚀 Starting CZML generation with {len(points)} points")
-    
-    for i, point in enumerate(points):
-        if i < 5 or i > len(points) - 5:  # show first and last few
-            print(f"\n--- Processing point {i} ---")
-
-    def to_iso_zulu(ts_val):
-        print(f"Processing timestamp: {repr(ts_val)} (type: {type(ts_val)})")
-        
-        if isinstance(ts_val, list):
-            print(f"Timestamp is a list with {len(ts_val)} items: {ts_val}")
-            if len(ts_val) == 0:
-                print("Empty list provided as timestamp")
-                return None
-            ts_val = ts_val[0]
-            print(f"Using first item from list: {repr(ts_val)} (type: {type(ts_val)})")
-        
-        if isinstance(ts_val, list):
-            print(f"Timestamp is STILL a list after extraction: {ts_val}")
-            return None
-
-        if ts_val is None or ts_val == "":
-            print("Timestamp is None or empty")
-            return None
-
-        try:
-            if not isinstance(ts_val, str):
-                print(f"Converting {type(ts_val)} to string: {ts_val}")
-                ts_val = str(ts_val)
-
-            print(f"About to replace Z in: {repr(ts_val)}")
-            
-            if ts_val.endswith("Z") and "+00:00" not in ts_val:
-                ts_val = ts_val.replace("Z", "+00:00")
-            print(f"After Z replacement: {repr(ts_val)}")
-
-            dt = datetime.fromisoformat(ts_val)
-            result = dt.astimezone(pytz.utc).isoformat().replace("+00:00", "Z")
-            print(f"Successfully converted to: {result}")
-            return result
-        except Exception as e:
-            print(f"Failed to convert timestamp {repr(ts_val)}: {e}")
-            import traceback
-            traceback.print_exc()
-            return None
-
-    cleaned_points = []
-    for i, p in enumerate(points):
-        print(f"\n--- Processing point {i} ---")
-        ts = p.get("timestamp")
-        print(f"Raw timestamp from point: {repr(ts)} (type: {type(ts)})")
-        
-        if not ts:
-            print(f"Skipping point {i} with missing timestamp")
-            continue
-
-        iso_ts = to_iso_zulu(ts)
-        if not iso_ts:
-            print(f"Skipping point {i} with bad timestamp: {repr(ts)}")
-            continue
-
-        cleaned_points.append({
-            "lat": p["lat"],
-            "lng": p["lng"],
-            "timestamp": iso_ts
-        })
-        print(f"Added cleaned point {i}")
-
-    cleaned_points.sort(key=lambda x: x["timestamp"])
-
-    if len(cleaned_points) < 2:
-        raise ValueError("Not enough valid points after cleaning to generate CZML.")
-
-    print(f"🧹 Cleaned points: {len(cleaned_points)}")
-    
-    availability_start = cleaned_points[0]["timestamp"]
-    availability_end = cleaned_points[-1]["timestamp"]
-    print(f"CZML Interval - Start: {availability_start}, End: {availability_end}")
-
-
-    czml = [
-        {
-            "id": "document",
-            "name": f"Track for case {case_id}",
-            "version": "1.0",
-            "clock": {
-                "interval": f"{availability_start}/{availability_end}",
-                "currentTime": availability_start,
-                "multiplier": 10,
-                "range": "LOOP_STOP",
-                "step": "SYSTEM_CLOCK_MULTIPLIER"
-            }
-        },
-        {
-            "id": "pathEntity",
-            "availability": f"{availability_start}/{availability_end}",
-            "position": {
-                "interpolationAlgorithm": "LAGRANGE",
-                "interpolationDegree": 1,
-                "referenceFrame": "FIXED",
-                "epoch": availability_start,
-                "cartographicDegrees": []
-            },
-            "path": {
-                "material": {
-                    "solidColor": {
-                        "color": {
-                            "rgba": [0, 255, 255, 255]
-                        }
-                    }
-                },
-                "width": 4,
-                "leadTime": 0,
-                "trailTime": 2000,
-                "resolution": 5
-            }
-        }
-    ]
-
-    start_time = datetime.fromisoformat(availability_start.replace("Z", "+00:00"))
-    for point in cleaned_points:
-        point_time = datetime.fromisoformat(point["timestamp"].replace("Z", "+00:00"))
-        time_offset = (point_time - start_time).total_seconds()
-        czml[1]["position"]["cartographicDegrees"].extend([
-            time_offset,
-            point["lng"],
-            point["lat"],
-            0
-        ])
-
-    print(f"Generated CZML with {len(cleaned_points)} points.")
-    return czml
-
-
 async def fetch_all_points_for_case(case_id: str) -> list:
     """
-    Retrieve allPoints subcollection for a given case.
+    Retrieve the allPoints track of a given case, in whichever storage layout it uses.
     """
     try:
-        points_ref = db.collection("cases").document(case_id).collection("allPoints")
-        docs = points_ref.stream()
-        return [doc.to_dict() for doc in docs]
+        return await track_storage.fetch_track_points(db.collection("cases").document(case_id))
     except Exception as e:
         raise Exception(f"Failed to fetch allPoints: {str(e)}")
     
 
 # HELPER FUNCTION FOR POINTS api service.
 
-ORS_API_KEY = "5b3ce3597851110001cf6248c3b41afd16e04795a3eaaf7b3c0cd61f"  # Replace with your actual key or use an environment variable
-
-
 try:
     from google.api_core.datetime_helpers import DatetimeWithNanoseconds
 except ImportError:
@@ -1266,101 +1709,6 @@ except ImportError:
         class DatetimeWithNanoseconds:
             pass
 
-def interpolate_points_with_ors(points: list) -> list:
-    """
-    Efficiently interpolates a GPS route by calling ORS API with multiple points at once.
-    Includes retry logic and ensures strictly ordered timestamps for Cesium playback.
-    """
-
-    if not points or len(points) < 2:
-        print("Not enough points to interpolate.")
-        return points
-
-    # --- Step 1: Sanitize points ---
-    sanitized_points = []
-    for pt in points:
-        lat = pt.get("lat")
-        lng = pt.get("lng")
-        timestamp = pt.get("timestamp")
-
-        if not lat or not lng or not timestamp:
-            continue
-
-        if hasattr(timestamp, "isoformat"):
-            timestamp_str = timestamp.isoformat().replace("+00:00", "Z")
-        elif isinstance(timestamp, str):
-            timestamp_str = timestamp
-        elif isinstance(timestamp, list) and timestamp:
-            timestamp_str = str(timestamp[0])
-        else:
-            continue
-
-        sanitized_points.append({
-            "lat": lat,
-            "lng": lng,
-            "timestamp": timestamp_str
-        })
-
-    if len(sanitized_points) < 2:
-        print("Not enough valid points after sanitization.")
-        return sanitized_points
-
-    # --- Prepare ORS API request ---
-    url = "https://api.openrouteservice.org/v2/directions/driving-car/geojson"
-    headers = {
-        "Authorization": ORS_API_KEY,
-        "Content-Type": "application/json"
-    }
-
-    # ORS accepts multiple coordinates in one call
-    coordinates = [[p["lng"], p["lat"]] for p in sanitized_points]
-    body = {"coordinates": coordinates}
-
-    # --- Call ORS with retry logic ---
-    max_retries = 3
-    route = None
-    for attempt in range(max_retries):
-        try:
-            res = requests.post(url, headers=headers, json=body)
-            if res.status_code == 429:
-                wait = 2 ** attempt
-                print(f"ORS rate limit hit. Retrying in {wait}s...")
-                time.sleep(wait)
-                continue
-            res.raise_for_status()
-            route = res.json()["features"][0]["geometry"]["coordinates"]
-            break
-        except Exception as e:
-            print(f"ORS failed (attempt {attempt + 1}): {e}")
-            if attempt == max_retries - 1:
-                print("Returning sanitized points due to repeated failures.")
-                return sanitized_points
-
-    if not route:
-        print("No route returned by ORS.")
-        return sanitized_points
-
-    # --- Interpolate timestamps across route ---
-    t_start = datetime.fromisoformat(sanitized_points[0]["timestamp"].replace("Z", "+00:00"))
-    t_end = datetime.fromisoformat(sanitized_points[-1]["timestamp"].replace("Z", "+00:00"))
-    total_duration = (t_end - t_start).total_seconds()
-    num_steps = max(2, len(route))
-
-    padded = []
-    for i, [lng, lat] in enumerate(route):
-        frac = i / (num_steps - 1)
-        interp_time = t_start + timedelta(seconds=total_duration * frac)
-
-        padded.append({
-            "lat": lat,
-            "lng": lng,
-            "timestamp": interp_time.replace(tzinfo=timezone.utc).isoformat().replace("+00:00", "Z")
-        })
-
-    # --- Finalize ---
-    padded.sort(key=lambda p: p["timestamp"])
-    print(f"Final padded point count: {len(padded)}")
-    return padded
 
 async def fetch_all_case_points_with_case_ids(): #this is the newest function for heatmap - 2025/06/26
     """
@@ -1368,54 +1716,77 @@ async def fetch_all_case_points_with_case_ids(): #this is the newest function fo
     """
     try:
         all_points = []
-        cases_ref = db.collection("cases")
-        case_docs = list(cases_ref.stream())
-
-        for case_doc in case_docs:
-            case_id = case_doc.id
-            points_ref = db.collection("cases").document(case_id).collection("points")
-            points = list(points_ref.stream())
-
-            for point in points:
-                data = point.to_dict()
-                lat = data.get("lat")
-                lng = data.get("lng")
-                timestamp = data.get("timestamp")
-
-                if lat is not None and lng is not None and timestamp:
-                    all_points.append({
-                        "lat": lat,
-                        "lng": lng,
-                        "timestamp": timestamp,
-                        "caseId": case_id
-                    })
+        for point in await _stream_points_collection_group("points", ["lat", "lng", "timestamp"]):
+            data = point.to_dict() or {}
+            lat = data.get("lat")
+            lng = data.get("lng")
+            timestamp = data.get("timestamp")
+
+            if lat is not None and lng is not None and timestamp:
+                all_points.append({
+                    "lat": lat,
+                    "lng": lng,
+                    "timestamp": timestamp,
+                    "caseId": _parent_case_id(point)
+                })
 
         print(f"Custom route fetched {len(all_points)} points with case IDs.")
         return all_points
     except Exception as e:
         print("Error in fetch_all_case_points_with_case_ids:", e)
         return []
+
+
+async def _backfill_track_summary(case_id: str) -> Dict[str, Any]:
+    """Compute and store the track summary of a case created before it was maintained."""
+    points = await track_storage.fetch_track_points(db.collection("cases").document(case_id))
+    summary = _merge_track_summary({}, points)
+    await run_blocking(db.collection("cases").document(case_id).update, summary)
+    return summary
+
+
+async def ensure_track_version(case_id: str, case_data: Dict[str, Any]) -> Optional[str]:
+    """
+    The case's trackVersion, computing the track summary first for cases that predate it.
+    Raises TrackNotReadyError while the track of a new case is still being written.
+    """
+    if track_storage.is_pending(case_data):
+        raise track_storage.TrackNotReadyError("The case's track is still being ingested")
+    if case_data.get("trackVersion"):
+        return case_data["trackVersion"]
+    summary = await _backfill_track_summary(case_id)
+    return summary.get("trackVersion")
+
+
 async def fetch_last_points_per_case():
+    """
+    Latest allPoints sample of every case, read from the denormalized `lastPoint` on the
+    case documents in one projected query. Legacy cases without a summary are backfilled
+    once, concurrently, from their allPoints subcollection.
+    """
     try:
-        cases_ref = db.collection("cases")
-        case_docs = list(cases_ref.stream())
-        result = []
+        case_docs = await fetch_all(db.collection("cases").select(["caseTitle", "status", "lastPoint", "pointCount"]))
+        case_data_by_id = {case_doc.id: case_doc.to_dict() or {} for case_doc in case_docs}
 
-        for case_doc in case_docs:
-            case_data = case_doc.to_dict()
-            doc_id = case_doc.id
-            case_title = case_data.get("caseTitle", "")
-            status = case_data.get("status", "")
-
-            # Pull from allPoints subcollection
-            points_ref = db.collection("cases").document(doc_id).collection("allPoints")
-            last_points = list(points_ref.order_by("timestamp", direction=firestore.Query.DESCENDING).limit(1).stream())
-
-            if last_points:
-                last_point_data = last_points[0].to_dict()
-                last_point_data["doc_id"] = doc_id
-                last_point_data["caseTitle"] = case_title
-                last_point_data["status"] = status
+        legacy_ids = [case_id for case_id, data in case_data_by_id.items() if "pointCount" not in data]
+        if legacy_ids:
+            summaries = await asyncio.gather(
+                *(_backfill_track_summary(case_id) for case_id in legacy_ids), return_exceptions=True
+            )
+            for case_id, summary in zip(legacy_ids, summaries):
+                if isinstance(summary, Exception):
+                    print(f"Track summary backfill failed for case {case_id}: {summary}")
+                    continue
+                case_data_by_id[case_id]["lastPoint"] = summary["lastPoint"]
+
+        result = []
+        for case_id, case_data in case_data_by_id.items():
+            last_point = case_data.get("lastPoint")
+            if last_point:
+                last_point_data = dict(last_point)
+                last_point_data["doc_id"] = case_id
+                last_point_data["caseTitle"] = case_data.get("caseTitle", "")
+                last_point_data["status"] = case_data.get("status", "")
                 result.append(last_point_data)
 
         return result
@@ -1437,7 +1808,7 @@ async def assign_case_users(case_id: str, user_ids: List[str]):
         raise ValueError("No valid user IDs provided")
 
     case_ref = db.collection("cases").document(case_id)
-    snapshot = case_ref.get()
+    snapshot = await run_blocking(case_ref.get)
     if not snapshot.exists:
         raise ValueError("Case not found")
 
@@ -1453,28 +1824,27 @@ async def assign_case_users(case_id: str, user_ids: List[str]):
         "userID": firestore.DELETE_FIELD,
     }
 
-    case_ref.update(update_payload)
+    await run_blocking(case_ref.update, update_payload)
 
     case_title = existing.get("caseTitle", "Unknown Case")
 
     newly_added = [uid for uid in normalized_ids if uid not in previous_ids]
     removed = [uid for uid in previous_ids if uid not in normalized_ids]
 
-    for uid in newly_added:
-        await add_notification(
-            user_id=uid,
+    await asyncio.gather(
+        add_notifications_bulk(
+            newly_added,
             title="Case Assignment",
             message=f"You have been added to the case '{case_title}'.",
             notification_type="case-assignment"
-        )
-
-    for uid in removed:
-        await add_notification(
-            user_id=uid,
+        ),
+        add_notifications_bulk(
+            removed,
             title="Case Access Updated",
             message=f"You have been removed from the case '{case_title}'.",
             notification_type="case-assignment"
-        )
+        ),
+    )
 
     return True
 
@@ -1494,7 +1864,7 @@ async def add_case_comment(
         raise ValueError("Comment text cannot be empty")
 
     case_ref = db.collection("cases").document(case_id)
-    case_snapshot = case_ref.get()
+    case_snapshot = await run_blocking(case_ref.get)
     if not case_snapshot.exists:
         raise ValueError("Case not found")
 
@@ -1515,7 +1885,7 @@ async def add_case_comment(
 
     author_name = "Investigator"
     try:
-        author_doc = db.collection("users").document(author_id).get()
+        author_doc = await run_blocking(db.collection("users").document(author_id).get)
         if author_doc.exists:
             author_data = author_doc.to_dict() or {}
             first = (author_data.get("firstName") or "").strip()
@@ -1536,10 +1906,10 @@ async def add_case_comment(
     }
 
     comment_ref = case_ref.collection("comments").document()
-    comment_ref.set(comment_payload)
+    await run_blocking(comment_ref.set, comment_payload)
 
     try:
-        case_ref.update({
+        await run_blocking(case_ref.update, {
             "updatedAt": firestore.SERVER_TIMESTAMP,
             "lastCommentAt": firestore.SERVER_TIMESTAMP,
         })
@@ -1550,23 +1920,21 @@ async def add_case_comment(
     if notify_all:
         notification_targets.update(uid for uid in permitted_user_ids if uid and uid != author_id)
 
-    for target_uid in notification_targets:
-        try:
-            await add_notification(
-                user_id=target_uid,
-                title="New Comment",
-                message=f"{author_name} mentioned you in a comment.",
-                notification_type="COMMENT",
-                metadata={
-                    "caseId": case_id,
-                    "commentId": comment_ref.id,
-                    "authorId": author_id,
-                },
-            )
-        except Exception:
-            logger.debug("Failed to deliver comment notification", exc_info=True)
+    result = await add_notifications_bulk(
+        notification_targets,
+        title="New Comment",
+        message=f"{author_name} mentioned you in a comment.",
+        notification_type="COMMENT",
+        metadata={
+            "caseId": case_id,
+            "commentId": comment_ref.id,
+            "authorId": author_id,
+        },
+    )
+    if not result["success"]:
+        logger.debug(f"Failed to deliver comment notifications: {result.get('message')}")
 
-    stored = comment_ref.get()
+    stored = await run_blocking(comment_ref.get)
     stored_data = stored.to_dict() or comment_payload
     sanitized_comment = sanitize_firestore_data(stored_data)
     sanitized_comment["id"] = stored.id
@@ -1578,7 +1946,7 @@ async def fetch_case_comments(case_id: str, limit: int = 100) -> List[Dict[str,
         raise ValueError("Missing case_id")
 
     case_ref = db.collection("cases").document(case_id)
-    if not case_ref.get().exists:
+    if not (await run_blocking(case_ref.get)).exists:
         raise ValueError("Case not found")
 
     comments_ref = case_ref.collection("comments").order_by("createdAt", direction=firestore.Query.ASCENDING)
@@ -1586,7 +1954,7 @@ async def fetch_case_comments(case_id: str, limit: int = 100) -> List[Dict[str,
         comments_ref = comments_ref.limit(limit)
 
     comments = []
-    for doc in comments_ref.stream():
+    for doc in await fetch_all(comments_ref):
         data = doc.to_dict() or {}
         sanitized = sanitize_firestore_data(data)
         sanitized["id"] = doc.id
@@ -1621,7 +1989,8 @@ async def generate_ai_description(lat, lng, timestamp, status: str = "", snapsho
         prompt += "A snapshot image is associated with this point."
 
     try:
-        resp = client.chat.completions.create(
+        resp = await run_blocking(
+            client.chat.completions.create,
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You describe vehicle movement and events in a forensic report style."},
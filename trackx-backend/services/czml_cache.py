@@ -0,0 +1,124 @@
+"""
+Persisted, gzip-compressed CZML artifacts.
+
+A generated CZML document is stored under `cases/{caseId}/artifacts/{name}` together
+with the key it was built for. The key hashes the case's `trackVersion` (a content hash
+of its points, see case_service._merge_track_summary), the generation parameters and
+CZML_GENERATOR_VERSION, so appending points or changing how CZML is produced
+invalidates the artifact without any explicit purge. The key doubles as the HTTP ETag.
+
+Artifacts larger than a Firestore document are split over an `artifacts/{name}/parts`
+subcollection; most tracks fit in the single artifact document.
+
+Only complete documents are cached. One built from a fallback (ORS partly unavailable)
+is compressed for the response but never stored, and must be served without an ETag,
+so the next request tries the real route again.
+"""
+import gzip
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+from firebase_admin import firestore
+
+from services.blocking_io import run_blocking
+
+# Bump whenever generate_czml output changes for the same input
+CZML_GENERATOR_VERSION = 2
+ARTIFACT_COLLECTION = "artifacts"
+# Stay well below the 1 MiB Firestore document limit
+ARTIFACT_PART_BYTES = 900_000
+
+
+def artifact_key(track_version: str, params: Optional[Dict[str, Any]] = None) -> str:
+    payload = json.dumps(
+        {"track": track_version, "params": params or {}, "generator": CZML_GENERATOR_VERSION},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def etag_for(key: str) -> str:
+    return f'"{key}"'
+
+
+def etag_matches(if_none_match: Optional[str], key: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag_for(key) in tags or f"W/{etag_for(key)}" in tags
+
+
+def compress_czml(czml: Any) -> bytes:
+    return gzip.compress(json.dumps(czml, separators=(",", ":")).encode(), compresslevel=6)
+
+
+def _load(case_ref, name: str, key: str) -> Optional[bytes]:
+    artifact_ref = case_ref.collection(ARTIFACT_COLLECTION).document(name)
+    snap = artifact_ref.get()
+    if not snap.exists:
+        return None
+    data = snap.to_dict() or {}
+    if data.get("key") != key:
+        return None
+    if data.get("data") is not None:
+        return bytes(data["data"])
+    parts = artifact_ref.collection("parts").order_by("__name__").limit(int(data.get("parts") or 0)).stream()
+    blob = b"".join(bytes((part.to_dict() or {}).get("data") or b"") for part in parts)
+    return blob if len(blob) == data.get("size") else None
+
+
+def _store(db, case_ref, name: str, key: str, blob: bytes, params: Optional[Dict[str, Any]]) -> None:
+    artifact_ref = case_ref.collection(ARTIFACT_COLLECTION).document(name)
+    chunks = [blob[i:i + ARTIFACT_PART_BYTES] for i in range(0, len(blob), ARTIFACT_PART_BYTES)] or [b""]
+    meta = {
+        "key": key,
+        "encoding": "gzip",
+        "contentType": "application/json",
+        "size": len(blob),
+        "parts": len(chunks),
+        "params": params or {},
+        "generator": CZML_GENERATOR_VERSION,
+        "createdAt": firestore.SERVER_TIMESTAMP,
+    }
+    if len(chunks) == 1:
+        artifact_ref.set({**meta, "data": chunks[0]})
+        return
+    # Each part is close to the request size limit, so they are written one at a time;
+    # the artifact document goes last so readers never see a key whose parts are missing.
+    for i, chunk in enumerate(chunks):
+        artifact_ref.collection("parts").document(f"{i:04d}").set({"data": chunk})
+    artifact_ref.set({**meta, "data": None})
+
+
+async def load_artifact(case_ref, name: str, key: str) -> Optional[bytes]:
+    """The stored gzip bytes when the artifact was built for `key`, else None."""
+    return await run_blocking(_load, case_ref, name, key)
+
+
+async def store_artifact(
+    db, case_ref, name: str, key: str, czml: Any, params: Optional[Dict[str, Any]] = None, complete: bool = True
+) -> bytes:
+    """
+    Compress and persist a CZML document; returns the gzip bytes. A degraded document
+    (`complete=False`) is only compressed, leaving the artifact slot to the real one.
+    """
+    blob = await run_blocking(compress_czml, czml)
+    if complete:
+        await run_blocking(_store, db, case_ref, name, key, blob, params)
+    return blob
+
+
+def delete_artifacts(db, case_ref) -> int:
+    """Delete every artifact of a case, including split parts. Returns documents deleted."""
+    deleted = 0
+    for artifact in case_ref.collection(ARTIFACT_COLLECTION).stream():
+        refs = [part.reference for part in artifact.reference.collection("parts").stream()] + [artifact.reference]
+        for i in range(0, len(refs), 400):
+            batch = db.batch()
+            for ref in refs[i:i + 400]:
+                batch.delete(ref)
+            batch.commit()
+        deleted += len(refs)
+    return deleted
@@ -0,0 +1,116 @@
+"""
+CZML generation for Cesium track playback.
+
+`generate_czml` makes one pass over the points. Each timestamp is normalized once to
+a UTC datetime and integer epoch microseconds. The points are ordered by that value,
+and the `cartographicDegrees` offsets are differences of the integers, so timestamps
+are never re-parsed and no per-point logging happens. Points with a missing or
+unparseable timestamp are skipped, as before.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, Optional, Tuple
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_US_PER_SECOND = 1_000_000
+_ONE_US = timedelta(microseconds=1)
+
+
+def _to_utc(ts_val: Any) -> Optional[datetime]:
+    if isinstance(ts_val, list):
+        # Some stored points carry the timestamp wrapped in a list
+        if not ts_val:
+            return None
+        ts_val = ts_val[0]
+    if ts_val is None or ts_val == "" or isinstance(ts_val, list):
+        return None
+    try:
+        if isinstance(ts_val, datetime):
+            dt = ts_val
+        else:
+            ts_str = ts_val if isinstance(ts_val, str) else str(ts_val)
+            if ts_str.endswith("Z"):
+                ts_str = ts_str[:-1] + "+00:00"
+            dt = datetime.fromisoformat(ts_str)
+        # Naive values are read as server-local time, matching datetime.astimezone
+        return dt.astimezone(timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+
+
+def _iso_zulu(dt: datetime) -> str:
+    return dt.isoformat().replace("+00:00", "Z")
+
+
+def _normalize(points: list) -> List[Tuple[int, float, float, datetime]]:
+    """(epoch microseconds, lng, lat, utc datetime) per usable point, ordered by time."""
+    rows = []
+    append = rows.append
+    for p in points:
+        dt = _to_utc(p.get("timestamp"))
+        if dt is None:
+            continue
+        append(((dt - _EPOCH) // _ONE_US, p["lng"], p["lat"], dt))
+    rows.sort(key=lambda row: row[0])
+    return rows
+
+
+def generate_czml(case_id: str, points: list) -> list:
+    """
+    Generates a CZML document for Cesium animation from a list of GPS points,
+    using a simple polyline path instead of a 3D model.
+    """
+    if not points:
+        raise ValueError("No points provided for CZML generation")
+
+    rows = _normalize(points)
+    if len(rows) < 2:
+        raise ValueError("Not enough valid points after cleaning to generate CZML.")
+
+    availability_start = _iso_zulu(rows[0][3])
+    availability_end = _iso_zulu(rows[-1][3])
+
+    start_us = rows[0][0]
+    cartographic_degrees = [0.0] * (4 * len(rows))
+    cartographic_degrees[0::4] = [(row[0] - start_us) / _US_PER_SECOND for row in rows]
+    cartographic_degrees[1::4] = [row[1] for row in rows]
+    cartographic_degrees[2::4] = [row[2] for row in rows]
+    cartographic_degrees[3::4] = [0] * len(rows)
+
+    return [
+        {
+            "id": "document",
+            "name": f"Track for case {case_id}",
+            "version": "1.0",
+            "clock": {
+                "interval": f"{availability_start}/{availability_end}",
+                "currentTime": availability_start,
+                "multiplier": 10,
+                "range": "LOOP_STOP",
+                "step": "SYSTEM_CLOCK_MULTIPLIER"
+            }
+        },
+        {
+            "id": "pathEntity",
+            "availability": f"{availability_start}/{availability_end}",
+            "position": {
+                "interpolationAlgorithm": "LAGRANGE",
+                "interpolationDegree": 1,
+                "referenceFrame": "FIXED",
+                "epoch": availability_start,
+                "cartographicDegrees": cartographic_degrees
+            },
+            "path": {
+                "material": {
+                    "solidColor": {
+                        "color": {
+                            "rgba": [0, 255, 255, 255]
+                        }
+                    }
+                },
+                "width": 4,
+                "leadTime": 0,
+                "trailTime": 2000,
+                "resolution": 5
+            }
+        }
+    ]
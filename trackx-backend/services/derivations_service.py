@@ -1,9 +1,25 @@
 # services/derivations_service.py
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from math import radians, cos, sin, asin, sqrt
 from collections import defaultdict
 from google.cloud import firestore
 from firebase.firebase_config import db
+from services.track_storage import load_track_points
+
+try:
+    import numpy as np
+except ImportError:  # rollups fall back to the scalar engine
+    np = None
+
+EARTH_RADIUS_M = 6371000.0
+# Distances this close to a threshold are re-checked with the scalar haversine, so the
+# vectorized engine makes exactly the same decisions as the scalar one
+_THRESHOLD_EPSILON_M = 1e-6
+_EPOCH_NAIVE = datetime(1970, 1, 1)
+_EPOCH_AWARE = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_ONE_US = timedelta(microseconds=1)
+# Points checked one by one before a stationary cluster is measured in NumPy blocks
+_SCALAR_CLUSTER_PROBE = 16
 
 def _to_dt(ts):
     if hasattr(ts, "isoformat"):  # Firestore timestamp
@@ -14,7 +30,7 @@ def _to_dt(ts):
     return None
 
 def haversine_meters(lat1, lon1, lat2, lon2):
-    R = 6371000.0
+    R = EARTH_RADIUS_M
     dlat, dlon = radians(lat2-lat1), radians(lon2-lon1)
     a = sin(dlat/2)**2 + cos(radians(lat1))*cos(radians(lat2))*sin(dlon/2)**2
     return 2*R*asin(sqrt(a))
@@ -22,7 +38,62 @@ def haversine_meters(lat1, lon1, lat2, lon2):
 def _bucket_hour(dt):
     return dt.strftime("%H:00-%H:59")
 
+def _top_locations(stops):
+    # top locations by visit count (grid round ~0.001 ~ 100m)
+    key_counts = defaultdict(int)
+    for s in stops:
+        key = (round(s["lat"], 3), round(s["lng"], 3))
+        key_counts[key] += 1
+    return [
+        {"lat": k[0], "lng": k[1], "visits": v} 
+        for k, v in sorted(key_counts.items(), key=lambda kv: kv[1], reverse=True)[:5]
+    ]
+
+def _rollup_result(total_points, first, last, stops, active_hours, anomalies):
+    total_dur = (last - first).total_seconds()
+    longest = max(stops, key=lambda s: s["dwellSeconds"]) if stops else None
+
+    return {
+        "computedAt": datetime.now(timezone.utc).isoformat(),
+        "totalPoints": total_points,
+        "firstTimestamp": first.isoformat(),
+        "lastTimestamp": last.isoformat(),
+        "totalDurationSeconds": int(total_dur),
+        "stopCount": len(stops),
+        "longestDwell": (
+            {
+                "seconds": longest["dwellSeconds"],
+                "lat": longest["lat"], "lng": longest["lng"],
+                "start": longest["start"].isoformat(),
+                "end": longest["end"].isoformat()
+            } if longest else None
+        ),
+        "topLocations": _top_locations(stops),
+        "activeHoursBuckets": active_hours,
+        "anomalies": anomalies,
+        # (Optional) return events to save into subcollection:
+        "_events": [
+            {
+              "type":"stop",
+              "start": s["start"].isoformat(),
+              "end": s["end"].isoformat(),
+              "lat": s["lat"], "lng": s["lng"],
+              "dwellSeconds": s["dwellSeconds"],
+              "source": "derived-v1"
+            } for s in stops
+        ]
+    }
+
 def compute_rollup_from_allpoints(all_points: list, stop_radius_m=120, min_dwell_s=300):
+    """
+    Stop detection + rollups. Uses the NumPy engine when NumPy is installed and the
+    pure-Python one otherwise; both return the same rollup.
+    """
+    if np is not None:
+        return compute_rollup_vectorized(all_points, stop_radius_m, min_dwell_s)
+    return compute_rollup_scalar(all_points, stop_radius_m, min_dwell_s)
+
+def compute_rollup_scalar(all_points: list, stop_radius_m=120, min_dwell_s=300):
     """Very lightweight stop detection + rollups without external libs."""
     # 1) sort
     pts = []
@@ -39,7 +110,6 @@ def compute_rollup_from_allpoints(all_points: list, stop_radius_m=120, min_dwell
 
     # 2) basic timeline stats
     first, last = pts[0]["ts"], pts[-1]["ts"]
-    total_dur = (last - first).total_seconds()
 
     # 3) cluster stops (greedy: nearby consecutive points form a stop)
     stops = []
@@ -63,23 +133,13 @@ def compute_rollup_from_allpoints(all_points: list, stop_radius_m=120, min_dwell
             })
         i = j
 
-    # 4) top locations by visit count (grid round ~0.001 ~ 100m)
-    key_counts = defaultdict(int)
-    for s in stops:
-        key = (round(s["lat"], 3), round(s["lng"], 3))
-        key_counts[key] += 1
-    top_locations = [
-        {"lat": k[0], "lng": k[1], "visits": v} 
-        for k, v in sorted(key_counts.items(), key=lambda kv: kv[1], reverse=True)[:5]
-    ]
-
-    # 5) active hours (simple)
+    # 4) active hours (simple)
     hours = defaultdict(int)
     for p in pts:
         hours[_bucket_hour(p["ts"])] += 1
     active_hours = [h for h,_ in sorted(hours.items(), key=lambda kv: kv[1], reverse=True)[:6]]
 
-    # 6) anomalies (big jumps > 10km in < 5 minutes)
+    # 5) anomalies (big jumps > 10km in < 5 minutes)
     anomalies = []
     for a, b in zip(pts, pts[1:]):
         dt = (b["ts"] - a["ts"]).total_seconds()
@@ -88,38 +148,120 @@ def compute_rollup_from_allpoints(all_points: list, stop_radius_m=120, min_dwell
             if meters > 10000:
                 anomalies.append({"type":"big_jump","ts":b["ts"].isoformat(),"meters":int(meters)})
 
-    longest = max(stops, key=lambda s: s["dwellSeconds"]) if stops else None
+    return _rollup_result(len(pts), first, last, stops, active_hours, anomalies)
 
-    return {
-        "computedAt": datetime.now(timezone.utc).isoformat(),
-        "totalPoints": len(pts),
-        "firstTimestamp": first.isoformat(),
-        "lastTimestamp": last.isoformat(),
-        "totalDurationSeconds": int(total_dur),
-        "stopCount": len(stops),
-        "longestDwell": (
-            {
-                "seconds": longest["dwellSeconds"],
-                "lat": longest["lat"], "lng": longest["lng"],
-                "start": longest["start"].isoformat(),
-                "end": longest["end"].isoformat()
-            } if longest else None
-        ),
-        "topLocations": top_locations,
-        "activeHoursBuckets": active_hours,
-        "anomalies": anomalies,
-        # (Optional) return events to save into subcollection:
-        "_events": [
-            {
-              "type":"stop",
-              "start": s["start"].isoformat(),
-              "end": s["end"].isoformat(),
-              "lat": s["lat"], "lng": s["lng"],
-              "dwellSeconds": s["dwellSeconds"],
-              "source": "derived-v1"
-            } for s in stops
-        ]
-    }
+def _haversine_from(lat_deg, lng_deg, cos_lat, i, idx):
+    """Vectorized haversine_meters from point i to the points at idx (same formula)."""
+    dlat = np.radians(lat_deg[idx] - lat_deg[i])
+    dlon = np.radians(lng_deg[idx] - lng_deg[i])
+    a = np.sin(dlat / 2) ** 2 + cos_lat[i] * cos_lat[idx] * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+def _haversine_consecutive(lat_deg, lng_deg, cos_lat):
+    """Vectorized haversine_meters between each point and the next."""
+    dlat = np.radians(np.diff(lat_deg))
+    dlon = np.radians(np.diff(lng_deg))
+    a = np.sin(dlat / 2) ** 2 + cos_lat[:-1] * cos_lat[1:] * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+def compute_rollup_vectorized(all_points: list, stop_radius_m=120, min_dwell_s=300):
+    """
+    NumPy engine with the same output as compute_rollup_scalar. The track is parsed once
+    into contiguous arrays (degrees, integer epoch microseconds, hour of day). Sorting,
+    consecutive distances, hour histograms and jump detection are array operations.
+    Stop clustering still walks anchors, but it skips moving points via the precomputed
+    consecutive distances and measures a stationary cluster in vectorized blocks.
+    """
+    # 1) parse once
+    rows = [(p.get("lat"), p.get("lng"), _to_dt(p.get("timestamp"))) for p in all_points]
+    rows = [r for r in rows if r[0] is not None and r[1] is not None and r[2] is not None]
+    if not rows:
+        return {"totalPoints": 0}
+    lats, lngs, dts = zip(*rows)
+
+    naive = [dt.tzinfo is None for dt in dts]
+    if any(naive) and not all(naive):
+        # Mixed naive/aware timestamps cannot be ordered; let the scalar engine raise as it always has
+        return compute_rollup_scalar(all_points, stop_radius_m, min_dwell_s)
+    epoch = _EPOCH_NAIVE if naive[0] else _EPOCH_AWARE
+    micros = np.fromiter(((dt - epoch) // _ONE_US for dt in dts), dtype=np.int64, count=len(dts))
+    hours_of_day = np.fromiter((dt.hour for dt in dts), dtype=np.int64, count=len(dts))
+
+    order = np.argsort(micros, kind="stable")
+    n = len(order)
+    lat_deg = np.fromiter(map(float, lats), dtype=np.float64, count=n)[order]
+    lng_deg = np.fromiter(map(float, lngs), dtype=np.float64, count=n)[order]
+    micros = micros[order]
+    hours_of_day = hours_of_day[order]
+    sorted_dts = [dts[k] for k in order.tolist()]
+    lat_list, lng_list = lat_deg.tolist(), lng_deg.tolist()
+    cos_lat = np.cos(np.radians(lat_deg))
+
+    def _over(i, j, meters):
+        # Exact scalar decision for distances that land on a threshold
+        if abs(meters - stop_radius_m) <= _THRESHOLD_EPSILON_M:
+            return haversine_meters(lat_list[i], lng_list[i], lat_list[j], lng_list[j]) > stop_radius_m
+        return meters > stop_radius_m
+
+    # 2) cluster stops (greedy: nearby consecutive points form a stop)
+    step_arr = _haversine_consecutive(lat_deg, lng_deg, cos_lat) if n > 1 else np.empty(0)
+    step = step_arr.tolist()
+    # Anchors whose successor may be within the radius; every other point is a lone
+    # (moving) point and can never start a stop
+    maybe_stationary = np.flatnonzero(step_arr <= stop_radius_m + _THRESHOLD_EPSILON_M)
+    stops = []
+    i = 0
+    while i < n:
+        pos = int(np.searchsorted(maybe_stationary, i))
+        if pos == len(maybe_stationary):
+            break
+        i = int(maybe_stationary[pos])
+        j = i + 1
+        if not _over(i, j, step[i]):
+            j += 1
+            # Short clusters are cheaper to walk point by point than to hand to NumPy
+            short_end = min(n, i + _SCALAR_CLUSTER_PROBE)
+            while j < short_end and haversine_meters(lat_list[i], lng_list[i], lat_list[j], lng_list[j]) <= stop_radius_m:
+                j += 1
+            block = _SCALAR_CLUSTER_PROBE
+            while short_end <= j < n:
+                end = min(n, j + block)
+                meters = _haversine_from(lat_deg, lng_deg, cos_lat, i, np.arange(j, end))
+                candidates = np.flatnonzero(meters > stop_radius_m - _THRESHOLD_EPSILON_M).tolist()
+                far = next((j + k for k in candidates if _over(i, j + k, float(meters[k]))), None)
+                if far is not None:
+                    j = far
+                    break
+                j = end
+                block *= 2
+        size = j - i
+        dwell = int(micros[j - 1] - micros[i]) / 1e6
+        if dwell >= min_dwell_s and size >= 2:
+            stops.append({
+                "lat": sum(lat_list[i:j]) / size,
+                "lng": sum(lng_list[i:j]) / size,
+                "start": sorted_dts[i], "end": sorted_dts[j - 1],
+                "dwellSeconds": int(dwell)
+            })
+        i = j
+
+    # 3) active hours: histogram, ties in order of first appearance like the scalar dict
+    counts = np.bincount(hours_of_day, minlength=24)
+    present, first_seen = np.unique(hours_of_day, return_index=True)
+    ranked = sorted(zip(present.tolist(), first_seen.tolist()), key=lambda hf: (-int(counts[hf[0]]), hf[1]))
+    active_hours = [f"{h:02d}:00-{h:02d}:59" for h, _ in ranked[:6]]
+
+    # 4) anomalies (big jumps > 10km in < 5 minutes)
+    anomalies = []
+    if n > 1:
+        gaps_ok = np.diff(micros) <= 300 * 1_000_000
+        candidates = np.flatnonzero(gaps_ok & (step_arr > 10000 - _THRESHOLD_EPSILON_M)).tolist()
+        for k in candidates:
+            meters = haversine_meters(lat_list[k], lng_list[k], lat_list[k + 1], lng_list[k + 1])
+            if meters > 10000:
+                anomalies.append({"type":"big_jump","ts":sorted_dts[k + 1].isoformat(),"meters":int(meters)})
+
+    return _rollup_result(n, sorted_dts[0], sorted_dts[-1], stops, active_hours, anomalies)
 
 def write_rollup(case_id: str, rollup: dict):
     case_ref = db.collection("cases").document(case_id)
@@ -137,7 +279,7 @@ def write_rollup(case_id: str, rollup: dict):
     batch.commit()
 
 def compute_and_store_rollup(case_id: str):
-    allp = [d.to_dict() for d in db.collection("cases").document(case_id).collection("allPoints").stream()]
+    allp = load_track_points(db.collection("cases").document(case_id))
     if not allp:
         return {"success": False, "message": "No allPoints"}
     rollup = compute_rollup_from_allpoints(allp)
@@ -0,0 +1,134 @@
+"""
+In-process background jobs with progress persisted to Firestore.
+
+`enqueue_job` records a job in the `jobs` collection and puts it on an asyncio queue.
+A pool of JOB_WORKERS worker tasks drains the queue; the pool starts lazily on the
+running event loop the first time a job is queued. A job is an async callable that
+receives a JobProgress and reports done/total through it. Clients poll the job
+document through `get_job`.
+
+The queue lives in process memory. Jobs still queued or running when the process
+stops are not resumed; their documents keep the last status they reported.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from firebase_admin import firestore
+
+from firebase.firebase_config import db
+from services.blocking_io import run_blocking
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Minimum seconds between progress writes for one job
+JOB_PROGRESS_INTERVAL = float(os.getenv("JOB_PROGRESS_INTERVAL", "1.0"))
+
+JOBS_COLLECTION = "jobs"
+
+_queue: Optional[asyncio.Queue] = None
+_workers: list = []
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+class JobProgress:
+    """Progress handle passed to a running job; writes to the job document are throttled."""
+
+    def __init__(self, job_id: str, total: int = 0):
+        self.job_id = job_id
+        self.total = total
+        self.done = 0
+        self._last_write = 0.0
+
+    async def _write(self, fields: Dict[str, Any]) -> None:
+        fields["updatedAt"] = firestore.SERVER_TIMESTAMP
+        await run_blocking(db.collection(JOBS_COLLECTION).document(self.job_id).update, fields)
+        self._last_write = time.monotonic()
+
+    async def set_total(self, total: int) -> None:
+        self.total = total
+        await self._write({"total": total, "done": self.done})
+
+    async def advance(self, count: int = 1, stage: Optional[str] = None) -> None:
+        self.done += count
+        if stage is not None or time.monotonic() - self._last_write >= JOB_PROGRESS_INTERVAL:
+            fields = {"done": self.done, "total": self.total}
+            if stage is not None:
+                fields["stage"] = stage
+            await self._write(fields)
+
+    async def stage(self, stage: str) -> None:
+        await self._write({"stage": stage, "done": self.done, "total": self.total})
+
+
+JobHandler = Callable[[JobProgress], Awaitable[Any]]
+
+
+async def _run_job(job_id: str, handler: JobHandler, total: int) -> None:
+    progress = JobProgress(job_id, total)
+    try:
+        await progress._write({"status": "running", "startedAt": firestore.SERVER_TIMESTAMP})
+        result = await handler(progress)
+        await progress._write({
+            "status": "done",
+            "done": max(progress.done, progress.total),
+            "total": progress.total,
+            "result": result if isinstance(result, dict) else None,
+            "finishedAt": firestore.SERVER_TIMESTAMP,
+        })
+    except Exception as e:
+        logger.error(f"Job {job_id} failed: {e}")
+        try:
+            await progress._write({"status": "failed", "error": str(e), "finishedAt": firestore.SERVER_TIMESTAMP})
+        except Exception as write_err:
+            logger.error(f"Could not record failure of job {job_id}: {write_err}")
+
+
+async def _worker() -> None:
+    while True:
+        job_id, handler, total = await _queue.get()
+        try:
+            await _run_job(job_id, handler, total)
+        finally:
+            _queue.task_done()
+
+
+def _ensure_workers() -> None:
+    global _queue, _workers, _loop
+    loop = asyncio.get_running_loop()
+    if _loop is not loop:
+        # First use, or a new event loop (e.g. a restarted server or test run)
+        _loop = loop
+        _queue = asyncio.Queue()
+        _workers = []
+    _workers = [w for w in _workers if not w.done()]
+    while len(_workers) < max(1, JOB_WORKERS):
+        _workers.append(loop.create_task(_worker()))
+
+
+async def enqueue_job(job_type: str, handler: JobHandler, total: int = 0, **fields) -> str:
+    """Persist a queued job and schedule `handler` on the worker pool. Returns the job id."""
+    job_id = str(uuid.uuid4())
+    await run_blocking(db.collection(JOBS_COLLECTION).document(job_id).set, {
+        "type": job_type,
+        "status": "queued",
+        "done": 0,
+        "total": total,
+        "createdAt": firestore.SERVER_TIMESTAMP,
+        "updatedAt": firestore.SERVER_TIMESTAMP,
+        **fields,
+    })
+    _ensure_workers()
+    await _queue.put((job_id, handler, total))
+    return job_id
+
+
+async def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    snap = await run_blocking(db.collection(JOBS_COLLECTION).document(job_id).get)
+    if not snap.exists:
+        return None
+    return {"jobId": job_id, **(snap.to_dict() or {})}
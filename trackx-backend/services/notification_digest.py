@@ -0,0 +1,149 @@
+"""
+Debounced digests for case-update notifications.
+
+When NOTIFICATION_DIGEST_WINDOW_SECONDS is above zero, `update_case` does not notify
+on every save. Edits are buffered per case for the window, which starts at the first
+buffered edit, and merged per recipient: each collaborator only accumulates the saves
+that notified them. A user added mid-window therefore never hears about earlier edits.
+When the window closes, the recipients are checked against the case's current members,
+so a user removed mid-window gets nothing. Each remaining collaborator gets one merged
+notification. A field edited several times is reported once, from its first old value
+to its latest value. Fields that ended up back at their original value are dropped, and
+a collaborator whose net change is empty gets no notification. The default of 0 keeps
+the old behavior of one notification per save.
+
+The buffer is in process memory; `flush_all` writes out pending digests (called on
+application shutdown).
+"""
+import asyncio
+import functools
+import logging
+import os
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from firebase.firebase_config import db
+from services.blocking_io import run_blocking
+from services.notifications_service import add_notifications_bulk
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_DIGEST_WINDOW_SECONDS = float(os.getenv("NOTIFICATION_DIGEST_WINDOW_SECONDS", "0"))
+
+# case_id -> {"title", "task", "recipients": {user_id: {"changes": {field: [old, new]}, "edits"}}}
+_pending: Dict[str, Dict[str, Any]] = {}
+
+
+def digest_enabled() -> bool:
+    return NOTIFICATION_DIGEST_WINDOW_SECONDS > 0
+
+
+def format_case_update_message(case_title: str, changes: List[Tuple[str, Any, Any]]) -> str:
+    if changes:
+        return f"The following updates were made to your case '{case_title}': " + ", ".join(
+            f"{key} changed from '{old_value}' to '{new_value}'" for key, old_value, new_value in changes
+        )
+    return f"Your case '{case_title}' has been updated."
+
+
+async def _current_members(case_id: str) -> Optional[Set[str]]:
+    """User ids currently on the case; None when they could not be read."""
+    try:
+        snap = await run_blocking(db.collection("cases").document(case_id).get, field_paths=["userIds", "userId"])
+    except Exception as e:
+        logger.warning(f"Could not read members of case {case_id} for its digest: {e}")
+        return None
+    if not snap.exists:
+        return set()
+    data = snap.to_dict() or {}
+    return {uid for uid in (data.get("userIds") or []) + [data.get("userId")] if uid}
+
+
+async def _send_digest(case_id: str, entry: Dict[str, Any]) -> int:
+    """Send the buffered digests of a case. Returns the number of users notified."""
+    members = await _current_members(case_id)
+    # Recipients who saw the same saves get the same message, so they share one bulk write
+    groups: Dict[Tuple, List[str]] = {}
+    for uid, buffered in entry["recipients"].items():
+        if members is not None and uid not in members:
+            continue
+        changes = tuple((key, old, new) for key, (old, new) in buffered["changes"].items() if old != new)
+        if not changes:
+            # Everything this recipient saw was changed back: nothing to report
+            continue
+        groups.setdefault((changes, buffered["edits"]), []).append(uid)
+
+    delivered = 0
+    for (changes, edits), recipients in groups.items():
+        result = await add_notifications_bulk(
+            recipients,
+            title="Case Updated",
+            message=format_case_update_message(entry["title"], list(changes)),
+            notification_type="case-update",
+            metadata={"caseId": case_id, "edits": edits},
+        )
+        delivered += result.get("delivered", 0)
+    logger.info(f"Case {case_id} digest sent to {delivered} users")
+    return delivered
+
+
+async def _flush_after(case_id: str, delay: float) -> None:
+    await asyncio.sleep(delay)
+    entry = _pending.pop(case_id, None)
+    if entry:
+        await _send_digest(case_id, entry)
+
+
+def _log_flush_failure(case_id: str, task: asyncio.Task) -> None:
+    # Nothing awaits the flush tasks, so their errors would otherwise vanish
+    if task.cancelled():
+        return
+    error = task.exception()
+    if error is not None:
+        logger.error(f"Case {case_id} update digest failed: {error}", exc_info=error)
+
+
+def queue_case_update(
+    case_id: str,
+    case_title: str,
+    recipients: Iterable[str],
+    changes: List[Tuple[str, Any, Any]],
+) -> None:
+    """
+    Buffer one save of a case for the users it notifies; the merged notifications go out
+    when the window closes.
+    """
+    entry = _pending.get(case_id)
+    if entry is None:
+        entry = {"title": case_title, "recipients": {}}
+        entry["task"] = asyncio.get_running_loop().create_task(
+            _flush_after(case_id, NOTIFICATION_DIGEST_WINDOW_SECONDS)
+        )
+        entry["task"].add_done_callback(functools.partial(_log_flush_failure, case_id))
+        _pending[case_id] = entry
+
+    entry["title"] = case_title
+    for uid in dict.fromkeys(recipients):
+        if not uid:
+            continue
+        buffered = entry["recipients"].setdefault(uid, {"changes": {}, "edits": 0})
+        buffered["edits"] += 1
+        for key, old_value, new_value in changes:
+            if key in buffered["changes"]:
+                buffered["changes"][key][1] = new_value
+            else:
+                buffered["changes"][key] = [old_value, new_value]
+
+
+async def flush_all() -> int:
+    """Send every pending digest now. Returns the number of digests sent."""
+    sent = 0
+    for case_id in list(_pending):
+        entry = _pending.pop(case_id, None)
+        if not entry:
+            continue
+        task: Optional[asyncio.Task] = entry.get("task")
+        if task is not None:
+            task.cancel()
+        await _send_digest(case_id, entry)
+        sent += 1
+    return sent
@@ -0,0 +1,132 @@
+"""
+Push delivery of new notifications to connected clients.
+
+The hub keeps at most one Firestore `on_snapshot` listener per user, however many
+streams that user has open (tabs, devices). The listener watches notifications
+written after it started. Every change is fanned out to the asyncio queues of that
+user's subscribers. The listener is removed when the user's last stream closes, so
+idle users cost nothing.
+
+Firestore calls listener callbacks on its own thread; events are handed to each
+subscriber's event loop with call_soon_threadsafe.
+"""
+import asyncio
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from firebase.firebase_config import db
+from services.blocking_io import run_blocking
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per connection before the oldest are dropped (slow consumer)
+NOTIFICATION_STREAM_QUEUE_SIZE = int(os.getenv("NOTIFICATION_STREAM_QUEUE_SIZE", "100"))
+
+_CHANGE_EVENTS = {"ADDED": "notification", "MODIFIED": "notification-updated", "REMOVED": "notification-removed"}
+
+
+class _Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=NOTIFICATION_STREAM_QUEUE_SIZE)
+
+    def _put(self, event: Dict[str, Any]) -> None:
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    def deliver(self, event: Dict[str, Any]) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # Subscriber's loop already closed; it will be removed on unsubscribe
+            pass
+
+
+class NotificationHub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, set] = {}
+        self._watches: Dict[str, Any] = {}
+
+    def _on_snapshot(self, user_id: str, changes) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for change in changes:
+            event_type = _CHANGE_EVENTS.get(change.type.name)
+            if not event_type:
+                continue
+            doc = change.document
+            event = {"event": event_type, "data": {**(doc.to_dict() or {}), "id": doc.id}}
+            for subscriber in subscribers:
+                subscriber.deliver(event)
+
+    def _start_watch(self, user_id: str):
+        # ISO timestamps sort chronologically, so this matches only notifications added from now on
+        since = datetime.utcnow().isoformat()
+        query = (
+            db.collection("users").document(user_id).collection("notifications")
+            .where("timestamp", ">=", since)
+        )
+        return query.on_snapshot(lambda _docs, changes, _read_time: self._on_snapshot(user_id, changes))
+
+    async def subscribe(self, user_id: str) -> _Subscriber:
+        subscriber = _Subscriber(asyncio.get_running_loop())
+        with self._lock:
+            subscribers = self._subscribers.setdefault(user_id, set())
+            subscribers.add(subscriber)
+            needs_watch = user_id not in self._watches
+            if needs_watch:
+                self._watches[user_id] = None  # reserve while the listener starts
+        if needs_watch:
+            try:
+                watch = await run_blocking(self._start_watch, user_id)
+            except Exception:
+                with self._lock:
+                    self._watches.pop(user_id, None)
+                    self._subscribers.get(user_id, set()).discard(subscriber)
+                raise
+            with self._lock:
+                # Everyone may have left (or another listener taken over) while this one started
+                keep = bool(self._subscribers.get(user_id)) and self._watches.get(user_id) is None
+                if keep:
+                    self._watches[user_id] = watch
+            if not keep:
+                self._stop_watch(user_id, watch)
+        return subscriber
+
+    def unsubscribe(self, user_id: str, subscriber: _Subscriber) -> None:
+        watch = None
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    self._subscribers.pop(user_id, None)
+                    watch = self._watches.pop(user_id, None)
+        if watch is not None:
+            self._stop_watch(user_id, watch)
+
+    def _stop_watch(self, user_id: str, watch) -> None:
+        try:
+            watch.unsubscribe()
+        except Exception as e:
+            logger.debug(f"Failed to stop notification listener for {user_id}: {e}")
+
+    def active_listeners(self) -> int:
+        with self._lock:
+            return sum(1 for watch in self._watches.values() if watch is not None)
+
+
+hub = NotificationHub()
+
+
+async def next_event(subscriber: _Subscriber, timeout: float) -> Optional[Dict[str, Any]]:
+    """Wait up to `timeout` seconds for the subscriber's next event; None on timeout."""
+    try:
+        return await asyncio.wait_for(subscriber.queue.get(), timeout)
+    except asyncio.TimeoutError:
+        return None
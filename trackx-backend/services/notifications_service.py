@@ -1,6 +1,42 @@
 from firebase.firebase_config import db
+from services.blocking_io import run_blocking, fetch_all
+from firebase_admin import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable, List, Tuple
+import asyncio
+import base64
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_ID = FieldPath.document_id()
+NOTIFICATION_PAGE_MAX = 100
+# Two writes per recipient keeps a batch within Firestore's 500-write limit
+NOTIFICATION_BATCH_RECIPIENTS = 250
+# Documents read and written per batch by the bulk delete / mark-read / retention jobs
+NOTIFICATION_CHUNK_SIZE = 400
+# Stored as `unreadCountersVersion` by a full recount. Increments alone create
+# `unreadCount` on users who were never counted, so the field's presence does not mean
+# the counters are right; this marker does.
+UNREAD_COUNTERS_VERSION = 1
+
+
+def _unread_counter_delta(notification_type: Optional[str], delta: int) -> Dict[str, Any]:
+    """Counter fields on the user document: `unreadCount` and `unreadByType.<type>`."""
+    fields: Dict[str, Any] = {"unreadCount": firestore.Increment(delta)}
+    if notification_type:
+        fields["unreadByType"] = {notification_type: firestore.Increment(delta)}
+    return fields
+
+
+def _unread_counter_update(notification_type: Optional[str], delta: int) -> Dict[str, Any]:
+    """The same counter change as field paths for update(), which never creates the user."""
+    fields: Dict[str, Any] = {"unreadCount": firestore.Increment(delta)}
+    if notification_type:
+        fields[FieldPath("unreadByType", notification_type).to_api_repr()] = firestore.Increment(delta)
+    return fields
 
 
 async def add_notification(
@@ -22,30 +58,161 @@ async def add_notification(
     Returns:
         dict: A dictionary indicating success or failure.
     """
+    result = await add_notifications_bulk([user_id], title, message, notification_type, metadata)
+    if not result["success"]:
+        return {"success": False, "message": result["message"]}
+    return {"success": True, "message": "Notification added successfully"}
+
+
+async def add_notifications_bulk(
+    recipients: Iterable[str],
+    title: str,
+    message: str,
+    notification_type: str,
+    metadata: Optional[Dict[str, Any]] = None,
+):
+    """
+    Add the same notification for several users at once.
+
+    Each recipient costs two writes (the notification and the user's unread counters),
+    committed together in the same batch; batches of up to NOTIFICATION_BATCH_RECIPIENTS
+    recipients are committed concurrently, so fan-out time barely grows with team size.
+    Recipients without a user document (stale ids in a case's userIds, deleted accounts)
+    are skipped: their counters are updated, never created, so no stub users appear.
+
+    Args:
+        recipients (Iterable[str]): User IDs; empty and duplicate IDs are skipped.
+        title (str): The title of the notification.
+        message (str): The detailed message of the notification.
+        notification_type (str): The type of the notification (e.g., "case-update", "system").
+
+    Returns:
+        dict: Success flag, the number of users notified and, on failure, a message.
+    """
+    user_ids = list(dict.fromkeys(uid for uid in recipients if uid))
+    if not user_ids:
+        return {"success": True, "delivered": 0}
+
+    # Prepare the notification data
+    notification_data = {
+        "title": title,
+        "message": message,
+        "type": notification_type,
+        "timestamp": datetime.utcnow().isoformat(),  # Use UTC timestamp
+        "read": False,  # Default to unread
+        "metadata": metadata or {},
+    }
+    counter_update = _unread_counter_update(notification_type, 1)
+
+    def _commit(chunk: List[str]) -> int:
+        user_refs = [db.collection("users").document(uid) for uid in chunk]
+        existing = [snap.reference for snap in db.get_all(user_refs, field_paths=["unreadCount"]) if snap.exists]
+        if len(existing) < len(chunk):
+            logger.info(f"Skipped {len(chunk) - len(existing)} notification recipients without a user document")
+        if not existing:
+            return 0
+        # Add the notifications and bump the unread counters in one atomic write
+        batch = db.batch()
+        for user_ref in existing:
+            batch.set(user_ref.collection("notifications").document(), dict(notification_data))
+            batch.update(user_ref, counter_update)
+        batch.commit()
+        return len(existing)
+
+    chunks = [
+        user_ids[i:i + NOTIFICATION_BATCH_RECIPIENTS]
+        for i in range(0, len(user_ids), NOTIFICATION_BATCH_RECIPIENTS)
+    ]
+    results = await asyncio.gather(*(run_blocking(_commit, chunk) for chunk in chunks), return_exceptions=True)
+
+    delivered = sum(result for result in results if not isinstance(result, Exception))
+    errors = [result for result in results if isinstance(result, Exception)]
+    if errors:
+        return {"success": False, "delivered": delivered, "message": f"Failed to add notifications: {errors[0]}"}
+    return {"success": True, "delivered": delivered}
+
+def _notifications_query(user_id: str, notification_type: Optional[str] = None):
+    """A user's notifications, optionally filtered by type (unordered; used for counts)."""
+    query = db.collection("users").document(user_id).collection("notifications")
+    if notification_type:
+        query = query.where("type", "==", notification_type)
+    return query
+
+
+def _ordered_notifications_query(user_id: str, notification_type: Optional[str] = None):
+    """
+    Newest first. Timestamps are ISO strings, which sort chronologically; the document
+    id breaks ties so cursors are stable.
+    """
+    return (
+        _notifications_query(user_id, notification_type)
+        .order_by("timestamp", direction=firestore.Query.DESCENDING)
+        .order_by(DOCUMENT_ID, direction=firestore.Query.DESCENDING)
+    )
+
+
+def _encode_notification_cursor(doc) -> str:
+    data = doc.to_dict() or {}
+    payload = json.dumps({"timestamp": data.get("timestamp"), "id": doc.id})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def _decode_notification_cursor(cursor: str) -> Dict[str, Any]:
+    """Query position of a cursor from _encode_notification_cursor. Raises ValueError when it is invalid."""
     try:
-        # Prepare the notification data
-        notification_data = {
-            "title": title,
-            "message": message,
-            "type": notification_type,
-            "timestamp": datetime.utcnow().isoformat(),  # Use UTC timestamp
-            "read": False,  # Default to unread
-            "metadata": metadata or {},
-        }
-
-        # Reference to the user's notifications subcollection
-        notifications_ref = db.collection("users").document(user_id).collection("notifications")
-
-        # Add the notification document
-        notifications_ref.add(notification_data)
-
-        return {"success": True, "message": "Notification added successfully"}
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        return {"timestamp": payload["timestamp"], DOCUMENT_ID: str(payload["id"])}
     except Exception as e:
-        return {"success": False, "message": f"Failed to add notification: {str(e)}"}
+        logger.warning(f"Rejecting invalid notification cursor: {e}")
+        raise ValueError("Invalid cursor") from e
+
+
+async def count_notifications(user_id: str, notification_type: Optional[str] = None) -> int:
+    """Server-side count aggregation; no notification documents are transferred."""
+    results = await run_blocking(_notifications_query(user_id, notification_type).count().get)
+    return int(results[0][0].value) if results else 0
+
+
+async def fetch_notifications_page(
+    user_id: str,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    page: Optional[int] = None,
+    notification_type: Optional[str] = None,
+    include_total: bool = True,
+) -> Tuple[List[Dict[str, Any]], Optional[str], Optional[int]]:
+    """
+    Fetch one page of a user's notifications, newest first, as a Firestore query.
+
+    Pass the `cursor` returned with the previous page to continue; `page` (1-based) is
+    accepted for clients that still page by number and is served with a query offset.
+    Returns (notifications, next_cursor, total); total is None when include_total=False.
+    Raises ValueError for a malformed cursor.
+    """
+    limit = max(1, min(int(limit), NOTIFICATION_PAGE_MAX))
+    query = _ordered_notifications_query(user_id, notification_type)
+
+    position = _decode_notification_cursor(cursor) if cursor else None
+    if position:
+        query = query.start_after(position)
+    elif page and page > 1:
+        query = query.offset((page - 1) * limit)
+    # One extra document tells us whether another page exists
+    query = query.limit(limit + 1)
+
+    if include_total:
+        docs, total = await asyncio.gather(fetch_all(query), count_notifications(user_id, notification_type))
+    else:
+        docs, total = await fetch_all(query), None
+
+    next_cursor = _encode_notification_cursor(docs[limit - 1]) if len(docs) > limit else None
+    notifications = [{**doc.to_dict(), "id": doc.id} for doc in docs[:limit]]
+    return notifications, next_cursor, total
+
 
 async def fetch_notifications(user_id: str, notification_type: Optional[str] = None):
     """
-    Fetch all notifications for a specific user.
+    Fetch all notifications for a specific user, newest first.
 
     Args:
         user_id (str): The ID of the user whose notifications are being fetched.
@@ -54,27 +221,11 @@ async def fetch_notifications(user_id: str, notification_type: Optional[str] = N
         list: A list of notifications, each represented as a dictionary.
     """
     try:
-        # Reference to the user's notifications subcollection
-        notifications_ref = db.collection("users").document(user_id).collection("notifications")
-
-        # Fetch all notifications
-        notifications = notifications_ref.stream()
-
-        # Convert Firestore documents to dictionaries
-        notifications_list = [
+        notifications = await fetch_all(_ordered_notifications_query(user_id, notification_type))
+        return [
             {**notification.to_dict(), "id": notification.id}
             for notification in notifications
         ]
-
-        # Sort notifications by timestamp (newest first)
-        notifications_list.sort(key=lambda x: x["timestamp"], reverse=True)
-
-        if notification_type:
-            notifications_list = [
-                item for item in notifications_list if item.get("type") == notification_type
-            ]
-
-        return notifications_list
     except Exception as e:
         print(f"Error fetching notifications for user {user_id}: {str(e)}")
         raise Exception(f"Failed to fetch notifications: {str(e)}")
@@ -93,39 +244,174 @@ async def update_notification(user_id: str, notification_id: str, read: bool):
     """
     try:
         # Reference to the user's notification document
-        notification_ref = db.collection("users").document(user_id).collection("notifications").document(notification_id)
+        user_ref = db.collection("users").document(user_id)
+        notification_ref = user_ref.collection("notifications").document(notification_id)
 
-        # Check if the document exists
-        doc = notification_ref.get()
-        if not doc.exists:
-            print(f"Notification {notification_id} not found for user {user_id}.")
-            return {"success": False, "message": "Notification not found"}
+        @firestore.transactional
+        def _apply(transaction):
+            # Check if the document exists
+            doc = notification_ref.get(transaction=transaction)
+            if not doc.exists:
+                return False
+            data = doc.to_dict() or {}
+            transaction.update(notification_ref, {"read": read})
+            # Counters only move when the read state actually changes
+            if bool(data.get("read")) != bool(read):
+                transaction.set(user_ref, _unread_counter_delta(data.get("type"), -1 if read else 1), merge=True)
+            return True
 
         # Update the read status
         print(f"Updating notification {notification_id} for user {user_id} with read={read}")
-        notification_ref.update({"read": read})
+        if not await run_blocking(_apply, db.transaction()):
+            print(f"Notification {notification_id} not found for user {user_id}.")
+            return {"success": False, "message": "Notification not found"}
         return {"success": True, "message": "Notification updated successfully"}
     except Exception as e:
         print(f"Error updating notification {notification_id} for user {user_id}: {str(e)}")
         raise Exception(f"Failed to update notification: {str(e)}")
 
 
-async def delete_all_notifications(user_id: str):
+def _process_in_chunks(query, apply_chunk, page_size: int = NOTIFICATION_CHUNK_SIZE) -> int:
     """
-    Delete all notifications for a specific user.
+    Repeatedly read up to page_size documents matching `query` and hand them to
+    apply_chunk(batch, docs) in a fresh batch. The query must stop matching a document once
+    it was processed (deleted, marked read, ...). Returns the number of documents processed.
     """
-    try:
-        notifications_ref = db.collection("users").document(user_id).collection("notifications")
-        docs = list(notifications_ref.stream())
+    processed = 0
+    while True:
+        docs = list(query.limit(page_size).stream())
         if not docs:
-            return {"success": True, "deleted": 0}
-
+            return processed
         batch = db.batch()
+        apply_chunk(batch, docs)
+        batch.commit()
+        processed += len(docs)
+
+
+def _delete_notifications(query) -> int:
+    def _delete(batch, docs):
         for doc in docs:
             batch.delete(doc.reference)
-        batch.commit()
 
-        return {"success": True, "deleted": len(docs)}
+    return _process_in_chunks(query.select([DOCUMENT_ID]), _delete)
+
+
+async def delete_all_notifications(user_id: str, notification_type: Optional[str] = None):
+    """
+    Delete all notifications for a specific user (optionally only one type), in chunks
+    of NOTIFICATION_CHUNK_SIZE, then recount the unread counters.
+    """
+    try:
+        deleted = await run_blocking(_delete_notifications, _notifications_query(user_id, notification_type))
+        await run_blocking(recount_unread_notifications, user_id)
+
+        return {"success": True, "deleted": deleted}
     except Exception as e:
         print(f"Error deleting notifications for user {user_id}: {str(e)}")
         return {"success": False, "message": f"Failed to delete notifications: {str(e)}"}
+
+
+async def mark_all_notifications_read(user_id: str, notification_type: Optional[str] = None):
+    """
+    Mark every unread notification of a user (optionally only one type) as read.
+
+    Unread documents are updated in chunks; each chunk decrements the unread counters
+    by what it marked, in the same batch. A final recount corrects any drift from
+    notifications that were marked read individually while the job ran.
+    """
+    try:
+        user_ref = db.collection("users").document(user_id)
+        unread_query = _notifications_query(user_id, notification_type).where("read", "==", False).select(["type"])
+
+        def _mark(batch, docs):
+            by_type: Dict[str, int] = {}
+            for doc in docs:
+                batch.update(doc.reference, {"read": True})
+                t = (doc.to_dict() or {}).get("type")
+                if t:
+                    by_type[t] = by_type.get(t, 0) + 1
+            counters: Dict[str, Any] = {"unreadCount": firestore.Increment(-len(docs))}
+            if by_type:
+                counters["unreadByType"] = {t: firestore.Increment(-n) for t, n in by_type.items()}
+            batch.set(user_ref, counters, merge=True)
+
+        # Leave room in each batch for the counter write
+        updated = await run_blocking(_process_in_chunks, unread_query, _mark, NOTIFICATION_CHUNK_SIZE - 1)
+        counters = await run_blocking(recount_unread_notifications, user_id)
+        return {"success": True, "updated": updated, **counters}
+    except Exception as e:
+        print(f"Error marking notifications read for user {user_id}: {str(e)}")
+        return {"success": False, "message": f"Failed to mark notifications read: {str(e)}"}
+
+
+def prune_notifications(user_id: str, cutoff: datetime, archive: bool = False) -> int:
+    """
+    Remove a user's notifications older than `cutoff`. With archive=True they are
+    copied to `notificationsArchive` in the same batch before being deleted. Returns the
+    number of notifications removed; unread counters are recounted when any were.
+    """
+    user_ref = db.collection("users").document(user_id)
+    old_query = user_ref.collection("notifications").where("timestamp", "<", cutoff.isoformat())
+
+    if archive:
+        archive_ref = user_ref.collection("notificationsArchive")
+
+        def _archive(batch, docs):
+            for doc in docs:
+                batch.set(archive_ref.document(doc.id), doc.to_dict() or {})
+                batch.delete(doc.reference)
+
+        # Copy + delete is two writes per notification
+        removed = _process_in_chunks(old_query, _archive, NOTIFICATION_CHUNK_SIZE // 2)
+    else:
+        removed = _delete_notifications(old_query)
+
+    if removed:
+        recount_unread_notifications(user_id)
+    return removed
+
+
+def _counters_seeded(data: Optional[Dict[str, Any]]) -> bool:
+    return int((data or {}).get("unreadCountersVersion") or 0) >= UNREAD_COUNTERS_VERSION
+
+
+def recount_unread_notifications(user_id: str, only_if_unseeded: bool = False) -> Dict[str, Any]:
+    """
+    Recompute `unreadCount`/`unreadByType` from the user's unread notifications in a
+    transaction and mark the counters as seeded. Used to seed the counters for users
+    whose notifications predate them; with only_if_unseeded, seeded users are left as is.
+    """
+    user_ref = db.collection("users").document(user_id)
+    unread_query = user_ref.collection("notifications").where("read", "==", False).select(["type"])
+
+    @firestore.transactional
+    def _recount(transaction):
+        snap = user_ref.get(field_paths=["unreadCount", "unreadByType", "unreadCountersVersion"], transaction=transaction)
+        current = snap.to_dict() if snap.exists else {}
+        if only_if_unseeded and _counters_seeded(current):
+            return current
+        by_type: Dict[str, int] = {}
+        total = 0
+        for doc in transaction.get(unread_query):
+            total += 1
+            notification_type = (doc.to_dict() or {}).get("type")
+            if notification_type:
+                by_type[notification_type] = by_type.get(notification_type, 0) + 1
+        counters = {"unreadCount": total, "unreadByType": by_type, "unreadCountersVersion": UNREAD_COUNTERS_VERSION}
+        # Plain set with merge would keep stale per-type keys, so replace the map explicitly
+        transaction.set(user_ref, counters, merge=["unreadCount", "unreadByType", "unreadCountersVersion"])
+        return counters
+
+    return _recount(db.transaction())
+
+
+async def fetch_unread_counts(user_id: str) -> Dict[str, Any]:
+    """Unread totals from the counters on the user document (one document read)."""
+    snap = await run_blocking(
+        db.collection("users").document(user_id).get, field_paths=["unreadCount", "unreadByType", "unreadCountersVersion"]
+    )
+    data = snap.to_dict() if snap.exists else {}
+    if not _counters_seeded(data):
+        data = await run_blocking(recount_unread_notifications, user_id, True)
+    by_type = {k: max(0, int(v)) for k, v in (data.get("unreadByType") or {}).items() if v}
+    return {"unreadCount": max(0, int(data.get("unreadCount") or 0)), "unreadByType": by_type}
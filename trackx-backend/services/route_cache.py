@@ -0,0 +1,155 @@
+"""
+Local, persistent cache of OpenRouteService route legs.
+
+A leg is the routed geometry between two consecutive waypoints. It is keyed by the
+routing profile and the two endpoints rounded to ROUTE_CACHE_PRECISION decimals
+(5 is about a metre). Every window ORS routes is split into legs with its
+`way_points`, and each leg is stored. A later window whose legs are all cached is
+stitched locally without a request. This holds even when the window belongs to
+another case, or starts at a different point of the same corridor.
+
+Legs live in one SQLite file (ROUTE_CACHE_PATH; empty disables the cache). They are
+evicted least-recently-used once the table exceeds ROUTE_CACHE_MAX_ENTRIES. Writes do
+not count the table. An upper bound on the row count is kept in memory, and the table
+is only counted and trimmed when that bound passes the limit. Eviction trims to 90% of
+the limit, so the next trim is a tenth of the cache away. SQLite calls are blocking and
+go through run_blocking like the Firestore ones.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROUTE_CACHE_PATH = os.getenv("ROUTE_CACHE_PATH", os.path.join(BASE_DIR, ".cache", "route_cache.sqlite3"))
+ROUTE_CACHE_MAX_ENTRIES = int(os.getenv("ROUTE_CACHE_MAX_ENTRIES", "200000"))
+ROUTE_CACHE_PRECISION = int(os.getenv("ROUTE_CACHE_PRECISION", "5"))
+
+
+def leg_key(profile: str, start: Sequence[float], end: Sequence[float], precision: Optional[int] = None) -> str:
+    """Cache key of the leg between two [lng, lat] waypoints."""
+    p = ROUTE_CACHE_PRECISION if precision is None else precision
+    return f"{profile}|{start[0]:.{p}f},{start[1]:.{p}f}|{end[0]:.{p}f},{end[1]:.{p}f}"
+
+
+def split_legs(coordinates: List[List[float]], way_points: List[int]) -> List[List[List[float]]]:
+    """Cut a routed window into one geometry per consecutive waypoint pair."""
+    return [coordinates[a:b + 1] for a, b in zip(way_points, way_points[1:])]
+
+
+def join_legs(legs: List[List[List[float]]]) -> Tuple[List[List[float]], List[int]]:
+    """Stitch leg geometries back into (coordinates, way_points), the shape ORS returns."""
+    coordinates: List[List[float]] = list(legs[0][:1])
+    way_points = [0]
+    for leg in legs:
+        coordinates.extend(leg[1:])
+        way_points.append(len(coordinates) - 1)
+    return coordinates, way_points
+
+
+class RouteCache:
+    def __init__(self, path: str, max_entries: int = ROUTE_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disabled = not path
+        # Upper bound on the rows in route_legs; replaced rows are counted as new ones
+        self._row_bound = 0
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self._conn is None and not self._disabled:
+            try:
+                if self.path != ":memory:":
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS route_legs ("
+                    " key TEXT PRIMARY KEY, geometry TEXT NOT NULL, last_used REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS route_legs_last_used ON route_legs (last_used)")
+                (self._row_bound,) = conn.execute("SELECT COUNT(*) FROM route_legs").fetchone()
+                self._conn = conn
+            except sqlite3.Error as e:
+                logger.warning(f"Route cache disabled, could not open {self.path}: {e}")
+                self._disabled = True
+        return self._conn
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[List[float]]]:
+        keys = list(dict.fromkeys(keys))
+        with self._lock:
+            conn = self._connect()
+            if conn is None or not keys:
+                return {}
+            found: Dict[str, List[List[float]]] = {}
+            try:
+                # Stay under SQLite's bound-parameter limit
+                for i in range(0, len(keys), 500):
+                    chunk = keys[i:i + 500]
+                    marks = ",".join("?" * len(chunk))
+                    rows = conn.execute(f"SELECT key, geometry FROM route_legs WHERE key IN ({marks})", chunk)
+                    found.update((key, json.loads(geometry)) for key, geometry in rows)
+                if found:
+                    now = time.time()
+                    conn.executemany("UPDATE route_legs SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+            except sqlite3.Error as e:
+                logger.warning(f"Route cache read failed: {e}")
+                return {}
+            return found
+
+    def put_many(self, legs: Dict[str, List[List[float]]]) -> None:
+        if not legs:
+            return
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return
+            now = time.time()
+            try:
+                conn.execute("BEGIN")
+                conn.executemany(
+                    "INSERT OR REPLACE INTO route_legs (key, geometry, last_used) VALUES (?, ?, ?)",
+                    [(key, json.dumps(geometry, separators=(",", ":")), now) for key, geometry in legs.items()],
+                )
+                row_bound = self._row_bound + len(legs)
+                if row_bound > self.max_entries:
+                    (count,) = conn.execute("SELECT COUNT(*) FROM route_legs").fetchone()
+                    row_bound = count
+                    if count > self.max_entries:
+                        keep = self.max_entries - self.max_entries // 10
+                        conn.execute(
+                            "DELETE FROM route_legs WHERE key IN"
+                            " (SELECT key FROM route_legs ORDER BY last_used ASC LIMIT ?)",
+                            (count - keep,),
+                        )
+                        row_bound = keep
+                conn.execute("COMMIT")
+                self._row_bound = row_bound
+            except sqlite3.Error as e:
+                logger.warning(f"Route cache write failed: {e}")
+                try:
+                    conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+
+    def __len__(self) -> int:
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return 0
+            return conn.execute("SELECT COUNT(*) FROM route_legs").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+route_cache = RouteCache(ROUTE_CACHE_PATH)
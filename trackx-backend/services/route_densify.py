@@ -0,0 +1,127 @@
+"""
+Offline densification of case tracks, with no network calls and no dependencies.
+
+Each leg between two consecutive waypoints is resampled along the great circle every
+DENSIFY_SPACING_METERS. A resampled point's time is interpolated by the distance
+travelled along the leg, so both waypoints keep their own timestamps and playback
+speed stays constant within a leg. This is the "greatcircle" interpolation engine.
+It is also the fallback used when OpenRouteService cannot route part of a track.
+"""
+import math
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+EARTH_RADIUS_M = 6371000.0
+DENSIFY_SPACING_METERS = float(os.getenv("DENSIFY_SPACING_METERS", "25"))
+# Upper bound of points inserted into a single leg (e.g. a GPS jump across a country)
+DENSIFY_MAX_POINTS_PER_LEG = int(os.getenv("DENSIFY_MAX_POINTS_PER_LEG", "1000"))
+
+
+def _to_vector(lat: float, lng: float) -> Tuple[float, float, float]:
+    phi, lam = math.radians(lat), math.radians(lng)
+    return (math.cos(phi) * math.cos(lam), math.cos(phi) * math.sin(lam), math.sin(phi))
+
+
+def _from_vector(x: float, y: float, z: float) -> Tuple[float, float]:
+    return math.degrees(math.atan2(z, math.hypot(x, y))), math.degrees(math.atan2(y, x))
+
+
+def central_angle(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Angle between two positions in radians (haversine form, stable for short legs)."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi, dlam = phi2 - phi1, math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlam / 2) ** 2
+    return 2 * math.asin(min(1.0, math.sqrt(a)))
+
+
+def distance_meters(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    return EARTH_RADIUS_M * central_angle(lat1, lng1, lat2, lng2)
+
+
+def great_circle_leg(
+    lat1: float, lng1: float, lat2: float, lng2: float, spacing_m: Optional[float] = None
+) -> List[Tuple[float, float, float]]:
+    """
+    (lat, lng, fraction) samples strictly between the two ends, about `spacing_m` apart.
+    `fraction` is the share of the leg's length covered at that sample.
+    """
+    spacing_m = spacing_m or DENSIFY_SPACING_METERS
+    angle = central_angle(lat1, lng1, lat2, lng2)
+    steps = min(int(EARTH_RADIUS_M * angle // spacing_m), DENSIFY_MAX_POINTS_PER_LEG)
+    if steps < 1 or angle == 0.0:
+        return []
+    a, b = _to_vector(lat1, lng1), _to_vector(lat2, lng2)
+    sin_angle = math.sin(angle)
+    samples = []
+    for k in range(1, steps + 1):
+        f = k / (steps + 1)
+        if sin_angle < 1e-12:
+            wa, wb = 1 - f, f
+        else:
+            wa, wb = math.sin((1 - f) * angle) / sin_angle, math.sin(f * angle) / sin_angle
+        lat, lng = _from_vector(*(wa * ca + wb * cb for ca, cb in zip(a, b)))
+        samples.append((lat, lng, f))
+    return samples
+
+
+def _parse_time(ts: Any) -> Optional[datetime]:
+    if isinstance(ts, datetime):
+        dt = ts
+    elif isinstance(ts, str):
+        try:
+            dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    else:
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def iso_zulu(dt: datetime) -> str:
+    return dt.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def densify_track(points: List[Dict[str, Any]], spacing_m: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    Great-circle densification of sanitized points ({lat, lng, timestamp} with ISO
+    timestamps, in track order). Waypoints are kept with their own timestamps; samples
+    in between get times interpolated by distance along their leg.
+    """
+    anchors = []
+    for p in points:
+        dt = _parse_time(p.get("timestamp"))
+        if dt is not None:
+            anchors.append((float(p["lat"]), float(p["lng"]), dt))
+    if len(anchors) < 2:
+        return [dict(p) for p in points]
+
+    result = [{"lat": anchors[0][0], "lng": anchors[0][1], "timestamp": iso_zulu(anchors[0][2])}]
+    for (lat1, lng1, t1), (lat2, lng2, t2) in zip(anchors, anchors[1:]):
+        leg_seconds = (t2 - t1).total_seconds()
+        for lat, lng, f in great_circle_leg(lat1, lng1, lat2, lng2, spacing_m):
+            result.append({
+                "lat": lat,
+                "lng": lng,
+                "timestamp": iso_zulu(t1 + timedelta(seconds=leg_seconds * f)),
+            })
+        result.append({"lat": lat2, "lng": lng2, "timestamp": iso_zulu(t2)})
+    return result
+
+
+def densify_coordinates(
+    coords: List[List[float]], spacing_m: Optional[float] = None
+) -> Tuple[List[List[float]], List[int]]:
+    """
+    Great-circle densified [lng, lat] polyline, for windows ORS could not route, and the
+    index of each input coordinate in it (the same shape as ORS `way_points`).
+    """
+    if len(coords) < 2:
+        return [list(c) for c in coords], list(range(len(coords)))
+    result = [list(coords[0])]
+    way_points = [0]
+    for (lng1, lat1), (lng2, lat2) in zip(coords, coords[1:]):
+        result.extend([lng, lat] for lat, lng, _ in great_circle_leg(lat1, lng1, lat2, lng2, spacing_m))
+        result.append([lng2, lat2])
+        way_points.append(len(result) - 1)
+    return result, way_points
@@ -0,0 +1,360 @@
+"""
+Road-following interpolation of case tracks through OpenRouteService (ORS).
+
+ORS caps the number of waypoints per directions request. A track is therefore
+split into windows of ORS_MAX_WAYPOINTS points. Consecutive windows share their
+boundary waypoint, so their routes meet. The windows are routed concurrently
+(at most ORS_CONCURRENCY in flight) on one shared `httpx.AsyncClient`, and every
+request first waits on a process-wide rate limiter (ORS_REQUESTS_PER_MINUTE).
+
+A 429 or 5xx response is retried with asyncio backoff, honouring Retry-After up to
+ORS_MAX_RETRY_WAIT_SECONDS; a server asking for a longer wait is not waited for, since
+the request would hold its CZML response and an ORS slot. A window that still fails is
+densified along great circles instead (services.route_densify), so one bad window does
+not discard the rest of the route. When ORS stays unreachable it is skipped for
+ORS_COOLDOWN_SECONDS, during which every window falls back without a network call.
+Route legs are kept in a local cache (services.route_cache), so windows whose legs were
+routed before resolve without ORS, even while it is unavailable.
+
+The engine is chosen per request: "ors" (road routing, with the offline fallback) or
+"greatcircle" (offline only). ROUTE_INTERPOLATION_ENGINE sets the default, e.g. for
+offline or test deployments.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from services import route_cache as route_cache_module
+from services.blocking_io import run_blocking
+from services.route_cache import join_legs, leg_key, split_legs
+from services.route_densify import densify_coordinates, densify_track, distance_meters, iso_zulu
+
+logger = logging.getLogger(__name__)
+
+ORS_API_KEY = os.getenv("ORS_API_KEY", "5b3ce3597851110001cf6248c3b41afd16e04795a3eaaf7b3c0cd61f")
+ORS_DIRECTIONS_URL = os.getenv(
+    "ORS_DIRECTIONS_URL", "https://api.openrouteservice.org/v2/directions/driving-car/geojson"
+)
+ORS_MAX_WAYPOINTS = max(2, int(os.getenv("ORS_MAX_WAYPOINTS", "50")))
+ORS_CONCURRENCY = max(1, int(os.getenv("ORS_CONCURRENCY", "4")))
+ORS_REQUESTS_PER_MINUTE = float(os.getenv("ORS_REQUESTS_PER_MINUTE", "40"))
+ORS_TIMEOUT_SECONDS = float(os.getenv("ORS_TIMEOUT_SECONDS", "15"))
+ORS_MAX_RETRIES = 3
+ORS_COOLDOWN_SECONDS = float(os.getenv("ORS_COOLDOWN_SECONDS", "60"))
+ORS_MAX_RETRY_WAIT_SECONDS = float(os.getenv("ORS_MAX_RETRY_WAIT_SECONDS", str(ORS_TIMEOUT_SECONDS)))
+
+INTERPOLATION_ENGINES = ("ors", "greatcircle")
+# Bump whenever interpolation output changes for the same raw track
+INTERPOLATION_VERSION = 2
+DEFAULT_INTERPOLATION_ENGINE = os.getenv("ROUTE_INTERPOLATION_ENGINE", "ors")
+
+
+class RateLimiter:
+    """Spaces calls at least 60 / requests_per_minute seconds apart, across all callers."""
+
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = None
+        self._loop = None
+
+    async def wait(self) -> None:
+        if self.interval <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._lock, self._loop = asyncio.Lock(), loop
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+_limiter = RateLimiter(ORS_REQUESTS_PER_MINUTE)
+_client: Optional[httpx.AsyncClient] = None
+_client_loop = None
+# time.monotonic() until which ORS is treated as unavailable
+_ors_unavailable_until = 0.0
+
+
+def ors_available() -> bool:
+    return time.monotonic() >= _ors_unavailable_until
+
+
+def _mark_ors_unavailable() -> None:
+    global _ors_unavailable_until
+    _ors_unavailable_until = time.monotonic() + ORS_COOLDOWN_SECONDS
+
+
+def get_client() -> httpx.AsyncClient:
+    """The shared ORS client (keep-alive connection pool), created per event loop."""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            timeout=ORS_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=ORS_CONCURRENCY, max_keepalive_connections=ORS_CONCURRENCY),
+            headers={"Authorization": ORS_API_KEY, "Content-Type": "application/json"},
+        )
+        _client_loop = loop
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+
+
+def interpolation_source_version(track_version: str) -> str:
+    """Hash stored with an interpolated set; it goes stale when the raw track or the algorithm changes."""
+    return hashlib.sha256(f"{track_version}:{INTERPOLATION_VERSION}".encode()).hexdigest()[:32]
+
+
+def sanitize_points(points: list) -> List[Dict[str, Any]]:
+    """Drop points without coordinates or a timestamp; timestamps become ISO strings."""
+    sanitized = []
+    for pt in points:
+        lat = pt.get("lat")
+        lng = pt.get("lng")
+        timestamp = pt.get("timestamp")
+
+        if lat is None or lng is None or not timestamp:
+            continue
+
+        if hasattr(timestamp, "isoformat"):
+            timestamp_str = timestamp.isoformat().replace("+00:00", "Z")
+        elif isinstance(timestamp, str):
+            timestamp_str = timestamp
+        elif isinstance(timestamp, list) and timestamp:
+            timestamp_str = str(timestamp[0])
+        else:
+            continue
+
+        sanitized.append({"lat": lat, "lng": lng, "timestamp": timestamp_str})
+    return sanitized
+
+
+def split_windows(count: int, size: Optional[int] = None) -> List[range]:
+    """Index ranges of at most `size` waypoints; each window starts on the previous one's last point."""
+    size = max(2, size or ORS_MAX_WAYPOINTS)
+    if count <= size:
+        return [range(0, count)]
+    windows = []
+    start = 0
+    while start < count - 1:
+        end = min(start + size, count)
+        windows.append(range(start, end))
+        start = end - 1
+    return windows
+
+
+def _retry_delay(res: Optional[httpx.Response], attempt: int) -> Optional[float]:
+    """Seconds to wait before the next attempt, or None when ORS asks for longer than the cap."""
+    retry_after = res.headers.get("Retry-After") if res is not None else None
+    try:
+        delay = max(0.0, float(retry_after)) if retry_after else float(2 ** attempt)
+    except ValueError:
+        delay = float(2 ** attempt)
+    return delay if delay <= ORS_MAX_RETRY_WAIT_SECONDS else None
+
+
+async def _route_window(client: httpx.AsyncClient, waypoints: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """{"coordinates", "way_points"} of the routed window, or None when ORS could not route it."""
+    body = {"coordinates": [[p["lng"], p["lat"]] for p in waypoints]}
+    for attempt in range(ORS_MAX_RETRIES):
+        await _limiter.wait()
+        res = None
+        try:
+            res = await client.post(ORS_DIRECTIONS_URL, json=body)
+            if res.status_code == 429 or res.status_code >= 500:
+                raise httpx.HTTPStatusError(f"ORS returned {res.status_code}", request=res.request, response=res)
+            res.raise_for_status()
+            feature = res.json()["features"][0]
+            return {
+                "coordinates": feature["geometry"]["coordinates"],
+                "way_points": (feature.get("properties") or {}).get("way_points"),
+            }
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code != 429 and e.response.status_code < 500:
+                logger.warning(f"ORS rejected window of {len(waypoints)} waypoints: {e}")
+                return None
+            error = e
+        except (httpx.TransportError, KeyError, IndexError, ValueError) as e:
+            error = e
+        if attempt < ORS_MAX_RETRIES - 1:
+            wait = _retry_delay(res, attempt)
+            if wait is None:
+                logger.warning(f"ORS retry wait exceeds {ORS_MAX_RETRY_WAIT_SECONDS}s ({error}); falling back instead")
+                break
+            logger.info(f"ORS attempt {attempt + 1} failed ({error}); retrying in {wait}s")
+            await asyncio.sleep(wait)
+    logger.warning(f"ORS failed for window of {len(waypoints)} waypoints after {attempt + 1} attempts")
+    _mark_ors_unavailable()
+    return None
+
+
+async def route_geometry(points: List[Dict[str, Any]]) -> Tuple[List[List[float]], List[Optional[int]], int]:
+    """
+    Road geometry ([lng, lat] pairs) through `points`, routed window by window and
+    stitched. Also returns the geometry index of each point (None where ORS did not
+    report one) and the number of windows that fell back to great-circle densification.
+    """
+    windows = split_windows(len(points))
+    client = get_client()
+    semaphore = asyncio.Semaphore(ORS_CONCURRENCY)
+
+    async def _bounded(window: range):
+        waypoints = [points[i] for i in window]
+        coords = [[p["lng"], p["lat"]] for p in waypoints]
+        keys = [leg_key(ORS_DIRECTIONS_URL, a, b) for a, b in zip(coords, coords[1:])]
+        cached = await run_blocking(route_cache_module.route_cache.get_many, keys)
+        if all(key in cached for key in keys):
+            coordinates, way_points = join_legs([cached[key] for key in keys])
+            return {"coordinates": coordinates, "way_points": way_points}
+
+        async with semaphore:
+            # Windows queued behind a failure skip ORS while it is marked unavailable
+            if not ors_available():
+                return None
+            route = await _route_window(client, waypoints)
+
+        way_points = route.get("way_points") if route else None
+        if way_points and len(way_points) == len(window):
+            legs = split_legs(route["coordinates"], way_points)
+            await run_blocking(route_cache_module.route_cache.put_many, dict(zip(keys, legs)))
+        return route
+
+    routes = await asyncio.gather(*(_bounded(window) for window in windows))
+    # Fallback densification and stitching walk the whole track: keep them off the event loop
+    return await run_blocking(_stitch_windows, points, windows, routes)
+
+
+def _stitch_windows(
+    points: List[Dict[str, Any]], windows: List[range], routes: List[Optional[Dict[str, Any]]]
+) -> Tuple[List[List[float]], List[Optional[int]], int]:
+    geometry: List[List[float]] = []
+    anchors: List[Optional[int]] = [None] * len(points)
+    fallback_windows = 0
+    for window, route in zip(windows, routes):
+        if route and route["coordinates"]:
+            coords, way_points = route["coordinates"], route["way_points"]
+        else:
+            fallback_windows += 1
+            coords, way_points = densify_coordinates([[points[i]["lng"], points[i]["lat"]] for i in window])
+        if not way_points or len(way_points) != len(window):
+            # Without ORS way_points only the window ends are known
+            way_points = [0] + [None] * (len(window) - 2) + [len(coords) - 1]
+        # The first coordinate repeats the previous window's last waypoint
+        offset = len(geometry) - 1 if geometry else 0
+        geometry.extend(coords[1:] if geometry else coords)
+        for i, local in zip(window, way_points):
+            if local is not None:
+                anchors[i] = offset + local
+    return geometry, anchors, fallback_windows
+
+
+async def interpolate_route(points: list, engine: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Interpolate a track with the given engine. Returns {"points", "engine", "complete"};
+    "complete" is False when part of an ORS route came from the offline fallback, so
+    callers do not persist a degraded result as the ORS one.
+    """
+    engine = engine or DEFAULT_INTERPOLATION_ENGINE
+    if engine not in INTERPOLATION_ENGINES:
+        raise ValueError(f"Unknown interpolation engine '{engine}'")
+
+    if not points or len(points) < 2:
+        return {"points": points or [], "engine": engine, "complete": True}
+
+    # Parsing, densifying and timing are CPU-bound over the whole track; they run on the pool
+    sanitized_points = await run_blocking(sanitize_points, points)
+    if len(sanitized_points) < 2:
+        return {"points": sanitized_points, "engine": engine, "complete": True}
+
+    if engine == "greatcircle":
+        return {"points": await run_blocking(densify_track, sanitized_points), "engine": engine, "complete": True}
+
+    route, anchors, fallback_windows = await route_geometry(sanitized_points)
+    return {
+        "points": await run_blocking(time_route, sanitized_points, route, anchors),
+        "engine": engine,
+        "complete": fallback_windows == 0,
+    }
+
+
+async def interpolate_points_with_ors(points: list) -> list:
+    """
+    Interpolates a GPS route along roads using ORS, and assigns strictly ordered
+    timestamps for Cesium playback.
+    """
+    return (await interpolate_route(points, "ors"))["points"]
+
+
+def _cumulative_distances(route: List[List[float]]) -> List[float]:
+    distances = [0.0]
+    for a, b in zip(route, route[1:]):
+        distances.append(distances[-1] + distance_meters(a[1], a[0], b[1], b[0]))
+    return distances
+
+
+def time_route(
+    sanitized_points: List[Dict[str, Any]], route: List[List[float]], anchors: List[Optional[int]]
+) -> List[Dict[str, Any]]:
+    """
+    Timestamps for every route vertex. Each waypoint's own timestamp is pinned to its
+    vertex (`anchors[i]`). Vertices between two anchors get times distributed by the
+    cumulative distance along the route, so playback speed follows the road and not
+    the ORS vertex density. A waypoint mapped to the same vertex as the previous one
+    (a stop) repeats that vertex, so the dwell shows up in playback.
+    """
+    if len(route) < 2:
+        return sanitized_points
+
+    pinned: List[Tuple[int, datetime]] = []
+    for point, index in zip(sanitized_points, anchors):
+        if index is None or not 0 <= index < len(route):
+            continue
+        try:
+            dt = datetime.fromisoformat(point["timestamp"].replace("Z", "+00:00"))
+        except ValueError:
+            continue
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        if pinned:
+            prev_index, prev_dt = pinned[-1]
+            if index < prev_index:
+                continue
+            # Never let time run backwards, whatever the raw data says
+            dt = max(dt, prev_dt)
+        pinned.append((index, dt))
+    if len(pinned) < 2:
+        return sanitized_points
+
+    distances = _cumulative_distances(route)
+    timed = []
+    for (i0, t0), (i1, t1) in zip(pinned, pinned[1:]):
+        span_m = distances[i1] - distances[i0]
+        span_s = (t1 - t0).total_seconds()
+        for j in range(i0, i1):
+            if span_m > 0:
+                frac = (distances[j] - distances[i0]) / span_m
+            else:
+                frac = (j - i0) / (i1 - i0)
+            lng, lat = route[j][0], route[j][1]
+            timed.append({"lat": lat, "lng": lng, "timestamp": iso_zulu(t0 + timedelta(seconds=span_s * frac))})
+        if i0 == i1:
+            lng, lat = route[i0][0], route[i0][1]
+            timed.append({"lat": lat, "lng": lng, "timestamp": iso_zulu(t0)})
+    last_index, last_dt = pinned[-1]
+    timed.append({"lat": route[last_index][1], "lng": route[last_index][0], "timestamp": iso_zulu(last_dt)})
+    return timed
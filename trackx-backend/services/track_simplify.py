@@ -0,0 +1,67 @@
+"""
+Track reduction for light CZML playback.
+
+`simplify_track` is Ramer-Douglas-Peucker on a local equirectangular projection, in
+metres. It keeps every point that deviates more than the tolerance from the line
+through its kept neighbours, so straight runs collapse and turns survive.
+`limit_points` enforces a hard point budget by keeping evenly spaced points,
+always including the first and the last.
+"""
+import math
+import os
+from typing import Any, Dict, List, Optional
+
+SIMPLIFY_TOLERANCE_METERS = float(os.getenv("SIMPLIFY_TOLERANCE_METERS", "10"))
+
+_METERS_PER_DEGREE = 111_320.0
+
+
+def _project(points: List[Dict[str, Any]]) -> List[tuple]:
+    lat0 = math.radians(sum(float(p["lat"]) for p in points) / len(points))
+    kx = _METERS_PER_DEGREE * math.cos(lat0)
+    return [(float(p["lng"]) * kx, float(p["lat"]) * _METERS_PER_DEGREE) for p in points]
+
+
+def _segment_distance(p, a, b) -> float:
+    (px, py), (ax, ay), (bx, by) = p, a, b
+    dx, dy = bx - ax, by - ay
+    length_sq = dx * dx + dy * dy
+    if length_sq == 0.0:
+        return math.hypot(px - ax, py - ay)
+    t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / length_sq))
+    return math.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+def simplify_track(points: List[Dict[str, Any]], tolerance_m: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Douglas-Peucker simplification of points in track order (iterative, no recursion limit)."""
+    if len(points) < 3:
+        return list(points)
+    tolerance_m = SIMPLIFY_TOLERANCE_METERS if tolerance_m is None else tolerance_m
+    xy = _project(points)
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        worst, worst_distance = first, -1.0
+        for i in range(first + 1, last):
+            d = _segment_distance(xy[i], xy[first], xy[last])
+            if d > worst_distance:
+                worst, worst_distance = i, d
+        if worst_distance > tolerance_m:
+            keep[worst] = True
+            stack.append((first, worst))
+            stack.append((worst, last))
+    return [p for p, kept in zip(points, keep) if kept]
+
+
+def limit_points(points: List[Dict[str, Any]], max_points: Optional[int]) -> List[Dict[str, Any]]:
+    """At most `max_points` evenly spaced points, keeping both ends."""
+    if not max_points or len(points) <= max_points:
+        return list(points)
+    if max_points < 2:
+        return [points[0]]
+    step = (len(points) - 1) / (max_points - 1)
+    return [points[round(i * step)] for i in range(max_points)]
@@ -0,0 +1,271 @@
+"""
+Storage layouts for a case's GPS track (the `allPoints` samples).
+
+Two layouts are supported side by side:
+
+  - "documents": one document per sample in the `allPoints` subcollection (the
+    original layout).
+  - "chunked": samples packed into `trackChunks` documents of TRACK_CHUNK_SIZE samples.
+    Each chunk holds delta-encoded integer arrays: lat/lng in 1e-7 degrees and time in
+    microseconds since the epoch. Descriptions are kept in a sparse map keyed by
+    position. The case document carries a `trackStorage` manifest describing the chunks.
+
+New cases use TRACK_STORAGE_FORMAT. Readers check the case manifest and handle both
+layouts, so a case can be migrated (scripts/migrate_track_storage.py) at any time.
+
+A case whose chunks are still being written by a background ingestion job carries a
+manifest with `status: "pending"` (or "failed" if the job gave up). Readers treat such
+a track as empty instead of reading partial chunks or falling back to allPoints.
+"""
+import math
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.blocking_io import run_blocking
+
+TRACK_STORAGE_FORMAT = os.getenv("TRACK_STORAGE_FORMAT", "documents").strip().lower()
+TRACK_CHUNK_SIZE = int(os.getenv("TRACK_CHUNK_SIZE", "2000"))
+
+CHUNKED_FORMAT = "chunked"
+CHUNK_COLLECTION = "trackChunks"
+CHUNK_ENCODING_VERSION = 1
+COORD_SCALE = 10_000_000
+PENDING_STATUS = "pending"
+FAILED_STATUS = "failed"
+# Case field set while a new case's track is written after the case itself, in either layout
+TRACK_STATUS_FIELD = "trackStatus"
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class TrackNotReadyError(RuntimeError):
+    """The case's track is still being written (or its ingestion failed, or another upload holds it)."""
+
+
+def chunked_storage_enabled() -> bool:
+    return TRACK_STORAGE_FORMAT == CHUNKED_FORMAT
+
+
+def is_chunked(case_data: Optional[Dict[str, Any]]) -> bool:
+    manifest = (case_data or {}).get("trackStorage") or {}
+    return manifest.get("format") == CHUNKED_FORMAT
+
+
+def is_pending(case_data: Optional[Dict[str, Any]]) -> bool:
+    """True while the track of a case has not been completely written, in either layout."""
+    case_data = case_data or {}
+    if case_data.get(TRACK_STATUS_FIELD) in (PENDING_STATUS, FAILED_STATUS):
+        return True
+    manifest = case_data.get("trackStorage") or {}
+    return is_chunked(case_data) and manifest.get("status") in (PENDING_STATUS, FAILED_STATUS)
+
+
+def pending_manifest() -> Dict[str, Any]:
+    """Manifest stored with a new case whose chunks a background job will write."""
+    return {
+        "format": CHUNKED_FORMAT,
+        "version": CHUNK_ENCODING_VERSION,
+        "chunkSize": max(1, TRACK_CHUNK_SIZE),
+        "chunkCount": 0,
+        "pointCount": 0,
+        "status": PENDING_STATUS,
+    }
+
+
+def _to_micros(ts) -> Optional[int]:
+    if isinstance(ts, str):
+        try:
+            ts = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if not isinstance(ts, datetime):
+        return None
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    delta = ts - _EPOCH
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def _from_micros(micros: int) -> datetime:
+    return datetime.fromtimestamp(micros // 1_000_000, tz=timezone.utc).replace(microsecond=micros % 1_000_000)
+
+
+def _deltas(values: List[int]) -> List[int]:
+    previous = 0
+    out = []
+    for value in values:
+        out.append(value - previous)
+        previous = value
+    return out
+
+
+def _undeltas(deltas: List[int]) -> List[int]:
+    total = 0
+    out = []
+    for delta in deltas:
+        total += delta
+        out.append(total)
+    return out
+
+
+def _coordinate(value) -> Optional[float]:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def valid_samples(points: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    The samples that can be stored in a chunk (numeric, finite lat and lng), and how
+    many were skipped. Legacy allPoints can hold null or missing coordinates, which the
+    rollup and CZML readers already ignore.
+    """
+    kept = [p for p in points if _coordinate(p.get("lat")) is not None and _coordinate(p.get("lng")) is not None]
+    return kept, len(points) - len(kept)
+
+
+def encode_chunk(points: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Pack samples ({lat, lng, timestamp, description}) into one chunk document. Samples
+    without usable coordinates are left out (see valid_samples); `count` is what was kept.
+    """
+    points, _ = valid_samples(points)
+    lats, lngs, times, untimed, descriptions = [], [], [], [], {}
+    last_time = 0
+    for i, point in enumerate(points):
+        lats.append(int(round(float(point["lat"]) * COORD_SCALE)))
+        lngs.append(int(round(float(point["lng"]) * COORD_SCALE)))
+        micros = _to_micros(point.get("timestamp"))
+        if micros is None:
+            # Keep the time column dense; the index list marks samples without a time
+            untimed.append(i)
+            micros = last_time
+        times.append(micros)
+        last_time = micros
+        if point.get("description"):
+            descriptions[str(i)] = point["description"]
+
+    chunk = {
+        "v": CHUNK_ENCODING_VERSION,
+        "count": len(points),
+        "lat": _deltas(lats),
+        "lng": _deltas(lngs),
+        "t": _deltas(times),
+    }
+    if untimed:
+        chunk["untimed"] = untimed
+    if descriptions:
+        chunk["descriptions"] = descriptions
+    return chunk
+
+
+def decode_chunk(chunk: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Expand a chunk document back into sample dicts."""
+    lats = _undeltas(chunk.get("lat") or [])
+    lngs = _undeltas(chunk.get("lng") or [])
+    times = _undeltas(chunk.get("t") or [])
+    untimed = set(chunk.get("untimed") or [])
+    descriptions = chunk.get("descriptions") or {}
+    return [
+        {
+            "lat": lats[i] / COORD_SCALE,
+            "lng": lngs[i] / COORD_SCALE,
+            "timestamp": None if i in untimed else _from_micros(times[i]),
+            "description": descriptions.get(str(i)),
+        }
+        for i in range(len(lats))
+    ]
+
+
+def write_chunked_track(db, case_ref, points: List[Dict[str, Any]], manifest: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Append samples as new chunk documents after any chunks the manifest already lists.
+    Samples without usable coordinates are skipped and counted in `skippedPoints`.
+    Returns the updated manifest; the caller stores it on the case as `trackStorage`.
+    """
+    manifest = dict(manifest or {})
+    chunk_count = int(manifest.get("chunkCount", 0))
+    point_count = int(manifest.get("pointCount", 0))
+    chunk_size = max(1, TRACK_CHUNK_SIZE)
+    points, skipped = valid_samples(points)
+
+    batch = db.batch()
+    pending = 0
+    for start in range(0, len(points), chunk_size):
+        part = points[start:start + chunk_size]
+        batch.set(case_ref.collection(CHUNK_COLLECTION).document(f"{chunk_count:06d}"), encode_chunk(part))
+        chunk_count += 1
+        point_count += len(part)
+        pending += 1
+        # Chunks are large; keep each commit well under the request size limit
+        if pending >= 10:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+
+    manifest.update({
+        "format": CHUNKED_FORMAT,
+        "version": CHUNK_ENCODING_VERSION,
+        "chunkSize": chunk_size,
+        "chunkCount": chunk_count,
+        "pointCount": point_count,
+    })
+    if skipped or manifest.get("skippedPoints"):
+        manifest["skippedPoints"] = int(manifest.get("skippedPoints", 0)) + skipped
+    # The chunks are all written: a pending manifest becomes a regular one
+    manifest.pop("status", None)
+    return manifest
+
+
+def delete_chunked_track(db, case_ref, first_chunk: int = 0) -> None:
+    """
+    Delete the stored chunk documents numbered `first_chunk` and up, including any a
+    failed write left behind that no manifest lists (cleanup after a failed case write
+    or upload).
+    """
+    chunk_refs = [
+        doc.reference
+        for doc in case_ref.collection(CHUNK_COLLECTION).select([]).stream()
+        if doc.id.isdigit() and int(doc.id) >= first_chunk
+    ]
+    for start in range(0, len(chunk_refs), 400):
+        batch = db.batch()
+        for ref in chunk_refs[start:start + 400]:
+            batch.delete(ref)
+        batch.commit()
+
+
+def load_track_points(case_ref, case_data: Optional[Dict[str, Any]] = None, ordered: bool = False) -> List[Dict[str, Any]]:
+    """
+    Return the allPoints samples of a case in either layout. `case_data` may be passed
+    when the caller already read the case document; otherwise only its manifest is fetched.
+    """
+    if case_data is None:
+        snap = case_ref.get(field_paths=["trackStorage", TRACK_STATUS_FIELD])
+        case_data = snap.to_dict() if snap.exists else {}
+
+    if is_pending(case_data):
+        return []
+
+    if is_chunked(case_data):
+        points = []
+        for chunk_doc in case_ref.collection(CHUNK_COLLECTION).order_by("__name__").stream():
+            points.extend(decode_chunk(chunk_doc.to_dict() or {}))
+        if ordered:
+            # Same set as an order_by("timestamp") query: untimed samples are left out
+            points = sorted((p for p in points if p["timestamp"] is not None), key=lambda p: p["timestamp"])
+        return points
+
+    query = case_ref.collection("allPoints")
+    if ordered:
+        query = query.order_by("timestamp")
+    return [doc.to_dict() for doc in query.stream()]
+
+
+async def fetch_track_points(case_ref, case_data: Optional[Dict[str, Any]] = None, ordered: bool = False) -> List[Dict[str, Any]]:
+    """Async variant of load_track_points for use from request handlers."""
+    return await run_blocking(load_track_points, case_ref, case_data, ordered)
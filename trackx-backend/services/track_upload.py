@@ -0,0 +1,223 @@
+"""
+Incremental parsing of uploaded track files (CSV and GPX).
+
+Rows are read from the file object in batches of UPLOAD_BATCH_SIZE and validated a
+batch at a time. With NumPy installed, the batch's latitude and longitude columns are
+converted to float arrays in one call and range-checked with array masks. Only a batch
+containing an unparseable value is converted value by value. Rows that fail are
+dropped and reported by their 1-based row number (CSV data row or GPX point). Only one
+batch is held in memory at once, so memory use does not grow with the file size.
+
+CSV columns are matched the same way the new-case page does: the first header
+containing "lat", one containing "lon"/"lng"/"long", "time"/"date"/"stamp" and
+"desc"/"note"/"comment"/"text".
+"""
+import codecs
+import csv
+import os
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # validation falls back to plain Python
+    np = None
+
+UPLOAD_BATCH_SIZE = int(os.getenv("UPLOAD_BATCH_SIZE", "2000"))
+# Rejected row numbers listed in an upload response (the count is always complete)
+UPLOAD_REJECTED_ROWS_LIMIT = int(os.getenv("UPLOAD_REJECTED_ROWS_LIMIT", "1000"))
+
+GPX_POINT_TAGS = {"trkpt", "rtept", "wpt"}
+
+_CSV_COLUMN_HINTS = {
+    "lat": ("lat", "latitude"),
+    "lng": ("lon", "lng", "long"),
+    "timestamp": ("time", "date", "stamp"),
+    "description": ("desc", "note", "comment", "text"),
+}
+
+
+class TrackFileError(ValueError):
+    """Raised when an uploaded file cannot be read as a track."""
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str] = None) -> str:
+    name = (filename or "").lower()
+    if name.endswith(".gpx") or "gpx" in (content_type or ""):
+        return "gpx"
+    if name.endswith(".csv") or "csv" in (content_type or "") or not name:
+        return "csv"
+    raise TrackFileError(f"Unsupported track file '{filename}'; expected .csv or .gpx")
+
+
+def _pick_columns(headers: List[str]) -> Dict[str, Optional[str]]:
+    columns = {}
+    for key, hints in _CSV_COLUMN_HINTS.items():
+        columns[key] = next((h for h in headers if any(hint in h.lower() for hint in hints)), None)
+    if not columns["lat"] or not columns["lng"]:
+        raise TrackFileError("Could not identify latitude/longitude columns in the CSV")
+    return columns
+
+
+def _to_floats(values: List[Any]) -> List[Optional[float]]:
+    out = []
+    for value in values:
+        try:
+            out.append(float(value))
+        except (TypeError, ValueError):
+            out.append(None)
+    return out
+
+
+def _valid_coordinates(lats: List[Any], lngs: List[Any]) -> Tuple[List[float], List[float], List[bool]]:
+    """Parse both coordinate columns and flag the rows whose values are usable."""
+    if np is None:
+        lat_values, lng_values = _to_floats(lats), _to_floats(lngs)
+        valid = [
+            lat is not None and lng is not None and -90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0
+            for lat, lng in zip(lat_values, lng_values)
+        ]
+        return lat_values, lng_values, valid
+
+    def _column(values):
+        try:
+            return np.array(values, dtype=np.float64)
+        except (TypeError, ValueError):
+            # Some value is not a number: convert this batch one value at a time
+            return np.array([np.nan if v is None else v for v in _to_floats(values)], dtype=np.float64)
+
+    lat_array, lng_array = _column(lats), _column(lngs)
+    # NaN fails every comparison, so missing values are rejected with the out-of-range ones
+    valid = (np.abs(lat_array) <= 90.0) & (np.abs(lng_array) <= 180.0)
+    return lat_array.tolist(), lng_array.tolist(), valid.tolist()
+
+
+def _to_times(values: List[Any]) -> List[Any]:
+    """Parse ISO timestamps to aware datetimes; other non-empty values are kept as text."""
+    out = []
+    for value in values:
+        if not value:
+            out.append(None)
+            continue
+        try:
+            dt = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+            out.append(dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc))
+        except ValueError:
+            out.append(str(value).strip())
+    return out
+
+
+def validate_batch(
+    lats: List[Any], lngs: List[Any], times: List[Any], descriptions: List[Any], first_row: int = 1
+) -> Tuple[List[Dict[str, Any]], List[int]]:
+    """
+    Validate one batch of raw column values whose first row is `first_row`. Returns
+    (samples, rejected_rows); a row is rejected when its coordinates are missing,
+    unparseable or out of range.
+    """
+    lat_values, lng_values, valid = _valid_coordinates(lats, lngs)
+    time_values = _to_times(times)
+
+    samples = []
+    rejected_rows = []
+    for row, (lat, lng, ok, ts, description) in enumerate(
+        zip(lat_values, lng_values, valid, time_values, descriptions), start=first_row
+    ):
+        if not ok:
+            rejected_rows.append(row)
+            continue
+        if isinstance(description, str):
+            description = description.strip() or None
+        samples.append({
+            "lat": lat,
+            "lng": lng,
+            "timestamp": ts,
+            "description": description or None,
+        })
+    return samples, rejected_rows
+
+
+def iter_csv_batches(fileobj, batch_size: int = UPLOAD_BATCH_SIZE) -> Iterator[Tuple[List[Dict[str, Any]], List[int]]]:
+    """Yield (samples, rejected_rows) per batch of CSV rows read from a binary file object."""
+    try:
+        yield from _iter_csv_batches(fileobj, batch_size)
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise TrackFileError(f"Invalid CSV file: {e}")
+
+
+def _iter_csv_batches(fileobj, batch_size: int) -> Iterator[Tuple[List[Dict[str, Any]], List[int]]]:
+    reader = csv.reader(codecs.iterdecode(fileobj, "utf-8-sig"))
+    headers = next(reader, None)
+    if not headers:
+        raise TrackFileError("CSV file appears to be empty")
+    columns = _pick_columns(headers)
+    index = {key: (headers.index(col) if col else None) for key, col in columns.items()}
+
+    def _column(rows, key):
+        i = index[key]
+        return [row[i] if i is not None and i < len(row) else None for row in rows]
+
+    def _validate(rows, first_row):
+        return validate_batch(
+            _column(rows, "lat"), _column(rows, "lng"), _column(rows, "timestamp"), _column(rows, "description"), first_row
+        )
+
+    rows = []
+    first_row = 1
+    for row in reader:
+        if not row:
+            continue
+        rows.append(row)
+        if len(rows) >= batch_size:
+            yield _validate(rows, first_row)
+            first_row += len(rows)
+            rows = []
+    if rows:
+        yield _validate(rows, first_row)
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def iter_gpx_batches(fileobj, batch_size: int = UPLOAD_BATCH_SIZE) -> Iterator[Tuple[List[Dict[str, Any]], List[int]]]:
+    """
+    Yield (samples, rejected_rows) per batch of GPX track, route and waypoints. Each point
+    element is detached from the tree once read, so the parsed document never grows.
+    """
+    lats, lngs, times, descriptions = [], [], [], []
+    stack = []
+    first_row = 1
+    try:
+        for event, elem in ET.iterparse(fileobj, events=("start", "end")):
+            if event == "start":
+                stack.append(elem)
+                continue
+            stack.pop()
+            if _local(elem.tag) not in GPX_POINT_TAGS:
+                continue
+
+            children = {_local(child.tag): (child.text or "").strip() for child in elem}
+            lats.append(elem.get("lat"))
+            lngs.append(elem.get("lon"))
+            times.append(children.get("time"))
+            descriptions.append(children.get("desc") or children.get("name") or children.get("cmt"))
+            elem.clear()
+            if stack:
+                stack[-1].remove(elem)
+
+            if len(lats) >= batch_size:
+                yield validate_batch(lats, lngs, times, descriptions, first_row)
+                first_row += len(lats)
+                lats, lngs, times, descriptions = [], [], [], []
+    except ET.ParseError as e:
+        raise TrackFileError(f"Invalid GPX file: {e}")
+    if lats:
+        yield validate_batch(lats, lngs, times, descriptions, first_row)
+
+
+def iter_track_batches(fileobj, file_format: str, batch_size: int = UPLOAD_BATCH_SIZE):
+    if file_format == "gpx":
+        return iter_gpx_batches(fileobj, batch_size)
+    return iter_csv_batches(fileobj, batch_size)
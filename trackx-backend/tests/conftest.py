@@ -0,0 +1,13 @@
+import pytest
+
+from support import FakeDocStore, RecordingDb
+
+
+@pytest.fixture
+def recording_db() -> RecordingDb:
+    return RecordingDb()
+
+
+@pytest.fixture
+def doc_store() -> FakeDocStore:
+    return FakeDocStore()
@@ -0,0 +1,120 @@
+"""Shared helpers for the service tests: the result log and minimal Firestore fakes."""
+from pathlib import Path
+from typing import Callable, Optional
+
+LOG_FILE = Path(__file__).resolve().parent / "service_unit_tests.log"
+LOG_FILE.write_text("name | description | type | status\n")
+
+
+def _log_test_result(name: str, description: str, test_type: str, passed: bool) -> None:
+    status = "PASS" if passed else "FAIL"
+    with LOG_FILE.open("a") as handle:
+        handle.write(f"{name} | {description} | {test_type} | {status}\n")
+
+
+def run_logged_test(
+    name: str,
+    description: str,
+    test_type: str,
+    assertions: Callable[[], None],
+) -> None:
+    try:
+        assertions()
+    except AssertionError:
+        _log_test_result(name, description, test_type, False)
+        raise
+    else:
+        _log_test_result(name, description, test_type, True)
+
+
+class FakeSnapshot:
+    """Document snapshot; `data=None` is a missing document."""
+
+    def __init__(self, doc_id: str, data: Optional[dict], reference=None):
+        self.id = doc_id
+        self._data = data or {}
+        self.exists = data is not None
+        self.reference = reference
+
+    def to_dict(self) -> dict:
+        return dict(self._data)
+
+
+class PathRef:
+    """Collection or document reference that only knows its path."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def collection(self, name: str) -> "PathRef":
+        return PathRef(f"{self.path}/{name}")
+
+    def document(self, doc_id: str = "auto") -> "PathRef":
+        return PathRef(f"{self.path}/{doc_id}")
+
+
+class RecordingBatch:
+    """Write batch that records (op, path, data, merge) and hands them to its db on commit."""
+
+    def __init__(self, db: "RecordingDb"):
+        self._db = db
+        self.ops: list = []
+
+    def set(self, ref, data, merge=False):
+        self.ops.append(("set", ref.path, data, merge))
+
+    def update(self, ref, data):
+        self.ops.append(("update", ref.path, data, False))
+
+    def delete(self, ref):
+        self.ops.append(("delete", ref.path, None, False))
+
+    def commit(self):
+        assert len(self.ops) <= 500
+        self._db.commits.append(self.ops)
+
+
+class RecordingDb:
+    """
+    Client whose references are paths and whose batches record every committed write.
+    Every document exists for get_all except the paths listed in `missing`.
+    """
+
+    def __init__(self):
+        self.commits: list = []
+        self.missing: set = set()
+
+    def collection(self, name: str) -> PathRef:
+        return PathRef(name)
+
+    def get_all(self, refs, field_paths=None):
+        return [FakeSnapshot(ref.id, None if ref.path in self.missing else {}, reference=ref) for ref in refs]
+
+    def batch(self) -> RecordingBatch:
+        return RecordingBatch(self)
+
+
+class FakeDocStore:
+    """Minimal document store: collection(name).document(id).set/update/get."""
+
+    def __init__(self):
+        self.docs: dict = {}
+
+    def collection(self, name: str):
+        return self
+
+    def document(self, doc_id: str):
+        store = self.docs
+
+        class _Ref:
+            def set(self, data):
+                store[doc_id] = dict(data)
+
+            def update(self, data):
+                store.setdefault(doc_id, {}).update(data)
+
+            def get(self):
+                return FakeSnapshot(doc_id, store.get(doc_id))
+
+        return _Ref()
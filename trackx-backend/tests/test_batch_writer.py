@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from support import run_logged_test
+
+
+def test_write_documents_chunks_batches_and_retries_contention(monkeypatch: pytest.MonkeyPatch):
+    def _assertions():
+        from google.api_core import exceptions as gexc
+        from services import batch_writer
+
+        class _Batch:
+            def __init__(self, db):
+                self._db = db
+                self._ops = []
+
+            def set(self, ref, data):
+                self._ops.append((ref, data))
+
+            def commit(self):
+                assert len(self._ops) <= 500
+                if not self._db.failed:
+                    self._db.failed = True
+                    raise gexc.Aborted("contention")
+                self._db.committed.extend(self._ops)
+
+        class _Db:
+            def __init__(self):
+                self.failed = False
+                self.committed = []
+
+            def batch(self):
+                return _Batch(self)
+
+        real_sleep = asyncio.sleep
+        monkeypatch.setattr(batch_writer.asyncio, "sleep", lambda _delay: real_sleep(0))
+        fake_db = _Db()
+        writes = [(f"ref-{i}", {"i": i}) for i in range(1203)]
+        stats = asyncio.run(batch_writer.write_documents(fake_db, writes))
+
+        assert stats["batches"] == 3
+        assert stats["retries"] == 1
+        assert sorted(data["i"] for _, data in fake_db.committed) == list(range(1203))
+        assert stats["writesPerSecond"] > 0
+
+    run_logged_test(
+        "test_write_documents_chunks_batches_and_retries_contention",
+        "Ensures bulk point writes stay under the 500-op batch limit and retry aborted commits",
+        "Unit",
+        _assertions,
+    )
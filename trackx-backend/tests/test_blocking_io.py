@@ -0,0 +1,33 @@
+import asyncio
+import time
+
+from services import blocking_io
+from support import run_logged_test
+
+
+def test_run_blocking_keeps_event_loop_responsive():
+    def _assertions():
+        async def _scenario():
+            ticks = 0
+
+            async def _ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            ticker = asyncio.create_task(_ticker())
+            result = await blocking_io.run_blocking(lambda: time.sleep(0.2) or "done")
+            ticker.cancel()
+            return result, ticks
+
+        result, ticks = asyncio.run(_scenario())
+        assert result == "done"
+        assert ticks >= 5, "Event loop should keep running while the blocking call is offloaded"
+
+    run_logged_test(
+        "test_run_blocking_keeps_event_loop_responsive",
+        "Ensures blocking Firestore-style calls run off the event loop",
+        "Unit",
+        _assertions,
+    )
@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+from support import run_logged_test
+
+
+def test_case_number_index_enforces_uniqueness_and_caches_lookups(monkeypatch: pytest.MonkeyPatch):
+    def _assertions():
+        from services import case_numbers
+
+        store = {}
+        reads = []
+
+        class _Snap:
+            def __init__(self, ref):
+                self.reference = ref
+                self.id = ref.path.rsplit("/", 1)[-1]
+                self.exists = ref.path in store
+
+            def to_dict(self):
+                return dict(store.get(self.reference.path, {}))
+
+        class _Ref:
+            def __init__(self, path):
+                self.path = path
+
+            def collection(self, name):
+                return _Query(f"{self.path}/{name}")
+
+            def get(self, transaction=None):
+                reads.append(self.path)
+                return _Snap(self)
+
+            def create(self, data):
+                assert self.path not in store
+                store[self.path] = data
+
+        class _Query:
+            def __init__(self, path, filters=()):
+                self.path = path
+                self.filters = filters
+
+            def document(self, doc_id):
+                return _Ref(f"{self.path}/{doc_id}")
+
+            def where(self, field, op, value):
+                return _Query(self.path, self.filters + ((field, value),))
+
+            def select(self, _fields):
+                return self
+
+            def limit(self, _n):
+                return self
+
+            def stream(self):
+                prefix = self.path + "/"
+                for path, data in list(store.items()):
+                    if path.startswith(prefix) and "/" not in path[len(prefix):]:
+                        if all(data.get(f) == v for f, v in self.filters):
+                            yield _Snap(_Ref(path))
+
+        class _Transaction:
+            def get(self, query):
+                return list(query.stream())
+
+            def set(self, ref, data):
+                store[ref.path] = data
+
+            def delete(self, ref):
+                store.pop(ref.path, None)
+
+        class _Db:
+            def collection(self, name):
+                return _Query(name)
+
+        monkeypatch.setattr(case_numbers, "db", _Db())
+        monkeypatch.setattr(case_numbers, "_cache", case_numbers.TTLCache(maxsize=10, ttl=60))
+
+        store["cases/legacy"] = {"caseNumber": "CAS 1/2024"}
+        store["cases/c2"] = {"caseNumber": "CAS-2"}
+        tx = _Transaction()
+
+        # Numbers held by an unindexed case are taken too
+        with pytest.raises(case_numbers.CaseNumberTakenError):
+            case_numbers.claim_in_transaction(tx, "CAS 1/2024", "c2")
+
+        case_numbers.claim_in_transaction(tx, "CAS-2", "c2")
+        mapping_path = f"caseNumbers/{case_numbers.case_number_doc_id('CAS-2')}"
+        assert store[mapping_path]["caseId"] == "c2"
+        with pytest.raises(case_numbers.CaseNumberTakenError):
+            case_numbers.claim_in_transaction(tx, "CAS-2", "c3")
+
+        # Renumbering moves the entry
+        case_numbers.claim_in_transaction(tx, "CAS-2b", "c2", previous_number="CAS-2")
+        store["cases/c2"]["caseNumber"] = "CAS-2b"
+        assert mapping_path not in store
+        assert "/" not in case_numbers.case_number_doc_id("CAS 1/2024")
+
+        # Legacy case: resolved by query once, indexed, then served from the cache
+        assert asyncio.run(case_numbers.get_case_by_number("CAS 1/2024")).id == "legacy"
+        reads.clear()
+        assert asyncio.run(case_numbers.get_case_by_number("CAS 1/2024")).id == "legacy"
+        assert reads == ["cases/legacy"]
+
+        # A cached mapping made stale by a rename elsewhere is detected and dropped
+        case_numbers._cache_set("CAS-2", "c2")
+        assert asyncio.run(case_numbers.get_case_by_number("CAS-2")) is None
+        assert asyncio.run(case_numbers.get_case_by_number("CAS-2b")).id == "c2"
+
+    run_logged_test(
+        "test_case_number_index_enforces_uniqueness_and_caches_lookups",
+        "Ensures the caseNumber index rejects duplicates, follows renames and resolves from its TTL cache",
+        "Unit",
+        _assertions,
+    )
@@ -0,0 +1,548 @@
+import asyncio
+import base64
+from datetime import datetime, timezone
+
+import pytest
+
+from services import case_service
+from support import FakeSnapshot, run_logged_test
+
+
+class _FakeQuery:
+    def __init__(self, docs: dict, log: list, filters: tuple = ()):
+        self._docs = docs
+        self._log = log
+        self._filters = filters
+
+    def where(self, field: str, op: str, value):
+        return _FakeQuery(self._docs, self._log, self._filters + ((field, op, value),))
+
+    def _matches(self, data: dict) -> bool:
+        for field, op, value in self._filters:
+            current = data.get(field)
+            if op == "==" and current != value:
+                return False
+            if op == "array_contains" and (not isinstance(current, list) or value not in current):
+                return False
+        return True
+
+    def stream(self):
+        self._log.append(self._filters)
+        return [FakeSnapshot(doc_id, data) for doc_id, data in self._docs.items() if self._matches(data)]
+
+
+class _FakeDb:
+    def __init__(self, cases: dict):
+        self.cases = cases
+        self.queries: list = []
+
+    def collection(self, name: str):
+        assert name == "cases"
+        return _FakeQuery(self.cases, self.queries)
+
+
+def test_get_case_documents_for_user_scopes_queries_to_member(monkeypatch: pytest.MonkeyPatch):
+    def _assertions():
+        fake_db = _FakeDb(
+            {
+                "mine": {"userIds": ["alpha", "beta"], "userId": "alpha", "is_deleted": False},
+                "shared": {"userIds": ["beta", "alpha"], "userId": "beta", "is_deleted": False},
+                "trashed": {"userIds": ["alpha"], "is_deleted": True},
+                "theirs": {"userIds": ["gamma"], "userId": "gamma", "is_deleted": False},
+            }
+        )
+        monkeypatch.setattr(case_service, "db", fake_db)
+
+        docs = case_service._get_case_documents_for_user("alpha")
+        assert sorted(docs) == ["mine", "shared"]
+        assert fake_db.queries == [(("userIds", "array_contains", "alpha"), ("is_deleted", "==", False))]
+
+        with_deleted = case_service._get_case_documents_for_user("alpha", include_deleted=True)
+        assert sorted(with_deleted) == ["mine", "shared", "trashed"]
+
+    run_logged_test(
+        "test_get_case_documents_for_user_scopes_queries_to_member",
+        "Ensures dashboard case lookups only read documents the user belongs to",
+        "Unit",
+        _assertions,
+    )
+
+
+def test_canonical_case_fields_backfills_query_keys():
+    def _assertions():
+        legacy_case = {"userID": "owner", "userIDs": ["owner", "helper"], "region": "KwaZulu-Natal"}
+        canonical = case_service._canonical_case_fields(legacy_case)
+        assert canonical["userIds"] == ["owner", "helper"]
+        assert canonical["userId"] == "owner"
+        assert canonical["isShared"] is True
+        assert canonical["provinceCode"] == "KZN"
+        assert canonical["provinceName"] == "KwaZulu-Natal"
+        assert canonical["regionKey"] == "kwazulu-natal"
+        assert canonical["is_deleted"] is False
+        assert canonical["schemaVersion"] == case_service.CASE_SCHEMA_VERSION
+
+    run_logged_test(
+        "test_canonical_case_fields_backfills_query_keys",
+        "Checks legacy case documents map onto the canonical indexed fields",
+        "Unit",
+        _assertions,
+    )
+
+
+def test_search_cases_runs_single_canonical_query(monkeypatch: pytest.MonkeyPatch):
+    def _assertions():
+        fake_db = _FakeDb(
+            {
+                "gp": {"userIds": ["alpha"], "userId": "alpha", "provinceCode": "GP", "regionKey": "gauteng", "is_deleted": False},
+                "wc": {"userIds": ["alpha"], "userId": "alpha", "provinceCode": "WC", "regionKey": "western-cape", "is_deleted": False},
+            }
+        )
+        monkeypatch.setattr(case_service, "db", fake_db)
+
+        results = asyncio.run(case_service.search_cases(user_id="alpha", provinceName="Western Cape", provinceCode="WC"))
+        assert [case["doc_id"] for case in results] == ["wc"]
+        assert len(fake_db.queries) == 1
+
+        by_region = asyncio.run(case_service.search_cases(user_id="alpha", region="Gauteng"))
+        assert [case["doc_id"] for case in by_region] == ["gp"]
+
+    run_logged_test(
+        "test_search_cases_runs_single_canonical_query",
+        "Verifies case search resolves province filters with one indexed query",
+        "Integration",
+        _assertions,
+    )
+
+
+def test_case_cursor_round_trips_order_values():
+    def _assertions():
+        created = datetime(2024, 7, 1, 9, 30, tzinfo=timezone.utc)
+        cursor = case_service._encode_case_cursor(FakeSnapshot("case-9", {"createdAt": created}))
+        assert "/" not in cursor and "{" not in cursor
+
+        position = case_service._decode_case_cursor(cursor)
+        assert position == {"createdAt": created, case_service.DOCUMENT_ID: "case-9"}
+        for bad in ("not-a-cursor", base64.urlsafe_b64encode(b'{"createdAt": "x"}').decode()):
+            with pytest.raises(ValueError):
+                case_service._decode_case_cursor(bad)
+        with pytest.raises(ValueError):
+            asyncio.run(case_service.search_cases_paginated(limit=5, cursor="not-a-cursor"))
+        for bad in ("{", '{"path": "users/u1"}', "[]"):
+            with pytest.raises(ValueError):
+                asyncio.run(case_service.fetch_all_points_paginated(cursor=bad))
+
+    run_logged_test(
+        "test_case_cursor_round_trips_order_values",
+        "Checks opaque search cursors restore the createdAt/doc-id resume position and reject bad ones",
+        "Unit",
+        _assertions,
+    )
+
+
+class _FakeRef:
+    def __init__(self, doc_id: str, parent=None):
+        self.id = doc_id
+        self.parent = parent
+
+
+class _FakePointQuery:
+    def __init__(self, docs: list, log: list):
+        self._docs = docs
+        self._log = log
+
+    def select(self, fields):
+        self._log.append(("select", tuple(fields)))
+        return self
+
+    def get_partitions(self, count: int):
+        raise RuntimeError("partitioning unavailable")
+
+    def stream(self):
+        self._log.append(("stream", len(self._docs)))
+        return list(self._docs)
+
+
+class _FakePointsDb:
+    def __init__(self, case_ids: list, points: list):
+        self.log: list = []
+        self._cases = [FakeSnapshot(case_id, {}) for case_id in case_ids]
+        self._points = []
+        for case_id, data in points:
+            snap = FakeSnapshot(f"p{len(self._points)}", data)
+            snap.reference = _FakeRef(snap.id, _FakeRef("points", _FakeRef(case_id)))
+            self._points.append(snap)
+
+    def collection(self, name: str):
+        assert name == "cases"
+        return _FakePointQuery(self._cases, self.log)
+
+    def collection_group(self, name: str):
+        assert name == "points"
+        return _FakePointQuery(self._points, self.log)
+
+
+def test_fetch_all_case_points_with_case_ids_uses_one_collection_group_read(monkeypatch: pytest.MonkeyPatch):
+    def _assertions():
+        fake_db = _FakePointsDb(
+            ["c1", "c2"],
+            [
+                ("c1", {"lat": -33.9, "lng": 18.4, "timestamp": "2025-01-01T00:00:00Z"}),
+                ("c2", {"lat": -26.2, "lng": 28.0, "timestamp": "2025-01-01T01:00:00Z"}),
+                ("c2", {"lat": -26.3, "lng": 28.1}),
+                ("gone", {"lat": 1.0, "lng": 1.0, "timestamp": "2025-01-01T02:00:00Z"}),
+            ],
+        )
+        monkeypatch.setattr(case_service, "db", fake_db)
+
+        points = asyncio.run(case_service.fetch_all_case_points_with_case_ids())
+
+        assert [(p["caseId"], p["lat"]) for p in points] == [("c1", -33.9), ("c2", -26.2)]
+        streams = [entry for entry in fake_db.log if entry[0] == "stream"]
+        assert len(streams) == 2, "Expected one keys-only case read and one points read"
+        assert ("select", ("lat", "lng", "timestamp")) in fake_db.log
+
+    run_logged_test(
+        "test_fetch_all_case_points_with_case_ids_uses_one_collection_group_read",
+        "Checks heatmap points come from a single collection-group query tagged with their parent case",
+        "Unit",
+        _assertions,
+    )
+
+
+def test_merge_track_summary_tracks_extent_and_latest_point():
+    def _assertions():
+        summary = case_service._merge_track_summary({}, [
+            {"lat": -33.9, "lng": 18.4, "timestamp": "2025-01-01T10:00:00Z", "description": "start"},
+            {"lat": -33.7, "lng": 18.9, "timestamp": "2025-01-01T12:00:00Z", "description": "end"},
+        ])
+        assert summary["pointCount"] == 2
+        assert summary["lastPoint"]["description"] == "end"
+        assert summary["bbox"] == {"minLat": -33.9, "minLng": 18.4, "maxLat": -33.7, "maxLng": 18.9}
+
+        # An out-of-order append extends the span without replacing the latest point
+        merged = case_service._merge_track_summary(summary, [
+            {"lat": -34.1, "lng": 18.3, "timestamp": "2025-01-01T08:00:00Z"},
+        ])
+        assert merged["pointCount"] == 3
+        assert merged["lastPoint"]["description"] == "end"
+        assert merged["trackStart"] == datetime(2025, 1, 1, 8, tzinfo=timezone.utc)
+        assert merged["trackEnd"] == datetime(2025, 1, 1, 12, tzinfo=timezone.utc)
+        assert merged["bbox"]["minLat"] == -34.1
+
+        assert case_service._merge_track_summary({}, [])["lastPoint"] is None
+
+    run_logged_test(
+        "test_merge_track_summary_tracks_extent_and_latest_point",
+        "Validates the denormalized last point, count, time span and bbox of a case track",
+        "Unit",
+        _assertions,
+    )
+
+
+def test_ingest_track_upload_rolls_back_when_a_later_batch_fails(monkeypatch: pytest.MonkeyPatch):
+    def _assertions():
+        import io
+        from services import track_upload
+
+        written, rolled_back = [], []
+
+        class _CaseRef:
+            id = "case-1"
+
+            def get(self, field_paths=None):
+                return FakeSnapshot("case-1", {"pointCount": 0})
+
+            def collection(self, name):
+                return self
+
+            def document(self):
+                return object()
+
+        class _Db:
+            def collection(self, name):
+                return self
+
+            def document(self, doc_id):
+                return _CaseRef()
+
+        async def _write_documents(db, writes, **kwargs):
+            written.extend(data for _, data in writes)
+
+        async def _record(case_id, samples, extra_fields=None):
+            return {}
+
+        async def _rollback(case_ref, upload_id, chunked, original_manifest):
+            rolled_back.append(upload_id)
+
+        monkeypatch.setattr(case_service, "db", _Db())
+        monkeypatch.setattr(case_service, "write_documents", _write_documents)
+        monkeypatch.setattr(case_service, "record_appended_points", _record)
+        monkeypatch.setattr(case_service, "_rollback_track_upload", _rollback)
+        monkeypatch.setattr(case_service.track_storage, "TRACK_STORAGE_FORMAT", "documents")
+        monkeypatch.setattr(track_upload, "UPLOAD_BATCH_SIZE", 2)
+
+        good = b"lat,lng,time\n-33.92,18.42,2025-01-01T10:00:00Z\nx,18.43,\n-33.93,18.44,\n"
+        stats = asyncio.run(case_service.ingest_track_upload("case-1", io.BytesIO(good), "csv"))
+        assert stats["accepted"] == 2 and stats["rejected"] == 1 and stats["rejectedRows"] == [2]
+        assert {p["uploadId"] for p in written} == {stats["uploadId"]}
+        assert rolled_back == []
+
+        written.clear()
+        broken = b"lat,lng\n-33.92,18.42\n-33.93,18.44\n\xff\xfe\n"
+        with pytest.raises(track_upload.TrackFileError):
+            asyncio.run(case_service.ingest_track_upload("case-1", io.BytesIO(broken), "csv"))
+        assert len(written) == 2 and rolled_back == [written[0]["uploadId"]]
+
+        class _MissingCaseRef(_CaseRef):
+            def get(self, field_paths=None):
+                return FakeSnapshot("case-2", None)
+
+        monkeypatch.setattr(_Db, "document", lambda self, doc_id: _MissingCaseRef())
+        with pytest.raises(case_service.CaseNotFoundError):
+            asyncio.run(case_service.ingest_track_upload("case-2", io.BytesIO(good), "csv"))
+
+    run_logged_test(
+        "test_ingest_track_upload_rolls_back_when_a_later_batch_fails",
+        "Ensures uploads tag their samples, report rejected rows and roll back on a failing batch",
+        "Unit",
+        _assertions,
+    )
+
+
+def test_store_interpolated_points_keeps_flagged_points_across_recomputes(monkeypatch: pytest.MonkeyPatch):
+    def _assertions():
+        docs: dict = {}
+        case_fields: dict = {}
+
+        class _PointRef:
+            def __init__(self, doc_id):
+                self.id = doc_id
+
+        class _Points:
+            def __init__(self, filters=()):
+                self.filters = filters
+
+            def document(self, doc_id):
+                return _PointRef(doc_id)
+
+            def select(self, _fields):
+                return self
+
+            def where(self, field, op, value):
+                return _Points(self.filters + ((field, value),))
+
+            def order_by(self, _field):
+                return self
+
+            def stream(self):
+                return [
+                    FakeSnapshot(doc_id, data, reference=_PointRef(doc_id))
+                    for doc_id, data in sorted(docs.items())
+                    if all(data.get(f) == v for f, v in self.filters)
+                ]
+
+        class _CaseRef:
+            def collection(self, name):
+                assert name == "interpolatedPoints"
+                return _Points()
+
+            def update(self, data):
+                case_fields.update(data)
+
+        class _Batch:
+            def __init__(self):
+                self.ops = []
+
+            def set(self, ref, data):
+                self.ops.append(lambda: docs.__setitem__(ref.id, dict(data)))
+
+            def delete(self, ref):
+                self.ops.append(lambda: docs.pop(ref.id, None))
+
+            def commit(self):
+                for op in self.ops:
+                    op()
+
+        class _Db:
+            def collection(self, name):
+                return self
+
+            def document(self, doc_id):
+                return _CaseRef()
+
+            def batch(self):
+                return _Batch()
+
+        monkeypatch.setattr(case_service, "db", _Db())
+
+        def _track(offset):
+            return [
+                {"lat": -33.9 + offset, "lng": 18.4, "timestamp": f"2024-01-01T00:00:0{i}Z"} for i in range(3)
+            ]
+
+        asyncio.run(case_service.store_interpolated_points("c1", _track(0.0), "v1"))
+        flagged_id = sorted(docs)[1]
+        docs[flagged_id].update({"isFlagged": True, "title": "Stop", "note": "Check CCTV"})
+        docs["legacy-auto-id"] = {"lat": -34.0, "lng": 18.5, "timestamp": None, "isFlagged": True, "title": "Old"}
+        docs["legacy-unflagged"] = {"lat": -34.0, "lng": 18.5, "timestamp": None}
+
+        # A new upload changes the track, so the set is recomputed under a new version
+        asyncio.run(case_service.store_interpolated_points("c1", _track(0.1), "v2"))
+        assert docs[flagged_id]["title"] == "Stop" and docs[flagged_id]["note"] == "Check CCTV"
+        assert docs["legacy-auto-id"]["title"] == "Old" and "legacy-unflagged" not in docs
+        assert case_fields["interpolatedSourceVersion"] == "v2"
+
+        current = asyncio.run(case_service.fetch_interpolated_points("c1", "v2"))
+        assert [p["lat"] for p in current] == [pytest.approx(-33.8)] * 3
+
+        # Rewriting the same version never overwrites a point flagged in it
+        v2_flagged = sorted(doc_id for doc_id in docs if doc_id.startswith("v2-"))[0]
+        docs[v2_flagged]["isFlagged"] = True
+        asyncio.run(case_service.store_interpolated_points("c1", _track(0.1), "v2"))
+        assert docs[v2_flagged]["isFlagged"] is True
+        assert len(asyncio.run(case_service.fetch_interpolated_points("c1", "v2"))) == 3
+
+    run_logged_test(
+        "test_store_interpolated_points_keeps_flagged_points_across_recomputes",
+        "Ensures investigator flags and notes on interpolated points survive a recomputed set",
+        "Unit",
+        _assertions,
+    )
+
+
+def test_pending_track_gets_its_summary_only_once_written(monkeypatch: pytest.MonkeyPatch):
+    def _assertions():
+        from types import SimpleNamespace
+
+        from services import track_storage
+
+        updates, written = [], []
+
+        class _CaseRef:
+            def collection(self, name):
+                return self
+
+            def document(self, doc_id=None):
+                return object()
+
+            def update(self, data):
+                updates.append(data)
+
+        class _Db:
+            def collection(self, name):
+                return self
+
+            def document(self, doc_id):
+                return _CaseRef()
+
+        async def _write_documents(db, writes, on_progress=None):
+            if fail:
+                raise RuntimeError("write failed")
+            written.extend(data for _, data in writes)
+            return {"writesPerSecond": 0, "batches": 1, "retries": 0}
+
+        monkeypatch.setattr(case_service, "db", _Db())
+        monkeypatch.setattr(case_service, "write_documents", _write_documents)
+
+        points = [
+            {"lat": -33.92, "lng": 18.42, "timestamp": "2025-01-01T10:00:00Z", "description": None},
+            {"lat": -33.93, "lng": 18.43, "timestamp": "2025-01-01T10:05:00Z", "description": None},
+        ]
+        payload = SimpleNamespace(csv_data=None)
+        case_data = {**case_service._merge_track_summary({}, []), track_storage.TRACK_STATUS_FIELD: "pending"}
+        assert case_data["trackVersion"] is None and track_storage.is_pending(case_data)
+
+        # A CZML request during ingestion must not derive and cache anything from a partial track
+        with pytest.raises(track_storage.TrackNotReadyError):
+            asyncio.run(case_service.ensure_track_version("c1", case_data))
+
+        fail = True
+        with pytest.raises(RuntimeError):
+            asyncio.run(case_service._write_case_points("c1", payload, points, dict(case_data)))
+        assert updates == [{track_storage.TRACK_STATUS_FIELD: track_storage.FAILED_STATUS}]
+
+        fail = False
+        updates.clear()
+        asyncio.run(case_service._write_case_points("c1", payload, points, case_data))
+        assert len(written) == 2 and len(updates) == 1
+        assert updates[0]["pointCount"] == 2 and updates[0]["trackVersion"]
+        assert updates[0][track_storage.TRACK_STATUS_FIELD] is case_service.firestore.DELETE_FIELD
+        assert not track_storage.is_pending(case_data)
+        assert asyncio.run(case_service.ensure_track_version("c1", case_data)) == updates[0]["trackVersion"]
+
+    run_logged_test(
+        "test_pending_track_gets_its_summary_only_once_written",
+        "Ensures a new case's summary and trackVersion are stored only after its points are written",
+        "Unit",
+        _assertions,
+    )
+
+
+def test_chunked_uploads_into_one_case_are_serialized_by_the_upload_lock(monkeypatch: pytest.MonkeyPatch):
+    def _assertions():
+        import io
+
+        from services import track_storage
+
+        fields = {"trackStorage": {"format": track_storage.CHUNKED_FORMAT, "chunkCount": 3, "pointCount": 5}, "pointCount": 5}
+
+        class _CaseRef:
+            id = "c1"
+
+            def get(self, field_paths=None, transaction=None):
+                return FakeSnapshot("c1", {k: v for k, v in fields.items() if k in field_paths})
+
+            def update(self, data):
+                for key, value in data.items():
+                    if value is case_service.DELETE_FIELD:
+                        fields.pop(key, None)
+                    else:
+                        fields[key] = value
+
+        class _Transaction:
+            def update(self, ref, data):
+                ref.update(data)
+
+        class _Db:
+            def collection(self, name):
+                return self
+
+            def document(self, doc_id):
+                return _CaseRef()
+
+            def transaction(self):
+                return _Transaction()
+
+        def _write_chunked_track(db, case_ref, samples, manifest):
+            return {**manifest, "chunkCount": manifest["chunkCount"] + 1, "pointCount": manifest["pointCount"] + len(samples)}
+
+        async def _record(case_id, samples, extra_fields=None):
+            fields.update(extra_fields or {})
+            return {}
+
+        monkeypatch.setattr(case_service, "db", _Db())
+        monkeypatch.setattr(case_service.firestore, "transactional", lambda fn: fn)
+        monkeypatch.setattr(track_storage, "write_chunked_track", _write_chunked_track)
+        monkeypatch.setattr(case_service, "record_appended_points", _record)
+
+        csv = b"lat,lng\n-33.92,18.42\n-33.93,18.44\n"
+
+        # Another upload holds the lock: this one is refused before writing a chunk
+        case_service._lock_chunked_upload(_CaseRef(), "other-upload")
+        with pytest.raises(track_storage.TrackNotReadyError):
+            asyncio.run(case_service.ingest_track_upload("c1", io.BytesIO(csv), "csv"))
+        assert fields["trackStorage"]["chunkCount"] == 3
+
+        # A lock nobody refreshed for TRACK_UPLOAD_LOCK_SECONDS is stale and taken over
+        fields[case_service.UPLOAD_LOCK_FIELD]["lockedAt"] -= case_service.TRACK_UPLOAD_LOCK_SECONDS + 1
+        stats = asyncio.run(case_service.ingest_track_upload("c1", io.BytesIO(csv), "csv"))
+        assert stats["accepted"] == 2 and stats["storage"] == track_storage.CHUNKED_FORMAT
+        assert fields["trackStorage"] == {"format": track_storage.CHUNKED_FORMAT, "chunkCount": 4, "pointCount": 7}
+        assert case_service.UPLOAD_LOCK_FIELD not in fields
+
+    run_logged_test(
+        "test_chunked_uploads_into_one_case_are_serialized_by_the_upload_lock",
+        "Ensures a second chunked upload into a case is refused while the first holds the upload lock",
+        "Unit",
+        _assertions,
+    )
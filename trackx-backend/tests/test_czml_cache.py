@@ -0,0 +1,57 @@
+import asyncio
+
+from support import run_logged_test
+
+
+def test_czml_artifact_key_tracks_content_and_etag_matching():
+    def _assertions():
+        import gzip as _gzip
+        import json as _json
+        from services import czml_cache
+        from services.case_service import _merge_track_summary
+
+        points = [{"lat": -33.9, "lng": 18.4, "timestamp": "2024-01-01T00:00:00"}]
+        summary = _merge_track_summary({}, points)
+        same = _merge_track_summary({}, [dict(p) for p in points])
+        grown = _merge_track_summary(summary, [{"lat": -33.8, "lng": 18.5, "timestamp": "2024-01-01T00:05:00"}])
+        assert summary["trackVersion"] == same["trackVersion"]
+        assert grown["trackVersion"] != summary["trackVersion"]
+        assert _merge_track_summary(summary, [])["trackVersion"] == summary["trackVersion"]
+
+        key = czml_cache.artifact_key(summary["trackVersion"], {"interpolation": "ors"})
+        assert key == czml_cache.artifact_key(summary["trackVersion"], {"interpolation": "ors"})
+        assert key != czml_cache.artifact_key(grown["trackVersion"], {"interpolation": "ors"})
+        assert key != czml_cache.artifact_key(summary["trackVersion"], {"interpolation": "none"})
+
+        assert czml_cache.etag_matches(f'W/"{key}", "other"', key)
+        assert not czml_cache.etag_matches('"other"', key)
+        assert not czml_cache.etag_matches(None, key)
+
+        czml = [{"id": "document", "version": "1.0"}, {"id": "path", "position": {"cartographicDegrees": [0, 18.4, -33.9, 0]}}]
+        assert _json.loads(_gzip.decompress(czml_cache.compress_czml(czml))) == czml
+
+        # A degraded (fallback) document is returned but never becomes the cached artifact
+        stored = []
+
+        class _ArtifactRef:
+            def set(self, data):
+                stored.append(data)
+
+        class _CaseRef:
+            def collection(self, name):
+                return self
+
+            def document(self, name):
+                return _ArtifactRef()
+
+        blob = asyncio.run(czml_cache.store_artifact(None, _CaseRef(), "czml-interpolated-ors", key, czml, complete=False))
+        assert _json.loads(_gzip.decompress(blob)) == czml and stored == []
+        asyncio.run(czml_cache.store_artifact(None, _CaseRef(), "czml-interpolated-ors", key, czml))
+        assert len(stored) == 1 and stored[0]["key"] == key
+
+    run_logged_test(
+        "test_czml_artifact_key_tracks_content_and_etag_matching",
+        "Ensures CZML artifact keys change with track content and params and ETags match If-None-Match",
+        "Unit",
+        _assertions,
+    )
@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from support import run_logged_test
+
+
+def test_generate_czml_normalizes_timestamps_in_one_pass():
+    def _assertions():
+        from services.czml_service import generate_czml
+
+        points = [
+            {"lat": 3.0, "lng": 30.0, "timestamp": "2024-01-01T00:00:10.5Z"},
+            {"lat": 1.0, "lng": 10.0, "timestamp": datetime(2024, 1, 1, 2, 0, 0, tzinfo=timezone(timedelta(hours=2)))},
+            {"lat": 2.0, "lng": 20.0, "timestamp": ["2024-01-01T00:00:05+00:00"]},
+            {"lat": 9.0, "lng": 90.0, "timestamp": "not-a-time"},
+            {"lat": 9.0, "lng": 90.0, "timestamp": []},
+            {"lat": 9.0, "lng": 90.0},
+        ]
+        czml = generate_czml("CASE-1", points)
+        assert czml[0]["clock"]["interval"] == "2024-01-01T00:00:00Z/2024-01-01T00:00:10.500000Z"
+        assert czml[1]["position"]["epoch"] == "2024-01-01T00:00:00Z"
+        assert czml[1]["position"]["cartographicDegrees"] == [
+            0.0, 10.0, 1.0, 0,
+            5.0, 20.0, 2.0, 0,
+            10.5, 30.0, 3.0, 0,
+        ]
+
+        with pytest.raises(ValueError):
+            generate_czml("CASE-1", points[3:])
+
+    run_logged_test(
+        "test_generate_czml_normalizes_timestamps_in_one_pass",
+        "Ensures CZML generation orders mixed timestamp formats and computes offsets from a single parse",
+        "Unit",
+        _assertions,
+    )
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from services import derivations_service
+from support import run_logged_test
+
+
+def test_vectorized_rollup_matches_scalar_engine():
+    pytest.importorskip("numpy")
+
+    def _assertions():
+        base = datetime(2024, 1, 1, 8, 0, tzinfo=timezone.utc)
+        points = []
+        # Long dwell (more points than the scalar probe), a drive, a GPS jump, a short stop
+        for i in range(40):
+            points.append({"lat": -33.9249 + (i % 3) * 0.0001, "lng": 18.4241, "timestamp": base + timedelta(seconds=30 * i)})
+        for i in range(10):
+            points.append({"lat": -33.92 + i * 0.01, "lng": 18.43, "timestamp": base + timedelta(minutes=25, seconds=60 * i)})
+        points.append({"lat": -34.0, "lng": 18.43, "timestamp": (base + timedelta(minutes=35, seconds=30)).isoformat().replace("+00:00", "Z")})
+        for i in range(12):
+            points.append({"lat": -34.5, "lng": 18.43 + i * 0.00005, "timestamp": (base + timedelta(hours=3, minutes=i)).isoformat()})
+        points.append({"lat": None, "lng": 18.4, "timestamp": base})
+        points.reverse()
+
+        fixtures = [
+            points,
+            [{"lat": 0.0, "lng": 0.0, "timestamp": base + timedelta(hours=h % 7)} for h in range(14)],
+            [],
+            [points[0]],
+        ]
+        for fixture in fixtures:
+            scalar = derivations_service.compute_rollup_scalar(fixture)
+            vectorized = derivations_service.compute_rollup_vectorized(fixture)
+            scalar.pop("computedAt", None)
+            vectorized.pop("computedAt", None)
+            assert vectorized == scalar
+
+        rollup = derivations_service.compute_rollup_vectorized(points)
+        assert rollup["stopCount"] == 2
+        assert rollup["longestDwell"]["seconds"] == 39 * 30
+        assert len(rollup["anomalies"]) == 1
+
+    run_logged_test(
+        "test_vectorized_rollup_matches_scalar_engine",
+        "Ensures the NumPy rollup engine returns exactly what the scalar engine returns",
+        "Unit",
+        _assertions,
+    )
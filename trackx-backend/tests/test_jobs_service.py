@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+
+from support import run_logged_test
+
+
+def test_enqueue_job_runs_handler_and_records_progress(monkeypatch: pytest.MonkeyPatch, doc_store):
+    def _assertions():
+        from services import jobs_service
+
+        store = doc_store
+        monkeypatch.setattr(jobs_service, "db", store)
+        monkeypatch.setattr(jobs_service, "JOB_PROGRESS_INTERVAL", 0.0)
+
+        async def _handler(progress):
+            await progress.advance(3)
+            await progress.advance(2, stage="finishing")
+            return {"caseId": "case-1"}
+
+        async def _failing(progress):
+            raise RuntimeError("boom")
+
+        async def _scenario():
+            ok_id = await jobs_service.enqueue_job("case-ingest", _handler, total=5, caseId="case-1")
+            failed_id = await jobs_service.enqueue_job("case-ingest", _failing, total=1)
+            assert store.docs[ok_id]["status"] in ("queued", "running")
+            await jobs_service._queue.join()
+            return ok_id, failed_id, await jobs_service.get_job(ok_id)
+
+        ok_id, failed_id, job = asyncio.run(_scenario())
+        assert job["status"] == "done" and job["done"] == 5 and job["total"] == 5
+        assert job["stage"] == "finishing" and job["result"] == {"caseId": "case-1"}
+        assert store.docs[failed_id]["status"] == "failed"
+        assert store.docs[failed_id]["error"] == "boom"
+
+    run_logged_test(
+        "test_enqueue_job_runs_handler_and_records_progress",
+        "Ensures background jobs report done/total progress and record failures",
+        "Unit",
+        _assertions,
+    )
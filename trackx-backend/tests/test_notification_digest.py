@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from support import run_logged_test
+
+
+def test_case_update_digest_merges_burst_into_one_notification(monkeypatch: pytest.MonkeyPatch):
+    def _assertions():
+        from services import notification_digest
+
+        sent = []
+
+        async def _fake_bulk(recipients, title, message, notification_type, metadata=None):
+            sent.append({"recipients": list(recipients), "message": message, "metadata": metadata})
+            return {"success": True, "delivered": len(recipients)}
+
+        members = {"u1", "u2", "u3", "u4"}
+
+        async def _current_members(case_id):
+            return set(members)
+
+        monkeypatch.setattr(notification_digest, "add_notifications_bulk", _fake_bulk)
+        monkeypatch.setattr(notification_digest, "_current_members", _current_members)
+        monkeypatch.setattr(notification_digest, "NOTIFICATION_DIGEST_WINDOW_SECONDS", 0.05)
+
+        async def _scenario():
+            edits = [("status", "open", "review")], [("status", "review", "closed")], [("urgency", "low", "high")]
+            for recipients, changes in zip((["u1", "u3"], ["u1", "u2", "u3"], ["u1", "u2"]), edits):
+                notification_digest.queue_case_update("c1", "Case", recipients, changes)
+            notification_digest.queue_case_update("c1", "Case", ["u1", "u2"], [("region", "WC", "GP")])
+            notification_digest.queue_case_update("c1", "Case", ["u1", "u2"], [("region", "GP", "WC")])
+            # u4 only saw an edit that was undone within the window
+            notification_digest.queue_case_update("c1", "Case", ["u4"], [("region", "GP", "WC")])
+            notification_digest.queue_case_update("c1", "Case", ["u4"], [("region", "WC", "GP")])
+            members.discard("u3")  # removed from the case before the window closed
+            assert not sent
+            await asyncio.sleep(0.15)
+
+        asyncio.run(_scenario())
+        by_user = {uid: digest for digest in sent for uid in digest["recipients"]}
+        assert set(by_user) == {"u1", "u2"}
+        assert by_user["u1"]["metadata"] == {"caseId": "c1", "edits": 5}
+        assert "status changed from 'open' to 'closed'" in by_user["u1"]["message"]
+        assert "urgency changed from 'low' to 'high'" in by_user["u1"]["message"]
+        assert "region" not in by_user["u1"]["message"]
+        # u2 joined at the second save: it never hears about the first one
+        assert by_user["u2"]["metadata"] == {"caseId": "c1", "edits": 4}
+        assert "status changed from 'review' to 'closed'" in by_user["u2"]["message"]
+
+    run_logged_test(
+        "test_case_update_digest_merges_burst_into_one_notification",
+        "Ensures rapid case edits are coalesced per recipient and only reach current case members",
+        "Unit",
+        _assertions,
+    )
+
+
+def test_case_update_digest_logs_a_failed_flush(monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture):
+    def _assertions():
+        from services import notification_digest
+
+        async def _failing_send(case_id, entry):
+            raise RuntimeError("firestore down")
+
+        monkeypatch.setattr(notification_digest, "_send_digest", _failing_send)
+        monkeypatch.setattr(notification_digest, "NOTIFICATION_DIGEST_WINDOW_SECONDS", 0.01)
+
+        async def _scenario():
+            notification_digest.queue_case_update("c9", "Case", ["u1"], [("status", "open", "closed")])
+            await asyncio.sleep(0.05)
+
+        with caplog.at_level("ERROR", logger=notification_digest.__name__):
+            asyncio.run(_scenario())
+        assert any("c9" in record.getMessage() and "firestore down" in record.getMessage() for record in caplog.records)
+
+    run_logged_test(
+        "test_case_update_digest_logs_a_failed_flush",
+        "Ensures a digest flush that fails is logged instead of being silently dropped",
+        "Unit",
+        _assertions,
+    )
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from support import FakeSnapshot, run_logged_test
+
+
+def test_notification_hub_shares_one_listener_per_user(monkeypatch: pytest.MonkeyPatch):
+    def _assertions():
+        import threading
+        from types import SimpleNamespace
+        from services import notification_stream
+
+        watches = []
+
+        class _Watch:
+            def __init__(self, callback):
+                self.callback = callback
+                self.stopped = False
+
+            def unsubscribe(self):
+                self.stopped = True
+
+        class _Query:
+            def collection(self, name):
+                return self
+
+            def document(self, doc_id):
+                return self
+
+            def where(self, *args):
+                return self
+
+            def on_snapshot(self, callback):
+                watches.append(_Watch(callback))
+                return watches[-1]
+
+        monkeypatch.setattr(notification_stream, "db", _Query())
+        hub = notification_stream.NotificationHub()
+
+        async def _scenario():
+            first = await hub.subscribe("u1")
+            second = await hub.subscribe("u1")
+            assert len(watches) == 1 and hub.active_listeners() == 1
+
+            change = SimpleNamespace(
+                type=SimpleNamespace(name="ADDED"),
+                document=FakeSnapshot("n1", {"title": "Hello", "read": False}),
+            )
+            # Firestore invokes listeners from its own thread
+            thread = threading.Thread(target=watches[0].callback, args=([], [change], None))
+            thread.start()
+            thread.join()
+
+            events = [await notification_stream.next_event(s, 1.0) for s in (first, second)]
+            hub.unsubscribe("u1", first)
+            assert not watches[0].stopped
+            hub.unsubscribe("u1", second)
+            return events
+
+        events = asyncio.run(_scenario())
+        assert all(e == {"event": "notification", "data": {"title": "Hello", "read": False, "id": "n1"}} for e in events)
+        assert watches[0].stopped and hub.active_listeners() == 0
+
+    run_logged_test(
+        "test_notification_hub_shares_one_listener_per_user",
+        "Ensures streamed notifications reach every open stream through a single listener",
+        "Unit",
+        _assertions,
+    )
@@ -0,0 +1,258 @@
+import asyncio
+
+import pytest
+
+from support import FakeSnapshot, run_logged_test
+
+
+def test_fetch_notifications_page_queries_one_page_with_cursor(monkeypatch: pytest.MonkeyPatch):
+    def _assertions():
+        from services import notifications_service
+
+        class _Count:
+            value = 42
+
+        class _Query:
+            def __init__(self, calls, docs):
+                self.calls = calls
+                self.docs = docs
+
+            def __getattr__(self, name):
+                def _record(*args, **kwargs):
+                    self.calls.append((name, args, kwargs.get("direction")))
+                    return self
+                return _record
+
+            def count(self):
+                self.calls.append(("count", (), None))
+                return type("_Agg", (), {"get": staticmethod(lambda: [[_Count()]])})()
+
+            def stream(self):
+                return self.docs
+
+        docs = [
+            FakeSnapshot(f"n{i}", {"timestamp": f"2025-01-0{9 - i}T00:00:00", "type": "COMMENT"})
+            for i in range(3)
+        ]
+        calls: list = []
+        query = _Query(calls, docs)
+
+        class _Db:
+            def collection(self, name):
+                return query
+
+        monkeypatch.setattr(notifications_service, "db", _Db())
+
+        items, next_cursor, total = asyncio.run(
+            notifications_service.fetch_notifications_page("u1", limit=2, notification_type="COMMENT")
+        )
+        assert [item["id"] for item in items] == ["n0", "n1"]
+        assert total == 42
+        assert ("where", ("type", "==", "COMMENT"), None) in calls
+        assert ("limit", (3,), None) in calls
+        assert any(name == "order_by" and args == ("timestamp",) for name, args, _ in calls)
+
+        position = notifications_service._decode_notification_cursor(next_cursor)
+        assert position == {"timestamp": "2025-01-08T00:00:00", notifications_service.DOCUMENT_ID: "n1"}
+
+        calls.clear()
+        asyncio.run(notifications_service.fetch_notifications_page("u1", limit=2, cursor=next_cursor, include_total=False))
+        assert ("start_after", (position,), None) in calls
+        assert not any(name == "count" for name, _, _ in calls)
+
+        # A bad cursor is an error, never a silent restart from the first page
+        calls.clear()
+        with pytest.raises(ValueError):
+            asyncio.run(notifications_service.fetch_notifications_page("u1", limit=2, cursor="garbage"))
+        assert not any(name == "limit" for name, _, _ in calls)
+
+    run_logged_test(
+        "test_fetch_notifications_page_queries_one_page_with_cursor",
+        "Checks notification pages are ordered, limited and resumed in Firestore with a count aggregation",
+        "Unit",
+        _assertions,
+    )
+
+
+def test_add_notification_increments_unread_counters_in_same_batch(monkeypatch: pytest.MonkeyPatch, recording_db):
+    def _assertions():
+        from google.cloud.firestore_v1.transforms import Increment
+        from services import notifications_service
+
+        monkeypatch.setattr(notifications_service, "db", recording_db)
+        result = asyncio.run(notifications_service.add_notification("u1", "Hi", "Msg", "COMMENT"))
+
+        assert result["success"] is True
+        assert len(recording_db.commits) == 1
+        (_, note_path, note, _), (op, user_path, counters, _) = recording_db.commits[0]
+        assert note_path.startswith("users/u1/notifications/") and note["read"] is False
+        assert user_path == "users/u1" and op == "update"
+        assert isinstance(counters["unreadCount"], Increment) and counters["unreadCount"].value == 1
+        assert counters["unreadByType.COMMENT"].value == 1
+
+        # A recipient without a user document gets nothing, so no stub user is created
+        recording_db.commits.clear()
+        recording_db.missing.add("users/ghost")
+        result = asyncio.run(notifications_service.add_notifications_bulk(["ghost", "u1"], "Hi", "Msg", "case-update"))
+        assert result == {"success": True, "delivered": 1}
+        assert [path for _, path, _, _ in recording_db.commits[0] if path.count("/") == 1] == ["users/u1"]
+        assert "unreadByType.`case-update`" in recording_db.commits[0][1][2]
+
+    run_logged_test(
+        "test_add_notification_increments_unread_counters_in_same_batch",
+        "Ensures new notifications bump unreadCount and the per-type counter atomically",
+        "Unit",
+        _assertions,
+    )
+
+
+def test_fetch_unread_counts_recounts_counters_created_by_increments(monkeypatch: pytest.MonkeyPatch):
+    def _assertions():
+        from services import notifications_service
+
+        # An increment created unreadCount on a user with two older unread notifications
+        user = {"unreadCount": 1, "unreadByType": {"COMMENT": 1}}
+        unread = [{"type": "COMMENT"}, {"type": "COMMENT"}, {"type": "case-update"}]
+        recounts = []
+
+        class _Query:
+            def where(self, *args):
+                return self
+
+            def select(self, _fields):
+                return self
+
+        class _UserRef:
+            def collection(self, name):
+                return _Query()
+
+            def get(self, field_paths=None, transaction=None):
+                return FakeSnapshot("u1", dict(user))
+
+        class _Transaction:
+            def get(self, query):
+                recounts.append(1)
+                return [FakeSnapshot(str(i), n) for i, n in enumerate(unread)]
+
+            def set(self, ref, data, merge=None):
+                user.update(data)
+
+        class _Db:
+            def collection(self, name):
+                return self
+
+            def document(self, doc_id):
+                return _UserRef()
+
+            def transaction(self):
+                return _Transaction()
+
+        monkeypatch.setattr(notifications_service, "db", _Db())
+        monkeypatch.setattr(notifications_service.firestore, "transactional", lambda fn: fn)
+
+        counts = asyncio.run(notifications_service.fetch_unread_counts("u1"))
+        assert counts == {"unreadCount": 3, "unreadByType": {"COMMENT": 2, "case-update": 1}}
+        assert user["unreadCountersVersion"] == notifications_service.UNREAD_COUNTERS_VERSION
+
+        # Seeded counters are trusted from then on
+        asyncio.run(notifications_service.fetch_unread_counts("u1"))
+        assert len(recounts) == 1
+
+    run_logged_test(
+        "test_fetch_unread_counts_recounts_counters_created_by_increments",
+        "Ensures counters created by increments are recounted once and then trusted",
+        "Unit",
+        _assertions,
+    )
+
+
+def test_add_notifications_bulk_chunks_recipients_into_batches(monkeypatch: pytest.MonkeyPatch, recording_db):
+    def _assertions():
+        from services import notifications_service
+
+        monkeypatch.setattr(notifications_service, "db", recording_db)
+        recipients = [f"u{i}" for i in range(600)] + ["u1", "", None]
+        result = asyncio.run(notifications_service.add_notifications_bulk(recipients, "T", "M", "case-update"))
+
+        assert result == {"success": True, "delivered": 600}
+        assert len(recording_db.commits) == 3
+        user_writes = [path for ops in recording_db.commits for _, path, _, _ in ops if path.count("/") == 1]
+        assert sorted(user_writes) == sorted(f"users/u{i}" for i in range(600))
+
+    run_logged_test(
+        "test_add_notifications_bulk_chunks_recipients_into_batches",
+        "Ensures notification fan-out deduplicates recipients and stays within batch limits",
+        "Unit",
+        _assertions,
+    )
+
+
+def test_mark_all_notifications_read_processes_chunks_with_counter_decrements(monkeypatch: pytest.MonkeyPatch):
+    def _assertions():
+        from services import notifications_service
+
+        unread = {f"n{i}": {"type": "COMMENT" if i % 2 else "case-update", "read": False} for i in range(5)}
+        commits = []
+
+        class _DocRef:
+            def __init__(self, doc_id):
+                self.id = doc_id
+
+        class _Query:
+            def __getattr__(self, name):
+                return lambda *args, **kwargs: self
+
+            def limit(self, n):
+                self._limit = n
+                return self
+
+            def stream(self):
+                docs = []
+                for doc_id, data in list(unread.items())[: self._limit]:
+                    snap = FakeSnapshot(doc_id, data)
+                    snap.reference = _DocRef(doc_id)
+                    docs.append(snap)
+                return docs
+
+        class _Batch:
+            def __init__(self):
+                self.ops = []
+
+            def update(self, ref, data):
+                self.ops.append(("update", ref.id))
+
+            def set(self, ref, data, merge=False):
+                self.ops.append(("counters", data["unreadCount"].value))
+
+            def commit(self):
+                for op, value in self.ops:
+                    if op == "update":
+                        unread.pop(value)
+                commits.append(self.ops)
+
+        class _Db:
+            def collection(self, name):
+                return _Query()
+
+            def batch(self):
+                return _Batch()
+
+        monkeypatch.setattr(notifications_service, "db", _Db())
+        monkeypatch.setattr(notifications_service, "NOTIFICATION_CHUNK_SIZE", 3)
+        monkeypatch.setattr(
+            notifications_service, "recount_unread_notifications",
+            lambda user_id, only_if_unseeded=False: {"unreadCount": len(unread), "unreadByType": {}},
+        )
+
+        result = asyncio.run(notifications_service.mark_all_notifications_read("u1"))
+        assert result["success"] is True and result["updated"] == 5 and result["unreadCount"] == 0
+        # Chunks of two documents plus one counter write each
+        assert [len(ops) for ops in commits] == [3, 3, 2]
+        assert [ops[-1] for ops in commits] == [("counters", -2), ("counters", -2), ("counters", -1)]
+
+    run_logged_test(
+        "test_mark_all_notifications_read_processes_chunks_with_counter_decrements",
+        "Ensures mark-all-read updates notifications in bounded chunks and decrements counters per chunk",
+        "Unit",
+        _assertions,
+    )
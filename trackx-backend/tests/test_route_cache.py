@@ -0,0 +1,81 @@
+import asyncio
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from support import run_logged_test
+
+
+def test_route_cache_serves_repeated_and_overlapping_legs(monkeypatch: pytest.MonkeyPatch, tmp_path: Path):
+    def _assertions():
+        import json as _json
+
+        import httpx
+        from services import route_interpolation
+        from services.route_cache import RouteCache
+
+        requests_seen = []
+
+        def _handler(request: httpx.Request) -> httpx.Response:
+            coords = _json.loads(request.content)["coordinates"]
+            requests_seen.append(coords)
+            geometry = [coords[0]]
+            for (x0, y0), (x1, y1) in zip(coords, coords[1:]):
+                geometry += [[(x0 + x1) / 2, (y0 + y1) / 2], [x1, y1]]
+            way_points = list(range(0, len(geometry), 2))
+            return httpx.Response(
+                200, json={"features": [{"geometry": {"coordinates": geometry}, "properties": {"way_points": way_points}}]}
+            )
+
+        cache = RouteCache(str(tmp_path / "routes.sqlite3"), max_entries=100)
+        monkeypatch.setattr(route_interpolation, "ORS_MAX_WAYPOINTS", 3)
+        monkeypatch.setattr(route_interpolation, "_limiter", route_interpolation.RateLimiter(0))
+        monkeypatch.setattr(route_interpolation, "_ors_unavailable_until", 0.0)
+        monkeypatch.setattr(route_interpolation.route_cache_module, "route_cache", cache)
+        monkeypatch.setattr(
+            route_interpolation, "get_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(_handler))
+        )
+
+        def _points(indices):
+            return [{"lat": float(i), "lng": float(i), "timestamp": f"2024-01-01T00:00:{i:02d}Z"} for i in indices]
+
+        first = asyncio.run(route_interpolation.route_geometry(_points(range(1, 6))))
+        assert len(requests_seen) == 2 and len(cache) == 4
+
+        again = asyncio.run(route_interpolation.route_geometry(_points(range(1, 6))))
+        assert again == first and len(requests_seen) == 2
+
+        # A different case re-travelling part of the corridor, split into different windows
+        overlap = asyncio.run(route_interpolation.route_geometry(_points(range(2, 5))))
+        assert len(requests_seen) == 2
+        assert overlap[0] == [[x / 2, x / 2] for x in range(4, 9)] and overlap[1] == [0, 2, 4]
+
+        small = RouteCache(str(tmp_path / "small.sqlite3"), max_entries=2)
+        small.put_many({"a": [[0, 0]], "b": [[1, 1]]})
+        small.get_many(["a"])
+        small.put_many({"c": [[2, 2]]})
+        assert set(small.get_many(["a", "b", "c"])) == {"a", "c"}
+
+        # Writes below the limit never count the table; re-puts only trigger a recount at the limit
+        counted = RouteCache(str(tmp_path / "counted.sqlite3"), max_entries=20)
+        statements: List[str] = []
+        counted._connect().set_trace_callback(statements.append)
+        for i in range(20):
+            counted.put_many({f"k{i}": [[i, i]]})
+        assert not [s for s in statements if "COUNT" in s]
+        counted.put_many({"k0": [[0, 0]]})
+        assert sum("COUNT" in s for s in statements) == 1 and len(counted) == 20
+        counted.put_many({"k20": [[20, 20]]})
+        assert len(counted) == 18
+        assert set(counted.get_many(["k0", "k1", "k2", "k3", "k20"])) == {"k0", "k20"}
+        cache.close()
+        small.close()
+        counted.close()
+
+    run_logged_test(
+        "test_route_cache_serves_repeated_and_overlapping_legs",
+        "Ensures routed legs are cached locally, reused across windows and cases, and evicted LRU",
+        "Unit",
+        _assertions,
+    )
@@ -0,0 +1,32 @@
+from support import run_logged_test
+
+
+def test_densify_track_resamples_great_circle_with_distance_weighted_times():
+    def _assertions():
+        from services import route_densify
+
+        points = [
+            {"lat": 0.0, "lng": 0.0, "timestamp": "2024-01-01T00:00:00Z"},
+            {"lat": 0.0, "lng": 0.01, "timestamp": "2024-01-01T00:01:40Z"},
+            {"lat": 0.0, "lng": 0.01, "timestamp": "2024-01-01T00:02:00Z"},
+        ]
+        dense = route_densify.densify_track(points, spacing_m=100)
+
+        # ~1112 m leg at 100 m spacing -> 11 samples between the two waypoints
+        assert len(dense) == 1 + 11 + 1 + 1
+        assert dense[0]["timestamp"] == "2024-01-01T00:00:00Z"
+        assert dense[12] == {"lat": 0.0, "lng": 0.01, "timestamp": "2024-01-01T00:01:40Z"}
+        assert dense[-1]["timestamp"] == "2024-01-01T00:02:00Z"
+        assert dense[6]["timestamp"] == "2024-01-01T00:00:50Z"
+        assert abs(dense[6]["lng"] - 0.005) < 1e-9 and abs(dense[6]["lat"]) < 1e-9
+
+        long_leg = route_densify.great_circle_leg(0.0, 0.0, 0.0, 90.0, spacing_m=1_000_000)
+        assert len(long_leg) == 10
+        assert all(abs(lat) < 1e-9 for lat, _, _ in long_leg)
+
+    run_logged_test(
+        "test_densify_track_resamples_great_circle_with_distance_weighted_times",
+        "Ensures offline densification keeps waypoint times and spaces samples and times by distance",
+        "Unit",
+        _assertions,
+    )
@@ -0,0 +1,219 @@
+import asyncio
+
+import pytest
+
+from support import run_logged_test
+
+
+def test_route_geometry_routes_overlapping_windows_and_stitches(monkeypatch: pytest.MonkeyPatch):
+    def _assertions():
+        import json as _json
+
+        import httpx
+        from services import route_interpolation
+        from services.route_cache import RouteCache
+
+        requests_seen = []
+
+        def _handler(request: httpx.Request) -> httpx.Response:
+            coords = _json.loads(request.content)["coordinates"]
+            requests_seen.append(coords)
+            if len(requests_seen) == 1:
+                return httpx.Response(429, headers={"Retry-After": "0"})
+            # Route each leg through its midpoint
+            geometry = [coords[0]]
+            for (x0, y0), (x1, y1) in zip(coords, coords[1:]):
+                geometry += [[(x0 + x1) / 2, (y0 + y1) / 2], [x1, y1]]
+            way_points = list(range(0, len(geometry), 2))
+            return httpx.Response(
+                200, json={"features": [{"geometry": {"coordinates": geometry}, "properties": {"way_points": way_points}}]}
+            )
+
+        monkeypatch.setattr(route_interpolation, "ORS_MAX_WAYPOINTS", 3)
+        monkeypatch.setattr(route_interpolation, "_limiter", route_interpolation.RateLimiter(0))
+        monkeypatch.setattr(route_interpolation.route_cache_module, "route_cache", RouteCache(""))
+        monkeypatch.setattr(
+            route_interpolation, "get_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(_handler))
+        )
+
+        assert [list(w) for w in route_interpolation.split_windows(6, 3)] == [[0, 1, 2], [2, 3, 4], [4, 5]]
+
+        points = [
+            {"lat": float(i), "lng": float(i), "timestamp": f"2024-01-01T00:00:{i:02d}Z"} for i in range(1, 7)
+        ]
+        geometry, anchors, fallback_windows = asyncio.run(route_interpolation.route_geometry(points))
+
+        assert len(requests_seen) == 4  # three windows, one retried after 429
+        assert fallback_windows == 0
+        assert geometry == [[x / 2, x / 2] for x in range(2, 13)]
+        assert anchors == [0, 2, 4, 6, 8, 10]
+
+        interpolated = asyncio.run(route_interpolation.interpolate_points_with_ors(points))
+        assert interpolated[0]["timestamp"] == "2024-01-01T00:00:01Z"
+        assert interpolated[-1]["timestamp"] == "2024-01-01T00:00:06Z"
+
+    run_logged_test(
+        "test_route_geometry_routes_overlapping_windows_and_stitches",
+        "Ensures long tracks are routed in overlapping ORS windows with retries and stitched without duplicate seams",
+        "Unit",
+        _assertions,
+    )
+
+
+def test_interpolate_route_falls_back_offline_when_ors_fails(monkeypatch: pytest.MonkeyPatch):
+    def _assertions():
+        import httpx
+        from services import route_interpolation
+        from services.route_cache import RouteCache
+
+        calls = []
+
+        def _handler(request: httpx.Request) -> httpx.Response:
+            calls.append(request)
+            return httpx.Response(503)
+
+        monkeypatch.setattr(route_interpolation, "_limiter", route_interpolation.RateLimiter(0))
+        monkeypatch.setattr(route_interpolation.route_cache_module, "route_cache", RouteCache(""))
+        monkeypatch.setattr(route_interpolation, "_ors_unavailable_until", 0.0)
+        monkeypatch.setattr(route_interpolation, "_retry_delay", lambda res, attempt: 0.0)
+        monkeypatch.setattr(
+            route_interpolation, "get_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(_handler))
+        )
+
+        points = [
+            {"lat": 0.0, "lng": 0.0, "timestamp": "2024-01-01T00:00:00Z"},
+            {"lat": 0.0, "lng": 0.001, "timestamp": "2024-01-01T00:00:10Z"},
+        ]
+        result = asyncio.run(route_interpolation.interpolate_route(points, "ors"))
+        assert len(calls) == route_interpolation.ORS_MAX_RETRIES
+        assert result["complete"] is False
+        assert len(result["points"]) > 2
+        assert not route_interpolation.ors_available()
+
+        # While ORS is cooling down, requests densify without touching the network
+        again = asyncio.run(route_interpolation.interpolate_route(points, "ors"))
+        assert len(calls) == route_interpolation.ORS_MAX_RETRIES
+        assert again["complete"] is False
+
+        offline = asyncio.run(route_interpolation.interpolate_route(points, "greatcircle"))
+        assert offline["complete"] is True
+        assert offline["points"][-1]["timestamp"] == "2024-01-01T00:00:10Z"
+
+        with pytest.raises(ValueError):
+            asyncio.run(route_interpolation.interpolate_route(points, "teleport"))
+
+    run_logged_test(
+        "test_interpolate_route_falls_back_offline_when_ors_fails",
+        "Ensures ORS failures fall back to great-circle densification and skip ORS during the cooldown",
+        "Unit",
+        _assertions,
+    )
+
+
+def test_time_route_pins_waypoint_times_and_weights_by_distance():
+    def _assertions():
+        from services import route_interpolation
+
+        waypoints = [
+            {"lat": 0.0, "lng": 0.0, "timestamp": "2024-01-01T00:00:00Z"},
+            {"lat": 0.0, "lng": 0.03, "timestamp": "2024-01-01T00:01:00Z"},
+            {"lat": 0.0, "lng": 0.03, "timestamp": "2024-01-01T00:05:00Z"},
+            {"lat": 0.0, "lng": 0.04, "timestamp": "2024-01-01T00:06:00Z"},
+        ]
+        # Dense vertices early in the first leg, one long segment after them
+        route = [[0.0, 0.0], [0.001, 0.0], [0.002, 0.0], [0.03, 0.0], [0.04, 0.0]]
+        timed = route_interpolation.time_route(waypoints, route, [0, 3, 3, 4])
+
+        assert [p["timestamp"] for p in timed] == [
+            "2024-01-01T00:00:00Z",
+            "2024-01-01T00:00:02Z",
+            "2024-01-01T00:00:04Z",
+            "2024-01-01T00:01:00Z",
+            "2024-01-01T00:05:00Z",
+            "2024-01-01T00:06:00Z",
+        ]
+        assert timed[3]["lng"] == timed[4]["lng"] == 0.03
+
+        # Missing anchors fall back to the window ends
+        ends_only = route_interpolation.time_route(waypoints, route, [0, None, None, 4])
+        assert ends_only[0]["timestamp"] == "2024-01-01T00:00:00Z"
+        assert ends_only[-1]["timestamp"] == "2024-01-01T00:06:00Z"
+        assert ends_only[3]["timestamp"] == "2024-01-01T00:04:30Z"
+
+        v1 = route_interpolation.interpolation_source_version("track-a")
+        assert v1 == route_interpolation.interpolation_source_version("track-a")
+        assert v1 != route_interpolation.interpolation_source_version("track-b")
+
+    run_logged_test(
+        "test_time_route_pins_waypoint_times_and_weights_by_distance",
+        "Ensures interpolated timestamps keep waypoint anchors, follow distance along the route and record dwell",
+        "Unit",
+        _assertions,
+    )
+
+
+def test_interpolate_route_runs_track_wide_work_on_the_pool(monkeypatch: pytest.MonkeyPatch):
+    def _assertions():
+        from services import route_interpolation
+
+        offloaded = []
+        real_run_blocking = route_interpolation.run_blocking
+
+        async def _recording_run_blocking(func, *args, **kwargs):
+            offloaded.append(getattr(func, "__name__", repr(func)))
+            return await real_run_blocking(func, *args, **kwargs)
+
+        monkeypatch.setattr(route_interpolation, "run_blocking", _recording_run_blocking)
+        points = [
+            {"lat": 0.0, "lng": 0.0, "timestamp": "2024-01-01T00:00:00Z"},
+            {"lat": 0.0, "lng": 0.01, "timestamp": "2024-01-01T00:01:40Z"},
+        ]
+        result = asyncio.run(route_interpolation.interpolate_route(points, "greatcircle"))
+        assert len(result["points"]) > 2
+        assert offloaded == ["sanitize_points", "densify_track"]
+
+    run_logged_test(
+        "test_interpolate_route_runs_track_wide_work_on_the_pool",
+        "Ensures sanitizing and densifying whole tracks runs off the event loop",
+        "Unit",
+        _assertions,
+    )
+
+
+def test_route_window_does_not_wait_out_a_long_retry_after(monkeypatch: pytest.MonkeyPatch):
+    def _assertions():
+        import httpx
+        from services import route_interpolation
+
+        calls, sleeps = [], []
+
+        def _handler(request: httpx.Request) -> httpx.Response:
+            calls.append(request)
+            return httpx.Response(429, headers={"Retry-After": "3600"})
+
+        async def _sleep(delay):
+            sleeps.append(delay)
+
+        monkeypatch.setattr(route_interpolation, "_limiter", route_interpolation.RateLimiter(0))
+        monkeypatch.setattr(route_interpolation, "_ors_unavailable_until", 0.0)
+        monkeypatch.setattr(route_interpolation.asyncio, "sleep", _sleep)
+
+        assert route_interpolation._retry_delay(httpx.Response(429, headers={"Retry-After": "2"}), 0) == 2.0
+        assert route_interpolation._retry_delay(httpx.Response(429, headers={"Retry-After": "3600"}), 0) is None
+
+        async def _scenario():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(_handler)) as client:
+                return await route_interpolation._route_window(client, [
+                    {"lat": 0.0, "lng": 0.0}, {"lat": 0.0, "lng": 0.001},
+                ])
+
+        assert asyncio.run(_scenario()) is None
+        assert len(calls) == 1 and sleeps == []
+        assert not route_interpolation.ors_available()
+
+    run_logged_test(
+        "test_route_window_does_not_wait_out_a_long_retry_after",
+        "Ensures a Retry-After above the cap falls back to densification instead of sleeping",
+        "Unit",
+        _assertions,
+    )
@@ -1,34 +1,10 @@
 from datetime import datetime, timedelta, timezone
-from pathlib import Path
-from typing import Callable, Iterable, List, Tuple
+from typing import Iterable, List, Tuple
 
 import pytest
 
 from services import case_service, derivations_service
-
-LOG_FILE = Path(__file__).resolve().parent / "service_unit_tests.log"
-LOG_FILE.write_text("name | description | type | status\n")
-
-
-def _log_test_result(name: str, description: str, test_type: str, passed: bool) -> None:
-    status = "PASS" if passed else "FAIL"
-    with LOG_FILE.open("a") as handle:
-        handle.write(f"{name} | {description} | {test_type} | {status}\n")
-
-
-def _run_logged_test(
-    name: str,
-    description: str,
-    test_type: str,
-    assertions: Callable[[], None],
-) -> None:
-    try:
-        assertions()
-    except AssertionError:
-        _log_test_result(name, description, test_type, False)
-        raise
-    else:
-        _log_test_result(name, description, test_type, True)
+from support import run_logged_test
 
 
 def test_normalize_case_user_fields_merges_deduplicates():
@@ -45,7 +21,7 @@ def test_normalize_case_user_fields_merges_deduplicates():
         assert normalized["isShared"] is True
         assert "userID" not in normalized and "userIDs" not in normalized
 
-    _run_logged_test(
+    run_logged_test(
         "test_normalize_case_user_fields_merges_deduplicates",
         "Ensures legacy user fields collapse into a single canonical structure",
         "Unit",
@@ -61,7 +37,7 @@ def test_normalize_case_user_fields_single_user_not_shared():
         assert normalized["userId"] == "solo"
         assert normalized["isShared"] is False
 
-    _run_logged_test(
+    run_logged_test(
         "test_normalize_case_user_fields_single_user_not_shared",
         "Confirms single-user cases stay private after normalization",
         "Unit",
@@ -80,7 +56,7 @@ def test_extract_user_ids_from_payload_dict_prioritises_primary_user():
         assert primary == "user-1"
         assert user_ids == ["user-1", "user-2", "user-3", "user-4"]
 
-    _run_logged_test(
+    run_logged_test(
         "test_extract_user_ids_from_payload_dict_prioritises_primary_user",
         "Validates that mixed payload keys produce a unique, primary-first list",
         "Unit",
@@ -95,7 +71,7 @@ def test_extract_user_ids_from_payload_dict_handles_missing_primary():
         assert primary == "alpha"
         assert user_ids == ["alpha", "beta"]
 
-    _run_logged_test(
+    run_logged_test(
         "test_extract_user_ids_from_payload_dict_handles_missing_primary",
         "Checks helper chooses sensible default primary when none supplied",
         "Unit",
@@ -110,7 +86,7 @@ def test_extract_user_ids_from_payload_dict_skips_falsey_entries():
         assert primary == "lead"
         assert user_ids == ["lead", "contributor"]
 
-    _run_logged_test(
+    run_logged_test(
         "test_extract_user_ids_from_payload_dict_skips_falsey_entries",
         "Ensures helper discards blank user identifiers when building membership list",
         "Unit",
@@ -126,7 +102,7 @@ def test_case_accessible_to_user_respects_membership():
         assert case_service._case_accessible_to_user(shared_case, "beta") is True
         assert case_service._case_accessible_to_user(private_case, "delta") is False
 
-    _run_logged_test(
+    run_logged_test(
         "test_case_accessible_to_user_respects_membership",
         "Checks that helper honours membership rules when evaluating access",
         "Unit",
@@ -140,7 +116,7 @@ def test_case_accessible_to_user_without_user_id_allows_access():
         assert case_service._case_accessible_to_user(case_data, "") is True
         assert case_service._case_accessible_to_user(case_data, None) is True
 
-    _run_logged_test(
+    run_logged_test(
         "test_case_accessible_to_user_without_user_id_allows_access",
         "Verifies anonymous lookups can see case metadata",
         "Unit",
@@ -154,7 +130,7 @@ def test_case_accessible_to_user_defaults_to_owner_when_list_missing():
         assert case_service._case_accessible_to_user(case_data, "owner") is True
         assert case_service._case_accessible_to_user(case_data, "other") is False
 
-    _run_logged_test(
+    run_logged_test(
         "test_case_accessible_to_user_defaults_to_owner_when_list_missing",
         "Confirms access logic still enforces ownership when no shared list is stored",
         "Unit",
@@ -203,7 +179,7 @@ def test_sanitize_firestore_data_converts_supported_types(monkeypatch: pytest.Mo
         assert sanitized["nested"]["list"][1] == "child"
         assert sanitized["nested"]["list"][2]["ts"].startswith("2024-01-01T12:00:00")
 
-    _run_logged_test(
+    run_logged_test(
         "test_sanitize_firestore_data_converts_supported_types",
         "Guarantees Firestore helper coerces timestamps and document references predictably",
         "Unit",
@@ -224,7 +200,7 @@ def test_sanitize_firestore_data_preserves_primitives():
         assert sanitized["nested"]["value"] == 42.5
         assert sanitized["nested"]["flag"] is None
 
-    _run_logged_test(
+    run_logged_test(
         "test_sanitize_firestore_data_preserves_primitives",
         "Checks sanitize helper leaves primitive values untouched",
         "Unit",
@@ -237,7 +213,7 @@ def test_haversine_meters_basic_distance():
         meters = derivations_service.haversine_meters(0, 0, 0, 1)
         assert 110_000 <= meters <= 112_500
 
-    _run_logged_test(
+    run_logged_test(
         "test_haversine_meters_basic_distance",
         "Validates core geospatial distance calculation near the equator",
         "Unit",
@@ -252,7 +228,7 @@ def test__to_dt_handles_iso_strings():
         assert dt.tzinfo is not None
         assert dt.isoformat().startswith("2024-01-01T12:30:00")
 
-    _run_logged_test(
+    run_logged_test(
         "test__to_dt_handles_iso_strings",
         "Ensures Firestore timestamp parser accepts ISO strings with Z suffix",
         "Unit",
@@ -265,7 +241,7 @@ def test__bucket_hour_formats_range():
         bucket = derivations_service._bucket_hour(datetime(2024, 1, 1, 15, 45))
         assert bucket == "15:00-15:59"
 
-    _run_logged_test(
+    run_logged_test(
         "test__bucket_hour_formats_range",
         "Confirms hour bucketing helper returns readable ranges",
         "Unit",
@@ -289,7 +265,7 @@ def test_compute_rollup_from_allpoints_detects_stops():
         assert rollup["longestDwell"] is not None
         assert rollup["longestDwell"]["seconds"] >= 360
 
-    _run_logged_test(
+    run_logged_test(
         "test_compute_rollup_from_allpoints_detects_stops",
         "Verifies stop clustering summarises extended stays accurately",
         "Unit",
@@ -313,7 +289,7 @@ def test_compute_rollup_from_allpoints_events_align_with_stops():
             assert event["source"] == "derived-v1"
             assert event["dwellSeconds"] >= 360
 
-    _run_logged_test(
+    run_logged_test(
         "test_compute_rollup_from_allpoints_events_align_with_stops",
         "Validates derived events mirror stop detection output",
         "Unit",
@@ -337,7 +313,7 @@ def test_compute_rollup_from_allpoints_flags_anomalies():
         assert anomaly["type"] == "big_jump"
         assert int(anomaly["meters"]) > 10000
 
-    _run_logged_test(
+    run_logged_test(
         "test_compute_rollup_from_allpoints_flags_anomalies",
         "Ensures sudden, long-distance jumps are reported as anomalies",
         "Unit",
@@ -356,7 +332,7 @@ def test_compute_rollup_from_allpoints_small_moves_have_no_anomalies():
         rollup = derivations_service.compute_rollup_from_allpoints(all_points)
         assert rollup["anomalies"] == []
 
-    _run_logged_test(
+    run_logged_test(
         "test_compute_rollup_from_allpoints_small_moves_have_no_anomalies",
         "Ensures short-range movements within threshold are not flagged as anomalies",
         "Unit",
@@ -370,7 +346,7 @@ def test_compute_rollup_from_allpoints_with_invalid_points_returns_zero():
         rollup = derivations_service.compute_rollup_from_allpoints(all_points)
         assert rollup == {"totalPoints": 0}
 
-    _run_logged_test(
+    run_logged_test(
         "test_compute_rollup_from_allpoints_with_invalid_points_returns_zero",
         "Confirms helper exits early when no valid geo-temporal samples exist",
         "Unit",
@@ -396,7 +372,7 @@ def test_compute_rollup_from_allpoints_limits_active_hours_to_top_six():
         assert len(buckets) <= 6
         assert buckets[0] == "07:00-07:59"
 
-    _run_logged_test(
+    run_logged_test(
         "test_compute_rollup_from_allpoints_limits_active_hours_to_top_six",
         "Checks active hour summary trims to the six busiest windows",
         "Unit",
@@ -425,7 +401,7 @@ def test_generate_czml_successful_path():
         assert carto_points[0][0] == 0
         assert carto_points[-1][1:3] == (18.42, -33.92)
 
-    _run_logged_test(
+    run_logged_test(
         "test_generate_czml_successful_path",
         "Validates CZML path creation with three ordered samples",
         "Integration",
@@ -448,7 +424,7 @@ def test_generate_czml_ignores_invalid_timestamps():
         assert carto_points[0][0] == 0
         assert carto_points[-1][1:3] == (18.42, -33.92)
 
-    _run_logged_test(
+    run_logged_test(
         "test_generate_czml_ignores_invalid_timestamps",
         "Ensures bad timestamps are skipped while valid ones render",
         "Integration",
@@ -469,7 +445,7 @@ def test_generate_czml_sets_epoch_to_first_timestamp():
         assert czml[1]["position"]["epoch"] == expected_epoch
         assert czml[0]["clock"]["interval"].startswith(expected_epoch)
 
-    _run_logged_test(
+    run_logged_test(
         "test_generate_czml_sets_epoch_to_first_timestamp",
         "Checks CZML epoch anchors to the earliest valid timestamp",
         "Integration",
@@ -484,7 +460,7 @@ def test_generate_czml_requires_minimum_points():
         with pytest.raises(ValueError):
             case_service.generate_czml("case-789", points)
 
-    _run_logged_test(
+    run_logged_test(
         "test_generate_czml_requires_minimum_points",
         "Confirms generator rejects traces with fewer than two valid samples",
         "Integration",
@@ -507,7 +483,7 @@ def test_generate_czml_preserves_chronological_order():
         assert times[0] == 0
         assert times[-1] == (20 * 60)
 
-    _run_logged_test(
+    run_logged_test(
         "test_generate_czml_preserves_chronological_order",
         "Checks CZML cartographic samples are sorted by timestamp offsets",
         "Integration",
@@ -524,7 +500,7 @@ def test_generate_czml_raises_when_all_timestamps_invalid():
         with pytest.raises(ValueError):
             case_service.generate_czml("case-invalid", points)
 
-    _run_logged_test(
+    run_logged_test(
         "test_generate_czml_raises_when_all_timestamps_invalid",
         "Ensures generator refuses traces with no usable timestamps",
         "Integration",
@@ -0,0 +1,31 @@
+from support import run_logged_test
+
+
+def test_simplify_track_keeps_turns_and_limit_points_keeps_ends():
+    def _assertions():
+        from services.track_simplify import limit_points, simplify_track
+
+        # East along the equator, then a right-angle turn north
+        east = [{"lat": 0.0, "lng": i * 0.001, "timestamp": f"t{i}"} for i in range(11)]
+        north = [{"lat": i * 0.001, "lng": 0.01, "timestamp": f"n{i}"} for i in range(1, 11)]
+        track = east + north
+
+        simplified = simplify_track(track, tolerance_m=5)
+        assert [p["timestamp"] for p in simplified] == ["t0", "t10", "n10"]
+        assert simplify_track(track, tolerance_m=5000) == [track[0], track[-1]]
+
+        wobble = [dict(p) for p in east]
+        wobble[5]["lat"] = 0.00007  # ~8 m of GPS jitter
+        assert [p["timestamp"] for p in simplify_track(wobble, tolerance_m=10)] == ["t0", "t10"]
+        assert "t5" in [p["timestamp"] for p in simplify_track(wobble, tolerance_m=5)]
+
+        limited = limit_points(track, 5)
+        assert len(limited) == 5 and limited[0] is track[0] and limited[-1] is track[-1]
+        assert limit_points(track, None) == track
+
+    run_logged_test(
+        "test_simplify_track_keeps_turns_and_limit_points_keeps_ends",
+        "Ensures Douglas-Peucker keeps corners, drops straight runs, and point budgets keep both ends",
+        "Unit",
+        _assertions,
+    )
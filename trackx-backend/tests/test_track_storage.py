@@ -0,0 +1,128 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from support import FakeSnapshot, PathRef, run_logged_test
+
+
+def test_track_chunk_round_trips_samples(recording_db):
+    def _assertions():
+        from services import track_storage
+
+        points = [
+            {"lat": -33.9248685, "lng": 18.4240553, "timestamp": "2025-01-01T10:00:00.250000Z", "description": "start"},
+            {"lat": -33.9251, "lng": 18.4249, "timestamp": None, "description": None},
+            {"lat": -33.93, "lng": 18.43, "timestamp": datetime(2025, 1, 1, 10, 5, tzinfo=timezone.utc), "description": None},
+        ]
+        chunk = track_storage.encode_chunk(points)
+        assert chunk["count"] == 3 and chunk["untimed"] == [1]
+        assert chunk["descriptions"] == {"0": "start"}
+
+        decoded = track_storage.decode_chunk(chunk)
+        for original, restored in zip(points, decoded):
+            assert restored["lat"] == pytest.approx(original["lat"], abs=1e-7)
+            assert restored["lng"] == pytest.approx(original["lng"], abs=1e-7)
+        assert decoded[0]["timestamp"] == datetime(2025, 1, 1, 10, 0, 0, 250000, tzinfo=timezone.utc)
+        assert decoded[1]["timestamp"] is None
+        assert decoded[2]["timestamp"] == points[2]["timestamp"]
+        assert decoded[0]["description"] == "start"
+
+        # Legacy allPoints may hold null, missing or non-numeric coordinates
+        legacy = points + [
+            {"lat": None, "lng": 18.4, "timestamp": "2025-01-01T10:06:00Z"},
+            {"lng": 18.4, "timestamp": "2025-01-01T10:07:00Z"},
+            {"lat": "n/a", "lng": 18.4, "timestamp": None, "description": "bad"},
+        ]
+        kept, skipped = track_storage.valid_samples(legacy)
+        assert kept == points and skipped == 3
+        legacy_chunk = track_storage.encode_chunk(legacy)
+        assert legacy_chunk["count"] == 3 and legacy_chunk["descriptions"] == {"0": "start"}
+
+        manifest = track_storage.write_chunked_track(recording_db, PathRef("cases/c1"), legacy)
+        assert manifest["pointCount"] == 3 and manifest["skippedPoints"] == 3
+        assert [path for ops in recording_db.commits for _, path, _, _ in ops] == [
+            f"cases/c1/{track_storage.CHUNK_COLLECTION}/000000"
+        ]
+
+    run_logged_test(
+        "test_track_chunk_round_trips_samples",
+        "Checks delta-encoded track chunks restore coordinates, times and descriptions",
+        "Unit",
+        _assertions,
+    )
+
+
+def test_pending_chunked_track_reads_empty_until_written():
+    def _assertions():
+        from services import track_storage
+
+        chunks: dict = {}
+
+        class _ChunkRef:
+            def __init__(self, doc_id):
+                self.id = doc_id
+
+        class _ChunkSnapshot(FakeSnapshot):
+            def __init__(self, doc_id, data):
+                super().__init__(doc_id, data)
+                self.reference = _ChunkRef(doc_id)
+
+        class _Chunks:
+            def document(self, doc_id):
+                return _ChunkRef(doc_id)
+
+            def order_by(self, _field):
+                return self
+
+            def select(self, _fields):
+                return self
+
+            def stream(self):
+                return [_ChunkSnapshot(k, chunks[k]) for k in sorted(chunks)]
+
+        class _CaseRef:
+            def collection(self, name):
+                assert name == track_storage.CHUNK_COLLECTION, "pending tracks must not fall back to allPoints"
+                return _Chunks()
+
+        class _Batch:
+            def set(self, ref, data):
+                chunks[ref.id] = data
+
+            def delete(self, ref):
+                chunks.pop(ref.id, None)
+
+            def commit(self):
+                pass
+
+        class _Db:
+            def batch(self):
+                return _Batch()
+
+        case_ref = _CaseRef()
+        pending = {"trackStorage": track_storage.pending_manifest()}
+        assert track_storage.is_chunked(pending) and track_storage.is_pending(pending)
+
+        points = [{"lat": -33.92, "lng": 18.42, "timestamp": "2025-01-01T10:00:00Z"}]
+        # A partly written chunk is never served while the manifest is pending
+        chunks["000000"] = track_storage.encode_chunk(points)
+        assert track_storage.load_track_points(case_ref, pending) == []
+        assert track_storage.load_track_points(case_ref, {"trackStorage": {**pending["trackStorage"], "status": "failed"}}) == []
+
+        manifest = track_storage.write_chunked_track(_Db(), case_ref, points, pending["trackStorage"])
+        assert "status" not in manifest and manifest["chunkCount"] == 1 and manifest["pointCount"] == 1
+        assert not track_storage.is_pending({"trackStorage": manifest})
+        assert len(track_storage.load_track_points(case_ref, {"trackStorage": manifest})) == 1
+
+        chunks["000001"] = chunks["000000"]  # left behind by a failed write
+        track_storage.delete_chunked_track(_Db(), case_ref, first_chunk=1)
+        assert list(chunks) == ["000000"]
+        track_storage.delete_chunked_track(_Db(), case_ref)
+        assert chunks == {}
+
+    run_logged_test(
+        "test_pending_chunked_track_reads_empty_until_written",
+        "Ensures a pending chunk manifest hides partial chunks and becomes regular once written",
+        "Unit",
+        _assertions,
+    )
@@ -0,0 +1,47 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from support import run_logged_test
+
+
+def test_track_upload_parsers_stream_csv_and_gpx_batches():
+    def _assertions():
+        import io
+        from services import track_upload
+
+        csv_bytes = (
+            "Latitude,Longitude,Timestamp,Description\n"
+            "-33.92,18.42,2025-01-01T10:00:00Z,Depot\n"
+            "not-a-number,18.43,2025-01-01T10:01:00Z,\n"
+            "-33.93,18.44,2025-01-01T10:02:00Z,\n"
+            "-33.94,200,2025-01-01T10:03:00Z,\n"
+            "-33.95,18.45,,\n"
+        ).encode()
+        batches = list(track_upload.iter_csv_batches(io.BytesIO(csv_bytes), batch_size=2))
+        assert [len(samples) for samples, _ in batches] == [1, 1, 1]
+        assert [row for _, rejected_rows in batches for row in rejected_rows] == [2, 4]
+        first = batches[0][0][0]
+        assert first["description"] == "Depot"
+        assert first["timestamp"] == datetime(2025, 1, 1, 10, tzinfo=timezone.utc)
+
+        gpx_bytes = (
+            '<?xml version="1.0"?><gpx xmlns="http://www.topografix.com/GPX/1/1"><trk><trkseg>'
+            '<trkpt lat="-26.2" lon="28.04"><time>2025-02-01T08:00:00Z</time></trkpt>'
+            '<trkpt lat="-26.21" lon="28.05"><desc>Stop</desc></trkpt>'
+            '</trkseg></trk></gpx>'
+        ).encode()
+        gpx_batches = list(track_upload.iter_gpx_batches(io.BytesIO(gpx_bytes), batch_size=10))
+        samples = gpx_batches[0][0]
+        assert [(p["lat"], p["lng"]) for p in samples] == [(-26.2, 28.04), (-26.21, 28.05)]
+        assert samples[1]["description"] == "Stop" and samples[1]["timestamp"] is None
+
+        with pytest.raises(track_upload.TrackFileError):
+            list(track_upload.iter_csv_batches(io.BytesIO(b"a,b\n1,2\n")))
+
+    run_logged_test(
+        "test_track_upload_parsers_stream_csv_and_gpx_batches",
+        "Validates batched CSV/GPX parsing keeps valid rows and counts rejected ones",
+        "Unit",
+        _assertions,
+    )